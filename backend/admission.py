@@ -0,0 +1,182 @@
+"""Admission control for upstream LLM calls.
+
+Bounds concurrency (with a bounded wait queue), enforces the client's
+deadline and short-circuits to the keyword fallback while the upstream is
+failing, so a brownout cannot pile hung coroutines onto the event loop.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+DEADLINE_HEADER = "X-Client-Deadline-Ms"
+
+
+class LLMUnavailable(Exception):
+    """The upstream call was not attempted or was abandoned; use the fallback."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LLMUnavailable("queue_full")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed to us just before we were cancelled
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+        self.admitted += 1
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over, active count unchanged
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'active': self.active,
+            'queued': len(self._waiters),
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one probe through after the cool-down."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        now = self._clock()
+        if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            self._probe_started = now
+            return True
+        # In half-open only one probe is in flight; re-probe if it never reported back
+        if self.state == 'half_open' and now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = 'closed'
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'short_circuited': self.short_circuited,
+        }
+
+
+def deadline_from_header(
+    value: Optional[str],
+    default_ms: float = 7500,
+    margin_ms: float = 500,
+) -> float:
+    """Turn the client's remaining budget (ms) into an absolute monotonic deadline.
+
+    The margin leaves time to send the fallback before the app's own abort fires.
+    """
+    try:
+        budget_ms = float(value) if value is not None else default_ms
+    except ValueError:
+        budget_ms = default_ms
+    budget_ms = min(max(budget_ms, 0.0), default_ms)
+    return time.monotonic() + max(budget_ms - margin_ms, 0.0) / 1000.0
+
+
+async def run_with_deadline(aw: Awaitable[Any], deadline: Optional[float]) -> Any:
+    if deadline is None:
+        return await aw
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise LLMUnavailable("deadline")
+    try:
+        return await asyncio.wait_for(aw, remaining)
+    except asyncio.TimeoutError:
+        raise LLMUnavailable("deadline")
+
+
+def admission_from_env() -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 16)),
+        max_queue=int(os.environ.get('LLM_MAX_QUEUE', 64)),
+    )
+
+
+def breaker_from_env() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('LLM_BREAKER_RESET_S', 30)),
+    )
+
+
+def default_deadline_ms() -> float:
+    return float(os.environ.get('LLM_DEFAULT_DEADLINE_MS', 7500))
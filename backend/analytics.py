@@ -0,0 +1,162 @@
+"""Vectorized health analytics over a user's day history.
+
+Computes the metrics of the app's computeExtendedStats, computePremiumInsights
+and buildCompactSummary on columnar NumPy arrays: the history is sorted once
+and every metric is a single array expression, so multi-year histories cost
+one pass instead of a re-sort and a Python loop per metric.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from day_data import DEFAULT_WINDOWS
+EWMA_ALPHA = 0.3
+PERFECT_WATER = 6  # glasses, same threshold as dayPerfect() in the app
+
+
+@dataclass(frozen=True)
+class DayColumns:
+    dates: np.ndarray  # datetime64[D], ascending
+    water: np.ndarray
+    coffee: np.ndarray
+    pills_morning: np.ndarray
+    pills_evening: np.ndarray
+    sport: np.ndarray
+    weight: np.ndarray  # NaN where no weight was logged
+
+    def __len__(self) -> int:
+        return int(self.dates.size)
+
+
+_EMPTY: Dict[str, Any] = {}
+
+
+def to_columns(days: Iterable[Any]) -> DayColumns:
+    """Build sorted column arrays from DayData dicts or models (not a mix).
+
+    One list comprehension per column and one conversion each: per-day
+    helper calls cost more than the metrics themselves.
+    """
+    rows = list(days)
+    if rows and isinstance(rows[0], dict):
+        field = dict.get
+        pills = [d.get('pills') or _EMPTY for d in rows]
+        drinks = [d.get('drinks') or _EMPTY for d in rows]
+    else:
+        field = getattr
+        pills = [d.pills for d in rows]
+        drinks = [d.drinks for d in rows]
+    dates = np.array([field(d, 'date', None) for d in rows], dtype='datetime64[D]')
+    cols = {
+        'water': np.array([field(x, 'water', None) or 0 for x in drinks], dtype=np.float64),
+        'coffee': np.array([field(x, 'coffee', None) or 0 for x in drinks], dtype=np.float64),
+        'pills_morning': np.array([bool(field(x, 'morning', None)) for x in pills], dtype=bool),
+        'pills_evening': np.array([bool(field(x, 'evening', None)) for x in pills], dtype=bool),
+        'sport': np.array([bool(field(x, 'sport', None)) for x in drinks], dtype=bool),
+        # None becomes NaN
+        'weight': np.array([field(d, 'weight', None) for d in rows], dtype=np.float64),
+    }
+    order = np.argsort(dates, kind='stable')
+    return DayColumns(dates=dates[order], **{k: v[order] for k, v in cols.items()})
+
+
+def rolling_mean(x: np.ndarray, n: int) -> np.ndarray:
+    """Trailing mean over the last n entries (shorter at the start), via cumsum."""
+    if x.size == 0:
+        return x.astype(np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+    idx = np.arange(1, x.size + 1)
+    lo = np.maximum(idx - n, 0)
+    return (csum[idx] - csum[lo]) / (idx - lo)
+
+
+def ewma_last(x: np.ndarray, alpha: float = EWMA_ALPHA) -> Optional[float]:
+    """Final value of ewma = alpha*x[i] + (1-alpha)*ewma, seeded with x[0]."""
+    if x.size == 0:
+        return None
+    powers = (1.0 - alpha) ** np.arange(x.size - 1, -1, -1, dtype=np.float64)
+    weights = alpha * powers
+    weights[0] = powers[0]
+    return float(weights @ x)
+
+
+def least_squares_slope(t: np.ndarray, y: np.ndarray) -> float:
+    if y.size < 2:
+        return 0.0
+    t = t - t.mean()
+    denom = float(t @ t)
+    return float(t @ (y - y.mean()) / denom) if denom else 0.0
+
+
+def run_lengths(mask: np.ndarray) -> Dict[str, int]:
+    """Best and current (ending at the last entry) run of True values."""
+    if not mask.any():
+        return {'best': 0, 'current': 0}
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] == mask.size else 0
+    return {'best': int(lengths.max()), 'current': current}
+
+
+def _mean(x: np.ndarray) -> float:
+    return float(x.mean()) if x.size else 0.0
+
+
+def compute_analytics(
+    cols: DayColumns,
+    windows: Sequence[int] = DEFAULT_WINDOWS,
+    series: bool = False,
+) -> Dict[str, Any]:
+    n = len(cols)
+    both_pills = cols.pills_morning & cols.pills_evening
+    has_weight = ~np.isnan(cols.weight)
+    adherence = (
+        40.0 * both_pills
+        + np.minimum(30.0, cols.water * 5.0)
+        + 15.0 * has_weight
+        + 15.0 * cols.sport
+    )
+
+    out: Dict[str, Any] = {
+        'days': n,
+        'first_date': str(cols.dates[0]) if n else None,
+        'last_date': str(cols.dates[-1]) if n else None,
+        'compliance_rate': _mean(both_pills),
+        'windows': {},
+    }
+    # Windows are the last N logged days, as in the app
+    for w in windows:
+        out['windows'][str(w)] = {
+            'water_avg': _mean(cols.water[-w:]),
+            'coffee_avg': _mean(cols.coffee[-w:]),
+            'pill_adherence': _mean(both_pills[-w:]),
+            'sport_days': int(cols.sport[-w:].sum()),
+            'adherence_score': _mean(adherence[-w:]),
+        }
+
+    weights = cols.weight[has_weight]
+    day_offsets = (cols.dates[has_weight] - cols.dates[has_weight][:1]).astype(np.float64) if weights.size else weights
+    slope = least_squares_slope(day_offsets, weights)
+    last_weight = float(weights[-1]) if weights.size else None
+    out['weight'] = {
+        'count': int(weights.size),
+        'last': last_weight,
+        'trend_per_day': slope,
+        'ewma': ewma_last(weights),
+        'forecast_3d': last_weight + slope * 3 if last_weight is not None else None,
+    }
+
+    perfect = both_pills & (cols.water >= PERFECT_WATER) & has_weight
+    streak = run_lengths(perfect)
+    out['streaks'] = {'best_perfect': streak['best'], 'current_perfect': streak['current']}
+
+    if series:
+        out['series'] = {
+            'dates': [str(d) for d in cols.dates],
+            **{f'water_avg_{w}': rolling_mean(cols.water, w).round(3).tolist() for w in windows},
+            **{f'pill_adherence_{w}': rolling_mean(both_pills, w).round(3).tolist() for w in windows},
+        }
+    return out
@@ -0,0 +1,124 @@
+"""
+App factory for both server variants.
+
+server.py and server_production.py define their own /api routes and build
+their app through build_app(), which wires the storage backend, the shared
+/api/status routes, middleware and lifecycle hooks. create_app() picks a
+variant by name, for process managers that import a factory:
+
+    uvicorn app_factory:create_app --factory    # APP_VARIANT=production|server
+
+Heavy dependencies (emergentintegrations, motor, numpy) are imported on first
+use, so a cold start only pays for FastAPI and pydantic.
+"""
+import asyncio
+import importlib
+import os
+from typing import Any, Awaitable, Callable, Optional, Sequence
+
+from fastapi import APIRouter, FastAPI
+from starlette.middleware.cors import CORSMiddleware
+
+from llm_loader import LazyLLMClient, prewarm_from_env
+from metrics import MetricsMiddleware, ServiceMetrics, monitor_loop_lag
+from pagination import NEXT_CURSOR_HEADER
+from profiling import PROFILE_ID_HEADER, Profiler, ProfilingMiddleware, profiler_from_env
+from profiling import router as profiling_router
+from prompt_builder import PROMPT_TOKENS_HEADER
+from ratelimit import RateLimiter, RateLimitMiddleware, TrustedProxies, rate_limiter_from_env, trusted_proxies_from_env
+from status_api import router as status_router
+from upstream_probe import UPSTREAM_STATUS_HEADER, UpstreamHintMiddleware, UpstreamProber
+from upstream_probe import router as upstream_router
+
+VARIANTS = {'server': 'server', 'production': 'server_production'}
+
+
+def build_app(
+    router: APIRouter,
+    *,
+    storage: Any,
+    metrics: ServiceMetrics,
+    llm: LazyLLMClient,
+    prewarm_llm: Optional[bool] = None,
+    tasks: Sequence[Callable[[], Awaitable[Any]]] = (),
+    rate_limiter: Optional[RateLimiter] = None,
+    trusted_proxies: Optional[TrustedProxies] = None,
+    profiler: Optional[Profiler] = None,
+    upstream: Optional[UpstreamProber] = None,
+    **fastapi_kwargs: Any,
+) -> FastAPI:
+    """Long-running ``tasks`` (coroutine functions) start with the app and are cancelled on shutdown.
+
+    Without ``rate_limiter`` the per-client limits come from RATE_LIMIT* (ratelimit.py,
+    off unless RATE_LIMIT=1), without ``trusted_proxies`` from RATE_LIMIT_TRUSTED_PROXIES, and without ``profiler`` request profiling is configured by PROFILE_* (profiling.py).
+    ``upstream`` probes the LLM in the background and adds its readiness hint to chat
+    responses and /api/ping (upstream_probe.py).
+    """
+    app = FastAPI(**fastapi_kwargs)
+    app.state.storage = storage
+    app.state.llm = llm
+    app.state.rate_limiter = rate_limiter if rate_limiter is not None else rate_limiter_from_env()
+    app.state.profiler = profiler if profiler is not None else profiler_from_env()
+    app.state.upstream = upstream
+    if prewarm_llm is None:
+        prewarm_llm = prewarm_from_env()
+
+    app.include_router(status_router)
+    app.include_router(profiling_router)
+    app.include_router(upstream_router)
+    app.include_router(router)
+
+    # Innermost first: throttled requests still show up in the latency metrics and get CORS headers
+    if upstream is not None:
+        app.add_middleware(UpstreamHintMiddleware, prober=upstream)
+    if app.state.profiler.enabled:
+        app.add_middleware(ProfilingMiddleware, profiler=app.state.profiler)
+    if app.state.rate_limiter is not None:
+        app.add_middleware(RateLimitMiddleware, limiter=app.state.rate_limiter, rejected=metrics.rate_limited,
+                           trusted_proxies=trusted_proxies if trusted_proxies is not None else trusted_proxies_from_env())
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, PROMPT_TOKENS_HEADER, PROFILE_ID_HEADER, UPSTREAM_STATUS_HEADER, "Retry-After"],
+    )
+
+    background = []
+
+    @app.on_event("startup")
+    async def start_background_tasks():
+        background.append(asyncio.create_task(monitor_loop_lag(metrics)))
+        if prewarm_llm and not llm.loaded:
+            background.append(asyncio.create_task(llm.prewarm()))
+        if upstream is not None:
+            background.append(asyncio.create_task(upstream.run()))
+        for run in tasks:
+            background.append(asyncio.create_task(run()))
+
+    @app.on_event("startup")
+    async def open_storage():
+        await app.state.storage.startup()
+
+    @app.on_event("shutdown")
+    async def stop_background_tasks():
+        for task in background:
+            task.cancel()
+        background.clear()
+
+    @app.on_event("shutdown")
+    async def close_storage():
+        await app.state.storage.shutdown()
+
+    return app
+
+
+def create_app(variant: Optional[str] = None, storage: Any = None, prewarm_llm: Optional[bool] = None) -> FastAPI:
+    variant = variant or os.environ.get('APP_VARIANT', 'production')
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown APP_VARIANT {variant!r}")
+    module = importlib.import_module(VARIANTS[variant])
+    return module.create_app(storage=storage, prewarm_llm=prewarm_llm)
@@ -0,0 +1,120 @@
+"""In-process response cache for /api/chat (LRU with per-mode TTL)."""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TTLS = {
+    'greeting': 6 * 3600,
+    'chat': 10 * 60,
+}
+
+
+def _normalize(value: Any) -> Any:
+    # Round floats so that summaries differing only in float noise share a key
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_cache_key(
+    mode: str,
+    language: str,
+    model: str,
+    summary: Optional[Dict[str, Any]],
+    messages: Optional[List[Dict[str, str]]] = None,
+) -> str:
+    payload = {
+        'mode': mode,
+        'language': language,
+        'model': model,
+        'summary': _normalize(summary or {}),
+        'messages': [[m['role'], (m.get('content') or '').strip()] for m in (messages or [])],
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttls: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._clock = clock
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def lookup(self, key: str) -> Optional[Any]:
+        # Same interface as the SQLite-backed cache, whose reads leave the event loop
+        return self.get(key)
+
+    def set(self, key: str, value: Any, mode: str = 'chat') -> None:
+        ttl = self.ttls.get(mode, 0)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._data[key] = (self._clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'ttls': self.ttls,
+        }
+
+
+def cache_from_env() -> Any:
+    """ResponseCache, or the SQLite-backed one shared by all workers (CHAT_CACHE_STORE=sqlite).
+
+    The shared cache is the default whenever STATUS_STORAGE=sqlite.
+    """
+    max_entries = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 512))
+    ttls = {
+        'greeting': float(os.environ.get('CHAT_CACHE_TTL_GREETING', DEFAULT_TTLS['greeting'])),
+        'chat': float(os.environ.get('CHAT_CACHE_TTL_CHAT', DEFAULT_TTLS['chat'])),
+    }
+    store = os.environ.get('CHAT_CACHE_STORE', 'sqlite' if os.environ.get('STATUS_STORAGE') == 'sqlite' else 'memory')
+    if store == 'sqlite':
+        from sqlite_store import SqliteResponseCache, shared_database
+        return SqliteResponseCache(shared_database(), max_entries=max_entries, ttls=ttls)
+    return ResponseCache(max_entries=max_entries, ttls=ttls)
@@ -0,0 +1,79 @@
+"""Pydantic mirrors of the app's day and cycle records (frontend/src/store/useStore.ts)."""
+from datetime import date as Date
+from typing import Annotated, Any, Dict, List, Optional, Union
+
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+
+# Rolling windows (days) reported by /api/analytics
+DEFAULT_WINDOWS = (7, 14, 30)
+
+DATE_KEY = r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'  # toKey() in frontend/src/utils/date.ts
+
+
+def _calendar_date(value: str) -> str:
+    # The pattern lets 2024-02-30 through; rollups and analytics need a real day
+    Date.fromisoformat(value)
+    return value
+
+
+DateKey = Annotated[str, Field(pattern=DATE_KEY), AfterValidator(_calendar_date)]
+
+
+class DayPills(BaseModel):
+    morning: bool = False
+    evening: bool = False
+
+
+class DayDrinks(BaseModel):
+    water: float = 0
+    coffee: float = 0
+    slimCoffee: bool = False
+    gingerGarlicTea: bool = False
+    waterCure: bool = False
+    sport: bool = False
+
+
+class DayLogEntry(BaseModel):
+    ts: int
+    action: str
+    value: Optional[Union[float, bool, str]] = None
+    note: Optional[str] = None
+
+
+class DayData(BaseModel):
+    # Newer app versions may add fields; keep them instead of failing validation
+    model_config = ConfigDict(extra='allow')
+
+    date: DateKey
+    pills: DayPills = Field(default_factory=DayPills)
+    drinks: DayDrinks = Field(default_factory=DayDrinks)
+    weight: Optional[float] = None
+    weightTime: Optional[int] = None
+    xpToday: Optional[Dict[str, bool]] = None
+    activityLog: Optional[List[DayLogEntry]] = None
+
+
+class Cycle(BaseModel):
+    start: DateKey
+    end: Optional[DateKey] = None
+
+
+class CycleLog(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    mood: Optional[float] = None
+    energy: Optional[float] = None
+    pain: Optional[float] = None
+    sleep: Optional[float] = None
+    sex: Optional[bool] = None
+    notes: Optional[str] = None
+    flow: Optional[float] = None
+    cramps: Optional[bool] = None
+    headache: Optional[bool] = None
+    nausea: Optional[bool] = None
+    updatedAt: Optional[int] = None
+
+
+def day_list(days: Union[Dict[str, Any], List[Any]]) -> List[Any]:
+    # The app stores days as a map keyed by date; accept either shape
+    return list(days.values()) if isinstance(days, dict) else list(days)
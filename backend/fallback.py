@@ -0,0 +1,13 @@
+"""Keyword replies used when the LLM upstream is missing or unavailable."""
+from typing import Any, Dict, List, Optional
+
+from intents import IntentMatcher, reply_for
+
+_matcher = IntentMatcher()
+
+
+def keyword_reply(messages: List[Dict[str, str]], language: str = 'de', summary: Optional[Dict[str, Any]] = None) -> str:
+    user_msg = (messages[-1].get('content', '') if messages else '').strip()
+    # Best guess regardless of confidence: any topical answer beats a generic one here
+    match = _matcher.match(user_msg)
+    return reply_for(match.intent if match else None, language, summary)
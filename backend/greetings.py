@@ -0,0 +1,243 @@
+"""Pre-generated greetings, served from coarse summary buckets.
+
+Every app launch asks for a greeting built from buildCompactSummary(). Its
+inputs fall into a few coarse buckets: water and coffee averages, pill
+adherence, weight direction and weekly event progress. Greetings are
+generated per (language, model, bucket) from the bucket labels alone, so no
+user's exact numbers end up in a shared entry.
+
+GreetingStore is a bounded LRU. It counts which buckets are asked for and
+serves an entry instantly while it is younger than ``max_age``; after
+``fresh_for`` the entry is still served but queued for regeneration.
+GreetingWarmer runs in the app's background tasks and regenerates the
+most-asked missing or stale entries, a few per round, while the LLM
+admission queue is idle (and optionally only within GREETING_OFF_PEAK_HOURS).
+A miss takes the normal chat path with the user's own summary.
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from chat_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FRESH_FOR = 6 * 3600
+# Long enough for a nightly warm-up to carry through the next day
+DEFAULT_MAX_AGE = 30 * 3600
+
+# summary key -> (upper bucket edges, labels); a value lands in the first bucket whose edge exceeds it
+BUCKETS: Dict[str, Tuple[Sequence[float], Sequence[str]]] = {
+    'water_avg14': ((2, 4, 6, 8), ('<2', '2-4', '4-6', '6-8', '8+')),
+    'coffee_avg14': ((1, 3, 5), ('<1', '1-3', '3-5', '5+')),
+    'pill_adherence7': ((50, 85, 100), ('<50%', '50-85%', '85-99%', '100%')),
+    'weight_trend_per_day': ((-0.05, 0.05), ('falling', 'stable', 'rising')),
+}
+EVENT_PROGRESS = ((1, 50, 100), ('not started', '<50%', '50-99%', 'done'))
+
+# (key, language, model, bucketed summary)
+GreetingSpec = Tuple[str, str, str, Dict[str, Any]]
+
+
+def _label(value: Any, edges: Sequence[float], labels: Sequence[str]) -> Optional[str]:
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    return labels[bisect_right(edges, value)]
+
+
+def bucket_summary(summary: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The coarse version of a compact summary that greetings are generated from."""
+    summary = summary or {}
+    out: Dict[str, Any] = {}
+    for key, (edges, labels) in BUCKETS.items():
+        label = _label(summary.get(key), edges, labels)
+        if label is not None:
+            out[key] = label
+    event = summary.get('weekly_event')
+    if isinstance(event, dict) and event.get('title'):
+        out['weekly_event'] = {'title': str(event['title']),
+                               'progress': _label(event.get('progress', 0), *EVENT_PROGRESS)}
+    return out
+
+
+class GreetingStore:
+    def __init__(
+        self,
+        max_entries: int = 500,
+        fresh_for: float = DEFAULT_FRESH_FOR,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_tracked: int = 2000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.max_tracked = max_tracked
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # key -> [requests, language, model, bucket]; halved when it grows past max_tracked
+        self._demand: Dict[str, list] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.evictions = 0
+
+    def _note_demand(self, key: str, language: str, model: str, bucket: Dict[str, Any]) -> None:
+        entry = self._demand.get(key)
+        if entry is not None:
+            entry[0] += 1
+            return
+        self._demand[key] = [1, language, model, bucket]
+        if len(self._demand) > self.max_tracked:
+            # Decay: older popularity counts half, one-off buckets are forgotten
+            for k in list(self._demand):
+                self._demand[k][0] //= 2
+                if not self._demand[k][0]:
+                    del self._demand[k]
+
+    def lookup(self, language: str, model: str, summary: Optional[Dict[str, Any]]) -> Optional[str]:
+        bucket = bucket_summary(summary)
+        key = make_cache_key('greeting', language, model, bucket)
+        self._note_demand(key, language, model, bucket)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        age = self._clock() - entry[0]
+        if age > self.max_age:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        if age > self.fresh_for:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        self._entries[key] = (self._clock(), text)
+        self._entries.move_to_end(key)
+        self.generated += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def due(self, limit: int) -> List[GreetingSpec]:
+        """The most-asked combinations whose entry is missing or stale."""
+        now = self._clock()
+        out = []
+        ranked = sorted(self._demand.items(), key=lambda kv: kv[1][0], reverse=True)
+        for key, (_, language, model, bucket) in ranked[:self.max_entries]:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.fresh_for:
+                out.append((key, language, model, bucket))
+                if len(out) >= limit:
+                    break
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'tracked': len(self._demand),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'generated': self.generated,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _parse_hours(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    # "22-6" wraps past midnight; empty means any hour
+    if not value:
+        return None
+    start, end = (int(x) for x in value.split('-'))
+    return start % 24, end % 24
+
+
+class GreetingWarmer:
+    def __init__(
+        self,
+        store: GreetingStore,
+        generate: Callable[[str, str, Dict[str, Any]], Awaitable[Optional[str]]],
+        is_idle: Callable[[], bool] = lambda: True,
+        interval: float = 300.0,
+        per_round: int = 8,
+        off_peak_hours: Optional[Tuple[int, int]] = None,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.store = store
+        self.generate = generate
+        self.is_idle = is_idle
+        self.interval = interval
+        self.per_round = per_round
+        self.off_peak_hours = off_peak_hours
+        self._now = now
+        self.rounds = 0
+        self.failures = 0
+
+    def off_peak(self) -> bool:
+        if self.off_peak_hours is None:
+            return True
+        start, end = self.off_peak_hours
+        hour = self._now().hour
+        return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+    async def warm_once(self) -> int:
+        generated = 0
+        for key, language, model, bucket in self.store.due(self.per_round):
+            # Users come first: stop as soon as real requests need the upstream
+            if not self.is_idle():
+                break
+            try:
+                text = await self.generate(language, model, bucket)
+            except Exception as e:
+                self.failures += 1
+                logger.warning("Greeting warm-up failed: %s", e)
+                continue
+            if text:
+                self.store.put(key, text)
+                generated += 1
+        self.rounds += 1
+        return generated
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.off_peak() and self.is_idle():
+                await self.warm_once()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'interval': self.interval, 'per_round': self.per_round, 'off_peak_hours': self.off_peak_hours,
+                'rounds': self.rounds, 'failures': self.failures}
+
+
+def greetings_from_env() -> GreetingStore:
+    return GreetingStore(
+        max_entries=int(os.environ.get('GREETING_STORE_MAX', 500)),
+        fresh_for=float(os.environ.get('GREETING_FRESH_S', DEFAULT_FRESH_FOR)),
+        max_age=float(os.environ.get('GREETING_MAX_AGE_S', DEFAULT_MAX_AGE)),
+    )
+
+
+def warmer_from_env(store: GreetingStore, generate, is_idle: Callable[[], bool]) -> Optional[GreetingWarmer]:
+    if os.environ.get('GREETING_WARM', '1').lower() in ('0', 'false', 'off'):
+        return None
+    return GreetingWarmer(
+        store,
+        generate,
+        is_idle=is_idle,
+        interval=float(os.environ.get('GREETING_WARM_INTERVAL_S', 300)),
+        per_round=int(os.environ.get('GREETING_WARM_PER_ROUND', 8)),
+        off_peak_hours=_parse_hours(os.environ.get('GREETING_OFF_PEAK_HOURS')),
+    )
@@ -0,0 +1,139 @@
+"""Streaming NDJSON export and import of a user's synced health history.
+
+Export walks the user's sync records in rev order with a batched cursor and
+writes one JSON object per line. Each cursor batch becomes one chunk of the
+response, gzip-compressed on the fly when the client accepts it. Import reads
+the request body chunk by chunk and splits it into lines. Each line is
+validated as a sync change, and the changes are pushed in batches of at most
+``batch_size``. Neither direction holds more than one batch, so memory stays
+flat whatever the size of the history.
+
+Imported records go through the normal sync push, so they get fresh revs and
+update the rollups. Pushes upsert by date, which makes an import idempotent.
+When a bad line stops an import, the batches before it stay written, and the
+corrected file can simply be sent again.
+"""
+import json
+import os
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from pagination import dumps
+
+DEFAULT_EXPORT_BATCH = 1000
+DEFAULT_IMPORT_BATCH = 500
+MAX_LINE_BYTES = 1 << 20
+# Bounds how much one compressed chunk may expand in a single step
+_INFLATE_STEP = 1 << 16
+
+Change = Tuple[str, Dict[str, Any]]
+
+
+class NdjsonError(ValueError):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.message = message
+        self.imported = 0  # records written before the error
+
+
+async def ndjson_chunks(records: AsyncIterator[Dict[str, Any]], batch_size: int = DEFAULT_EXPORT_BATCH) -> AsyncIterator[bytes]:
+    """One encoded chunk per ``batch_size`` records."""
+    lines = []
+    async for record in records:
+        lines.append(dumps(record))
+        if len(lines) >= batch_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+async def _inflate(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = chunk
+        while data:
+            try:
+                out = decompressor.decompress(data, _INFLATE_STEP)
+            except zlib.error as e:
+                raise NdjsonError(0, f"invalid gzip body: {e}") from e
+            if out:
+                yield out
+            data = decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes], gzip: bool = False) -> AsyncIterator[Tuple[int, Any]]:
+    """Parse a (possibly gzipped) NDJSON byte stream into (line number, value); blank lines are skipped."""
+    if gzip:
+        chunks = _inflate(chunks)
+    buffer = b''
+    lineno = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            lineno += 1
+            if line.strip():
+                yield lineno, _parse(lineno, line)
+        if len(buffer) > MAX_LINE_BYTES:
+            raise NdjsonError(lineno + 1, f"line longer than {MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield lineno + 1, _parse(lineno + 1, buffer)
+
+
+def _parse(lineno: int, line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        raise NdjsonError(lineno, f"invalid JSON: {e}") from e
+
+
+async def import_ndjson(
+    store: Any,
+    user: str,
+    chunks: AsyncIterator[bytes],
+    to_change: Callable[[Any], Change],
+    gzip: bool = False,
+    batch_size: int = DEFAULT_IMPORT_BATCH,
+) -> Dict[str, Any]:
+    """Push every line of the stream as a sync change; ``to_change`` validates one parsed line."""
+    imported = batches = 0
+    rev: Optional[int] = None
+    batch = []
+    try:
+        async for lineno, value in ndjson_records(chunks, gzip):
+            try:
+                batch.append(to_change(value))
+            except ValueError as e:
+                raise NdjsonError(lineno, str(e)) from e
+            if len(batch) >= batch_size:
+                rev = await store.push(user, batch)
+                imported, batches, batch = imported + len(batch), batches + 1, []
+    except NdjsonError as e:
+        e.imported = imported
+        raise
+    if batch:
+        rev = await store.push(user, batch)
+        imported, batches = imported + len(batch), batches + 1
+    return {'imported': imported, 'batches': batches, 'rev': rev}
+
+
+def export_batch_from_env() -> int:
+    return int(os.environ.get('SYNC_EXPORT_BATCH', DEFAULT_EXPORT_BATCH))
+
+
+def import_batch_from_env() -> int:
+    return int(os.environ.get('SYNC_IMPORT_BATCH', DEFAULT_IMPORT_BATCH))
@@ -0,0 +1,222 @@
+"""Compiled multilingual intent matcher for routine chat questions.
+
+All de/en/pl keywords for the five intents (pills, water, weight, sport,
+cycle) are compiled into one regex with a named group per intent, so a
+message is classified in a single pass over its text. The keyword fallback
+uses that best guess whenever the LLM is unavailable.
+
+A keyword alone is not enough to skip the LLM: "Mein Wasser schmeckt
+komisch, ist das gefährlich?" mentions water but is not a routine question,
+and "kein Schlaf-Tipp, sondern ..." says the opposite of its keyword. /api/chat
+only answers directly when the whole message is one of the ROUTINE_QUESTIONS
+("Wie viel Wasser soll ich trinken?"), which are anchored at both ends and
+leave no room for a negation or a second question. Only general questions
+that the template itself answers are listed; questions about the user's
+own data ("did I take my pills?", "when does my period start?") go to the
+LLM, which sees the whole summary.
+"""
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+
+# Keywords match at a word start. A trailing '*' allows any word ending
+# (stems such as 'tablette*' cover Tablette/Tabletten); others are whole words.
+INTENT_KEYWORDS: Dict[str, Iterable[str]] = {
+    'pills': (
+        'tablette*', 'pille*', 'medikament*', 'vitamin*', 'einnehmen',
+        'pill*', 'tablet*', 'medication*', 'medicine*',
+        'tabletk*', 'pigułk*', 'lek', 'leki', 'leków', 'lekarstw*', 'suplement*',
+    ),
+    'water': (
+        'wasser*', 'trinken', 'trinke', 'getränk*', 'flüssigkeit*',
+        'water', 'drink', 'drinking', 'hydrat*',
+        'woda', 'wody', 'wodę', 'wodzie', 'pić', 'piję', 'nawodn*',
+    ),
+    'weight': (
+        'gewicht*', 'abnehmen', 'abgenommen', 'zunehmen', 'zugenommen', 'waage', 'kilo*',
+        'weight*', 'weigh', 'scale',
+        'waga', 'wagi', 'wagę', 'schudn*', 'przytył*', 'kilogram*',
+    ),
+    'sport': (
+        'sport*', 'training*', 'trainieren', 'bewegung*', 'joggen', 'laufen',
+        'exercis*', 'workout*', 'run', 'running', 'jogging', 'fitness',
+        'ćwicz*', 'trening*', 'bieg*', 'ruch*',
+    ),
+    'cycle': (
+        'zyklus*', 'periode*', 'menstruation*', 'regelblutung*', 'eisprung*',
+        'cycle*', 'period', 'periods', 'menstrua*', 'ovulat*',
+        'cykl*', 'okres*', 'miesiączk*', 'owulacj*',
+    ),
+}
+
+REPLIES: Dict[str, Dict[str, str]] = {
+    'pills': {
+        'de': "Vergiss nicht deine Tabletten regelmäßig zu nehmen! ⏰",
+        'en': "Don't forget to take your pills regularly! ⏰",
+        'pl': "Nie zapominaj regularnie brać tabletek! ⏰",
+    },
+    'water': {
+        'de': "Trink genug Wasser! Mindestens 2-3 Liter am Tag sind optimal. 💧",
+        'en': "Drink enough water! At least 2-3 liters a day is ideal. 💧",
+        'pl': "Pij wystarczająco dużo wody! Optymalnie co najmniej 2-3 litry dziennie. 💧",
+    },
+    'weight': {
+        'de': "Gewicht schwankt täglich - wichtig ist der langfristige Trend! 📊",
+        'en': "Weight fluctuates daily - what matters is the long-term trend! 📊",
+        'pl': "Waga zmienia się codziennie - liczy się długoterminowy trend! 📊",
+    },
+    'sport': {
+        'de': "Regelmäßige Bewegung ist super! Auch 15-20 Minuten täglich helfen. 🏃‍♀️",
+        'en': "Regular exercise is great! Even 15-20 minutes a day helps. 🏃‍♀️",
+        'pl': "Regularny ruch jest super! Nawet 15-20 minut dziennie pomaga. 🏃‍♀️",
+    },
+    'cycle': {
+        'de': "Tracke deinen Zyklus für bessere Gesundheitsübersicht! 📅",
+        'en': "Track your cycle for a better overview of your health! 📅",
+        'pl': "Śledź swój cykl, aby mieć lepszy obraz swojego zdrowia! 📅",
+    },
+    None: {
+        'de': "Ich helfe dir gerne bei deinen Gesundheitszielen! Was möchtest du wissen? 😊",
+        'en': "I'm happy to help with your health goals! What would you like to know? 😊",
+        'pl': "Chętnie pomogę ci w twoich celach zdrowotnych! Co chcesz wiedzieć? 😊",
+    },
+}
+
+# Personal follow-ups from the app's compact summary, when the field is present
+SUMMARY_NOTES: Dict[str, tuple] = {
+    'pills': ('pill_adherence7', {
+        'de': "Diese Woche hast du sie an {v:.0f}% der Tage genommen.",
+        'en': "This week you took them on {v:.0f}% of days.",
+        'pl': "W tym tygodniu brałaś je przez {v:.0f}% dni.",
+    }),
+    'water': ('water_avg14', {
+        'de': "Zuletzt waren es im Schnitt {v:.1f} Gläser am Tag.",
+        'en': "Lately you've averaged {v:.1f} glasses a day.",
+        'pl': "Ostatnio średnio {v:.1f} szklanki dziennie.",
+    }),
+    'weight': ('weight_trend_per_day', {
+        'de': "Dein Trend: {w:+.1f} kg pro Woche.",
+        'en': "Your trend: {w:+.1f} kg per week.",
+        'pl': "Twój trend: {w:+.1f} kg tygodniowo.",
+    }),
+}
+
+# Whole-message patterns (lower case, without trailing punctuation) that the template answers
+ROUTINE_QUESTIONS: Dict[str, Iterable[str]] = {
+    'water': (
+        r'wie ?viel(?:e)? (?:wasser|liter) soll(?:te)? ich (?:am tag |täglich )?trinken',
+        r'how much (?:water )?should i drink(?: a day| per day| daily)?',
+        r'ile wody (?:powinnam|powinienem) (?:dziennie )?pić(?: dziennie)?',
+    ),
+    'sport': (
+        r'(?:hast du )?(?:ideen|tipps) für (?:ein )?(?:sport|training|workout)',
+        r'any (?:quick )?(?:workout|exercise|training) (?:ideas|tips)',
+        r'(?:jakieś )?(?:pomysły|porady) na (?:trening|ćwiczenia)',
+    ),
+}
+
+DEFAULT_THRESHOLD = 0.75
+# Messages up to this many words can score full confidence; longer ones usually need the LLM
+SHORT_MESSAGE_WORDS = 12
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    confidence: float
+    hits: int
+
+
+def _alternative(keyword: str) -> str:
+    if keyword.endswith('*'):
+        return re.escape(keyword[:-1]) + r'\w*'
+    return re.escape(keyword) + r'(?!\w)'
+
+
+def compile_intents(keywords: Dict[str, Iterable[str]]) -> "re.Pattern[str]":
+    groups = []
+    for intent, words in keywords.items():
+        # Longest first, so that 'periods' wins over 'period' at the same position
+        alternatives = sorted((_alternative(w) for w in words), key=len, reverse=True)
+        groups.append(f"(?P<{intent}>{'|'.join(alternatives)})")
+    return re.compile(r'(?<!\w)(?:' + '|'.join(groups) + ')', re.IGNORECASE)
+
+
+def compile_routine(questions: Dict[str, Iterable[str]]) -> "re.Pattern[str]":
+    groups = [f"(?P<{intent}>{'|'.join(patterns)})" for intent, patterns in questions.items()]
+    return re.compile('|'.join(groups), re.IGNORECASE)
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split()).rstrip('?!. ').lower()
+
+
+def reply_for(intent: Optional[str], language: str, summary: Optional[Dict[str, Any]] = None) -> str:
+    replies = REPLIES.get(intent, REPLIES[None])
+    text = replies.get(language) or replies['de']
+    note = SUMMARY_NOTES.get(intent)
+    value = (summary or {}).get(note[0]) if note else None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        template = note[1].get(language) or note[1]['de']
+        text = f"{text} {template.format(v=value, w=value * 7)}"
+    return text
+
+
+class IntentMatcher:
+    def __init__(
+        self,
+        keywords: Dict[str, Iterable[str]] = INTENT_KEYWORDS,
+        threshold: float = DEFAULT_THRESHOLD,
+        routine: Dict[str, Iterable[str]] = ROUTINE_QUESTIONS,
+    ):
+        self.pattern = compile_intents(keywords)
+        self.routine = compile_routine(routine)
+        self.threshold = threshold
+        self.answered: Counter = Counter()
+        self.low_confidence = 0
+        self.not_routine = 0
+        self.no_match = 0
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        counts = Counter(m.lastgroup for m in self.pattern.finditer(text))
+        if not counts:
+            return None
+        intent, hits = counts.most_common(1)[0]
+        share = hits / sum(counts.values())
+        brevity = min(1.0, SHORT_MESSAGE_WORDS / max(len(text.split()), 1))
+        return IntentMatch(intent, round(share * brevity, 3), hits)
+
+    def routine_intent(self, text: str) -> Optional[str]:
+        """Intent of a message that is exactly one of the routine questions, else None."""
+        match = self.routine.fullmatch(_normalize(text))
+        return match.lastgroup if match else None
+
+    def answer(self, text: str, language: str, summary: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Canned reply for a confident match of a routine question, or None to go to the LLM."""
+        match = self.match(text)
+        if match is None:
+            self.no_match += 1
+            return None
+        if match.confidence < self.threshold:
+            self.low_confidence += 1
+            return None
+        if self.routine_intent(text) != match.intent:
+            self.not_routine += 1
+            return None
+        self.answered[match.intent] += 1
+        return reply_for(match.intent, language, summary)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'threshold': self.threshold,
+            'answered': dict(self.answered),
+            'answered_total': sum(self.answered.values()),
+            'low_confidence': self.low_confidence,
+            'not_routine': self.not_routine,
+            'no_match': self.no_match,
+        }
+
+
+def intents_from_env() -> IntentMatcher:
+    # A threshold above 1 disables the fast path
+    return IntentMatcher(threshold=float(os.environ.get('INTENT_CONFIDENCE_THRESHOLD', DEFAULT_THRESHOLD)))
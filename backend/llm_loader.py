@@ -0,0 +1,74 @@
+"""Lazy import of the Emergent LLM client.
+
+emergentintegrations pulls in the provider SDKs, which dominates cold-start
+time. The servers hold a LazyLLMClient and only import it on the first chat
+request, or in the background at startup when LLM_PREWARM is set.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+_UNLOADED = object()
+
+
+def _import_emergent() -> Any:
+    from emergentintegrations import llm_client
+    return llm_client
+
+
+class LazyLLMClient:
+    def __init__(self, loader: Callable[[], Any] = _import_emergent, module: str = 'emergentintegrations'):
+        self._loader = loader
+        self._module = module
+        self._client: Any = _UNLOADED
+        self._lock = threading.Lock()
+        self.load_ms: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not _UNLOADED
+
+    @property
+    def client(self) -> Any:
+        """The LLM client, or None when the integration is not installed."""
+        if self._client is _UNLOADED:
+            with self._lock:
+                if self._client is _UNLOADED:
+                    started = time.perf_counter()
+                    try:
+                        client = self._loader()
+                    except Exception:  # fallback if lib not present
+                        client = None
+                    self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+                    self._client = client
+                    logging.info("LLM client %s in %.1f ms", "loaded" if client is not None else "unavailable", self.load_ms)
+        return self._client
+
+    @client.setter
+    def client(self, value: Any) -> None:
+        # Tests and benchmarks inject stub clients here
+        self._client = value
+
+    def available(self) -> bool:
+        # Answer without importing when the client has not been loaded yet
+        if self.loaded:
+            return self._client is not None
+        try:
+            return importlib.util.find_spec(self._module) is not None
+        except (ImportError, ValueError):
+            return False
+
+    async def prewarm(self) -> None:
+        # Import in a worker thread so startup and early requests are not blocked
+        await asyncio.to_thread(lambda: self.client)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'loaded': self.loaded, 'available': self.available(), 'load_ms': self.load_ms}
+
+
+def prewarm_from_env() -> bool:
+    return os.environ.get('LLM_PREWARM', '0').lower() in ('1', 'true', 'yes')
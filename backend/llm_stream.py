@@ -0,0 +1,106 @@
+"""Helpers for streaming chat completions to the app as Server-Sent Events."""
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from admission import AdmissionController, CircuitBreaker, LLMUnavailable, run_with_deadline
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Disable proxy buffering (nginx / Railway edge) so tokens reach the app immediately
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _delta_text(chunk: Any) -> str:
+    # OpenAI-style stream chunks carry choices[0].delta.content
+    choices = getattr(chunk, 'choices', None)
+    if choices is None and isinstance(chunk, dict):
+        choices = chunk.get('choices')
+    if choices:
+        first = choices[0]
+        delta = getattr(first, 'delta', None)
+        if delta is None and isinstance(first, dict):
+            delta = first.get('delta')
+        if delta is not None:
+            content = getattr(delta, 'content', None)
+            if content is None and isinstance(delta, dict):
+                content = delta.get('content')
+            return content or ''
+    if isinstance(chunk, str):
+        return chunk
+    return getattr(chunk, 'content', None) or ''
+
+
+def _full_text(resp: Any) -> str:
+    content = None
+    if hasattr(resp, 'choices') and resp.choices:
+        msg = getattr(resp.choices[0], 'message', None)
+        if msg and hasattr(msg, 'content'):
+            content = msg.content
+    if not content:
+        content = getattr(resp, 'content', None) or ''
+    return content.strip()
+
+
+async def stream_llm(llm_client: Any, messages: List[Dict[str, str]], model: str) -> AsyncIterator[str]:
+    """Yield text deltas from the upstream as they arrive.
+
+    Clients without streaming support return a complete response instead of an
+    async iterator; that is yielded as a single delta.
+    """
+    resp = await llm_client.chat_completion(
+        model=model,
+        messages=messages,
+        temperature=0.4,
+        max_tokens=280,
+        stream=True,
+    )
+    if hasattr(resp, '__aiter__'):
+        async for chunk in resp:
+            text = _delta_text(chunk)
+            if text:
+                yield text
+    else:
+        text = _full_text(resp)
+        if text:
+            yield text
+
+
+async def guarded_stream(
+    llm_client: Any,
+    messages: List[Dict[str, str]],
+    model: str,
+    admission: AdmissionController,
+    breaker: CircuitBreaker,
+    deadline: Optional[float],
+) -> AsyncIterator[str]:
+    """stream_llm under admission control.
+
+    The deadline bounds the wait for a slot and for the first token; once tokens
+    flow the client is reading and the stream runs to completion.
+    """
+    if not breaker.allow():
+        raise LLMUnavailable("circuit_open")
+    await run_with_deadline(admission.acquire(), deadline)
+    try:
+        deltas = stream_llm(llm_client, messages, model).__aiter__()
+        try:
+            first = await run_with_deadline(deltas.__anext__(), deadline)
+        except StopAsyncIteration:
+            first = None
+        if first is not None:
+            yield first
+            async for delta in deltas:
+                yield delta
+    except Exception:
+        breaker.record_failure()
+        raise
+    else:
+        breaker.record_success()
+    finally:
+        admission.release()
@@ -0,0 +1,44 @@
+"""Deterministic stand-in for the Emergent llm_client, for tests and local runs."""
+import asyncio
+import random
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+class StubLLMError(RuntimeError):
+    pass
+
+
+class StubLLMClient:
+    def __init__(
+        self,
+        text: str = "Trink heute noch zwei Gläser Wasser und gönn dir einen kurzen Spaziergang! 💧",
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = 0,
+    ):
+        self.text = text
+        self.latency = latency
+        self.token_delay = token_delay
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    async def chat_completion(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs: Any):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise StubLLMError("stub upstream failure")
+        if stream:
+            return self._stream()
+        message = SimpleNamespace(role='assistant', content=self.text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=model)
+
+    async def _stream(self) -> AsyncIterator[Any]:
+        for i, word in enumerate(self.text.split(' ')):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            delta = SimpleNamespace(content=word if i == 0 else ' ' + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
@@ -0,0 +1,231 @@
+"""Prometheus text-format metrics with negligible hot-path cost.
+
+All updates happen on the event loop thread, so counters and histograms are
+plain ints and preallocated bucket lists with no locking. Rendering walks
+them only when /api/metrics is scraped.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# req.model is chosen by the client; anything else is labelled OTHER_MODEL so
+# a client cannot create one time series per made-up model name
+KNOWN_MODELS = ('gpt-4o-mini', 'gpt-4o', 'gpt-4.1-mini', 'gpt-4.1')
+OTHER_MODEL = 'other'
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _num(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    __slots__ = ('name', 'help', 'label_names', '_values')
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} counter")
+        for labels, value in self._values.items():
+            out.append(f"{self.name}{_labels(self.label_names, labels)} {_num(value)}")
+
+
+class Histogram:
+    __slots__ = ('name', 'help', 'label_names', 'buckets', '_series')
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total, n) in self._series.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.label_names, labels)} {n}")
+
+
+class CallbackMetric:
+    """Samples read from existing component stats at scrape time."""
+
+    __slots__ = ('name', 'help', 'type', 'label_names', '_fn')
+
+    def __init__(self, name: str, help: str, type: str, fn: Callable[[], Iterable[Tuple[Labels, float]]], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.label_names = tuple(label_names)
+        self._fn = fn
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.type}")
+        for labels, value in self._fn():
+            out.append(f"{self.name}{_labels(self.label_names, labels)} {_num(value)}")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for the languages we serve; good enough for sizing
+    return (len(text) + 3) // 4
+
+
+class ServiceMetrics:
+    def __init__(self, models: Iterable[str] = KNOWN_MODELS):
+        self.models = frozenset(models)
+        self.http_latency = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency by route.',
+            ('method', 'route', 'status'), LATENCY_BUCKETS,
+        )
+        self.llm_latency = Histogram(
+            'llm_request_duration_seconds', 'Upstream LLM call latency.',
+            ('model', 'language', 'outcome'), LLM_LATENCY_BUCKETS,
+        )
+        self.llm_errors = Counter('llm_errors_total', 'Failed upstream LLM calls.', ('model', 'language', 'reason'))
+        self.prompt_tokens = Histogram(
+            'llm_prompt_tokens', 'Estimated prompt size per upstream call.', ('model',), TOKEN_BUCKETS,
+        )
+        self.completion_tokens = Histogram(
+            'llm_completion_tokens', 'Estimated completion size per upstream call.', ('model',), TOKEN_BUCKETS,
+        )
+        self.history_trimmed = Counter(
+            'chat_history_trimmed_total', 'History messages dropped to fit the prompt token budget.', ('model',),
+        )
+        self.fallbacks = Counter('chat_fallback_total', 'Chat answers served without the LLM.', ('reason',))
+        self.loop_lag = Histogram('event_loop_lag_seconds', 'Scheduling delay of the event loop.', (), LAG_BUCKETS)
+        self.rate_limited = Counter('http_rate_limited_total', 'Requests rejected by the per-client rate limiter.', ('budget',))
+        self._metrics: List[Any] = [
+            self.http_latency, self.llm_latency, self.llm_errors, self.prompt_tokens,
+            self.completion_tokens, self.history_trimmed, self.fallbacks, self.loop_lag, self.rate_limited,
+        ]
+
+    def register(self, metric: Any) -> None:
+        self._metrics.append(metric)
+
+    def register_stats(
+        self,
+        prefix: str,
+        get_stats: Callable[[], Dict[str, Any]],
+        counters: Sequence[str] = (),
+        gauges: Sequence[str] = (),
+    ) -> None:
+        """Expose fields of a component's stats() dict, read at scrape time."""
+        for key in counters:
+            self.register(CallbackMetric(
+                f'{prefix}_{key}_total', f'{prefix} {key}.', 'counter', lambda k=key: [((), get_stats()[k])],
+            ))
+        for key in gauges:
+            self.register(CallbackMetric(
+                f'{prefix}_{key}', f'{prefix} {key}.', 'gauge', lambda k=key: [((), get_stats()[k])],
+            ))
+
+    def model_label(self, model: str) -> str:
+        return model if model in self.models else OTHER_MODEL
+
+    def observe_trimmed(self, model: str, amount: int) -> None:
+        self.history_trimmed.inc(self.model_label(model), amount=amount)
+
+    def observe_llm_call(self, model: str, language: str, messages: List[Dict[str, str]], started: float, text: str = '', error: str = '') -> None:
+        elapsed = time.perf_counter() - started
+        model = self.model_label(model)
+        self.llm_latency.observe(elapsed, model, language, 'error' if error else 'ok')
+        self.prompt_tokens.observe(sum(estimate_tokens(m.get('content', '')) for m in messages), model)
+        if error:
+            self.llm_errors.inc(model, language, error)
+        else:
+            self.completion_tokens.observe(estimate_tokens(text), model)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics:
+            metric.render(out)
+        return '\n'.join(out) + '\n'
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency without buffering streamed bodies."""
+
+    def __init__(self, app: Any, metrics: ServiceMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route templates keep label cardinality bounded; unmatched paths share one label
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            self.metrics.http_latency.observe(time.perf_counter() - started, scope['method'], path, str(status[0]))
+
+
+async def monitor_loop_lag(metrics: ServiceMetrics, interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        metrics.loop_lag.observe(max(0.0, loop.time() - started - interval))
@@ -0,0 +1,45 @@
+"""Keyset pagination helpers for (timestamp, id) ordered collections."""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp: datetime, id: str) -> str:
+    raw = f"{timestamp.isoformat()}|{id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        ts, id = raw.split('|', 1)
+        return datetime.fromisoformat(ts), id
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def keyset_filter(after: Tuple[datetime, str], descending: bool = False) -> Dict[str, Any]:
+    # Descending pages continue with what comes before the cursor
+    ts, id = after
+    op = "$lt" if descending else "$gt"
+    return {"$or": [{"timestamp": {op: ts}}, {"timestamp": ts, "id": {op: id}}]}
+
+
+def _default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def ndjson_line(doc: Dict[str, Any]) -> str:
+    return dumps(doc) + "\n"
@@ -0,0 +1,346 @@
+"""Opt-in per-request profiling: stage spans plus a sampling stack profiler.
+
+A request is profiled when it carries ``X-Profile-Token: <PROFILE_TOKEN>``,
+or when it is picked at random at PROFILE_SAMPLE_RATE. While it runs:
+
+- ``with span('prompt'):`` blocks in the chat path record wall-clock stage
+  timings. ProfilingMiddleware adds the stages around the handler: reading
+  the body, validation (body read until the handler's first span), and
+  serialization (handler done until the response starts).
+- A sampler thread reads the event loop thread's stack every
+  PROFILE_INTERVAL_MS. It keeps only the samples whose stack runs through
+  this request's middleware frame, so concurrent requests do not leak into
+  each other's profile. Sampling needs the GIL, so the effective resolution
+  is bounded by sys.getswitchinterval() (5 ms by default).
+
+The last PROFILE_RING_SIZE profiles are kept in memory. GET
+/api/admin/profiles/... returns them as JSON, or as collapsed stacks that
+flamegraph.pl, speedscope and inferno read directly: ``kind=samples`` for
+CPU stacks, ``kind=spans`` for stage self-times in microseconds.
+
+With profiling off, the middleware is not installed, and ``span()`` is a
+context-variable read that returns a shared no-op context manager.
+"""
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from starlette.responses import PlainTextResponse
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+_TOKEN_KEY = PROFILE_TOKEN_HEADER.lower().encode('latin-1')
+
+_current: ContextVar[Optional["Profile"]] = ContextVar('profile', default=None)
+_span_path: ContextVar[Tuple[str, ...]] = ContextVar('profile_span_path', default=())
+_NULL_SPAN = nullcontext()
+
+Span = Tuple[Tuple[str, ...], float, float]  # (path, start, end), perf_counter seconds
+
+
+class _Span:
+    __slots__ = ('profile', 'path', 'started', 'token')
+
+    def __init__(self, profile: "Profile", name: str):
+        self.profile = profile
+        self.path = _span_path.get() + (name,)
+
+    def __enter__(self):
+        self.token = _span_path.set(self.path)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.spans.append((self.path, self.started, time.perf_counter()))
+        _span_path.reset(self.token)
+        return False
+
+
+def span(name: str):
+    """Time a stage of the current request, if it is being profiled."""
+    profile = _current.get()
+    if profile is None:
+        return _NULL_SPAN
+    return _Span(profile, name)
+
+
+def _frame_label(code: Any) -> str:
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Profile:
+    def __init__(self, profile_id: int, method: str, path: str, reason: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.status = 0
+        self.spans: List[Span] = []
+        self.samples: Counter = Counter()
+        self.body_read: Optional[float] = None
+        self.response_started: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.method} {self.path}"
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+        handler = [s for s in self.spans if len(s[0]) == 1]
+        if not handler:
+            return
+        first = min(s[1] for s in handler)
+        last = max(s[2] for s in handler)
+        body_read = self.body_read if self.body_read is not None and self.body_read <= first else first
+        self.spans.append((('request.read_body',), self.started, body_read))
+        self.spans.append((('request.validate',), body_read, first))
+        if self.response_started is not None and self.response_started >= last:
+            self.spans.append((('response.serialize',), last, self.response_started))
+
+    def span_self_times(self) -> Dict[Tuple[str, ...], float]:
+        """Exclusive time per span path in seconds; concurrent children can exceed their parent, so clamp at 0."""
+        totals: Dict[Tuple[str, ...], float] = {}
+        for path, start, end in self.spans:
+            totals[path] = totals.get(path, 0.0) + (end - start)
+        out = dict(totals)
+        for path, duration in totals.items():
+            if len(path) > 1:
+                parent = path[:-1]
+                if parent in out:
+                    out[parent] -= duration
+        total = (self.finished or time.perf_counter()) - self.started
+        out[()] = total - sum(d for p, d in totals.items() if len(p) == 1)
+        return {p: max(0.0, d) for p, d in out.items()}
+
+    def collapsed(self, kind: str = 'samples') -> List[str]:
+        if kind == 'spans':
+            return [f"{';'.join((self.label,) + path)} {round(seconds * 1e6)}"
+                    for path, seconds in sorted(self.span_self_times().items()) if seconds > 0]
+        return [f"{self.label};{stack} {count}" for stack, count in sorted(self.samples.items())]
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.finished or time.perf_counter()
+        stages: Dict[str, float] = {}
+        for path, start, stop in self.spans:
+            key = '.'.join(path)
+            stages[key] = stages.get(key, 0.0) + (stop - start) * 1000
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'reason': self.reason,
+            'timestamp': self.timestamp,
+            'duration_ms': round((end - self.started) * 1000, 3),
+            'stages_ms': {k: round(v, 3) for k, v in stages.items()},
+            'samples': sum(self.samples.values()),
+        }
+
+
+class StackSampler:
+    """Background thread sampling the stacks of threads running profiled requests."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[Profile, int, Any]] = {}  # id(profile) -> (profile, thread id, root frame)
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+
+    def add(self, profile: Profile, root_frame: Any) -> None:
+        with self._lock:
+            self._active[id(profile)] = (profile, threading.get_ident(), root_frame)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.pop(id(profile), None)
+
+    def sample_once(self) -> None:
+        with self._lock:
+            active = list(self._active.values())
+        if not active:
+            return
+        frames = sys._current_frames()
+        for profile, thread_id, root in active:
+            frame = frames.get(thread_id)
+            codes = []
+            while frame is not None and frame is not root:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            if frame is None or not codes:
+                continue  # the loop is running something else, or this request is awaiting I/O
+            profile.samples[';'.join(_frame_label(c) for c in reversed(codes))] += 1
+            self.samples += 1
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+            self.sample_once()
+
+
+class Profiler:
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        ring_size: int = 50,
+        interval: float = 0.005,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.token = token or None
+        self.sample_rate = sample_rate
+        self.profiles: "deque[Profile]" = deque(maxlen=ring_size)
+        self.sampler = StackSampler(interval)
+        self._rng = rng
+        self._ids = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None or self.sample_rate > 0
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.token is not None and token is not None and hmac.compare_digest(token, self.token)
+
+    def reason(self, headers: Iterable[Tuple[bytes, bytes]]) -> Optional[str]:
+        if self.token is not None:
+            for key, value in headers:
+                if key == _TOKEN_KEY:
+                    return 'header' if self.authorized(value.decode('latin-1')) else None
+        if self.sample_rate > 0 and self._rng() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, method: str, path: str, reason: str) -> Profile:
+        return Profile(next(self._ids), method, path, reason)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def collapsed(self, kind: str = 'samples') -> str:
+        # Same stacks across profiles merge, so the output reads as one flamegraph
+        merged: Counter = Counter()
+        for profile in self.profiles:
+            for line in profile.collapsed(kind):
+                stack, _, count = line.rpartition(' ')
+                merged[stack] += int(count)
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'enabled': self.enabled, 'sample_rate': self.sample_rate, 'profiles': len(self.profiles),
+                'ring_size': self.profiles.maxlen, 'interval_ms': self.sampler.interval * 1000,
+                'samples': self.sampler.samples}
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles selected requests; others pass straight through."""
+
+    def __init__(self, app: Any, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        reason = self.profiler.reason(scope['headers'])
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.start(scope['method'], scope['path'], reason)
+        profile_id = str(profile.id).encode('latin-1')
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request' and not message.get('more_body'):
+                profile.body_read = time.perf_counter()
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                profile.response_started = time.perf_counter()
+                profile.status = message['status']
+                message = {**message, 'headers': [*message.get('headers', []), (b'x-profile-id', profile_id)]}
+            await send(message)
+
+        token = _current.set(profile)
+        self.profiler.sampler.add(profile, sys._getframe())
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self.profiler.sampler.remove(profile)
+            _current.reset(token)
+            profile.finish()
+            self.profiler.profiles.append(profile)
+
+
+def profiler_from_env() -> Profiler:
+    return Profiler(
+        token=os.environ.get('PROFILE_TOKEN'),
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+        ring_size=int(os.environ.get('PROFILE_RING_SIZE', 50)),
+        interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000,
+    )
+
+
+# ====== Admin routes ======
+router = APIRouter(prefix="/api/admin/profiles")
+
+
+def _profiler(request: Request, token: Optional[str]) -> Profiler:
+    profiler = request.app.state.profiler
+    if profiler.token is None:
+        raise HTTPException(status_code=404, detail="Profiling admin is disabled (set PROFILE_TOKEN)")
+    if not profiler.authorized(token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    return profiler
+
+
+@router.get("")
+async def list_profiles(request: Request, x_profile_token: Optional[str] = Header(None)):
+    profiler = _profiler(request, x_profile_token)
+    return {**profiler.stats(), 'items': [p.summary() for p in reversed(profiler.profiles)]}
+
+
+@router.get("/collapsed", response_class=PlainTextResponse)
+async def all_profiles_collapsed(
+    request: Request,
+    kind: str = Query('samples', pattern='^(samples|spans)$'),
+    x_profile_token: Optional[str] = Header(None),
+):
+    return _profiler(request, x_profile_token).collapsed(kind)
+
+
+@router.get("/{profile_id}")
+async def get_profile(
+    profile_id: int,
+    request: Request,
+    format: str = Query('json', pattern='^(json|collapsed|spans)$'),
+    x_profile_token: Optional[str] = Header(None),
+):
+    profile = _profiler(request, x_profile_token).get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have left the ring buffer)")
+    if format == 'json':
+        return {**profile.summary(), 'samples_collapsed': profile.collapsed('samples')}
+    lines = profile.collapsed('samples' if format == 'collapsed' else 'spans')
+    return PlainTextResponse(''.join(line + '\n' for line in lines))
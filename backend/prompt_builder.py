@@ -0,0 +1,172 @@
+"""Token-budgeted prompt assembly for /api/chat.
+
+The system prompt and summary are serialized compactly and the chat history
+is trimmed newest-first to the model's prompt budget, so prompt size (and
+with it upstream latency and cost) stays bounded however chatty a user is.
+The summary is capped at a share of the budget (trailing fields are dropped
+first), and the user's latest message is never cut below MIN_QUESTION_TOKENS.
+Token counts use the same ~4 chars/token estimate as the metrics.
+"""
+import json
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from metrics import estimate_tokens
+
+PROMPT_TOKENS_HEADER = "X-Prompt-Tokens"
+DEFAULT_BUDGET = 1500
+# Role/separator tokens the chat format adds to every message
+MESSAGE_OVERHEAD = 4
+MAX_STRING_CHARS = 80
+# Numbers are rounded to fixed decimals: significant digits would turn 1234.5 into 1230
+SUMMARY_DECIMALS = 3
+# The summary may use at most this share of the budget; the rest is for the chat
+SUMMARY_BUDGET_SHARE = 0.25
+# The latest message is cut to the budget if needed, but never below this
+MIN_QUESTION_TOKENS = 64
+
+# Short, self-describing keys for the fields of the app's buildCompactSummary
+SUMMARY_KEYS = {
+    'water_avg14': 'water14d',
+    'coffee_avg14': 'coffee14d',
+    'pill_adherence7': 'pills7d%',
+    'weight_last': 'kg',
+    'weight_trend_per_day': 'kg/day',
+    'weekly_event': 'event',
+    'progress': '%',
+}
+# Redundant with the request (language) or meaningless to the model (ids)
+SUMMARY_DROP = {'lang', 'id'}
+
+
+class Prompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    history: List[Dict[str, str]]
+    tokens: int
+    trimmed: int  # history messages dropped to fit the budget
+
+
+def _compact(value: Any) -> Any:
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, float):
+        value = round(value, SUMMARY_DECIMALS)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str):
+        return value if len(value) <= MAX_STRING_CHARS else value[:MAX_STRING_CHARS - 1] + '…'
+    if isinstance(value, dict):
+        return {
+            SUMMARY_KEYS.get(k, k): _compact(v)
+            for k, v in value.items()
+            if k not in SUMMARY_DROP and v is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_compact(v) for v in value]
+    return value
+
+
+def compact_summary(summary: Dict[str, Any]) -> str:
+    return json.dumps(_compact(summary), separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def fit_summary(summary: Dict[str, Any], max_tokens: int) -> Optional[str]:
+    """Compact summary within max_tokens, dropping trailing fields as needed; None if nothing fits."""
+    compact = _compact(summary)
+    while compact:
+        text = json.dumps(compact, separators=(',', ':'), ensure_ascii=False, default=str)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        compact.popitem()
+    return None
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message.get('content', '')) + MESSAGE_OVERHEAD
+
+
+class PromptBuilder:
+    def __init__(
+        self,
+        system_prompts: Dict[str, str],
+        greeting_prompts: Dict[str, str],
+        summary_label: str = "summary",
+        budgets: Optional[Dict[str, int]] = None,
+        default_budget: int = DEFAULT_BUDGET,
+    ):
+        self.greeting_prompts = greeting_prompts
+        self.summary_label = summary_label
+        self.budgets = dict(budgets or {})
+        self.default_budget = default_budget
+        # The system prompt is static per language: build the message and count it once
+        self._prefix = {
+            lang: ({"role": "system", "content": text}, estimate_tokens(text) + MESSAGE_OVERHEAD)
+            for lang, text in system_prompts.items()
+        }
+
+    def budget(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    def build(
+        self,
+        mode: str,
+        language: str,
+        model: str,
+        summary: Optional[Dict[str, Any]] = None,
+        history: Sequence[Dict[str, str]] = (),
+    ) -> Prompt:
+        system, tokens = self._prefix.get(language) or self._prefix['en']
+        msgs: List[Dict[str, str]] = [system]
+        budget = self.budget(model)
+        # Inject compact summary as assistant context, within its share of the budget
+        if summary:
+            label = f"{self.summary_label}: "
+            cap = int(budget * SUMMARY_BUDGET_SHARE) - MESSAGE_OVERHEAD - estimate_tokens(label)
+            text = fit_summary(summary, cap)
+            if text is not None:
+                msg = {"role": "system", "content": label + text}
+                msgs.append(msg)
+                tokens += message_tokens(msg)
+
+        if mode == 'greeting':
+            msg = {"role": "user", "content": self.greeting_prompts[language]}
+            msgs.append(msg)
+            return Prompt(msgs, [], tokens + message_tokens(msg), 0)
+
+        # Keep the newest messages that fit; the latest one is always sent, cut to the budget if needed
+        remaining = budget - tokens
+        kept: List[Dict[str, str]] = []
+        for m in reversed(history):
+            cost = message_tokens(m)
+            if cost > remaining:
+                if not kept:
+                    chars = max(remaining - MESSAGE_OVERHEAD, MIN_QUESTION_TOKENS) * 4
+                    m = {"role": m['role'], "content": m['content'][-chars:]}
+                    kept.append(m)
+                    tokens += message_tokens(m)
+                break
+            kept.append(m)
+            remaining -= cost
+            tokens += cost
+        kept.reverse()
+        msgs.extend(kept)
+        return Prompt(msgs, kept, tokens, len(history) - len(kept))
+
+
+def prompt_builder_from_env(
+    system_prompts: Dict[str, str],
+    greeting_prompts: Dict[str, str],
+    summary_label: str = "summary",
+) -> PromptBuilder:
+    # PROMPT_TOKEN_BUDGETS overrides the default per model: "gpt-4o-mini=1500,gpt-4o=3000"
+    budgets = {}
+    for item in os.environ.get('PROMPT_TOKEN_BUDGETS', '').split(','):
+        if '=' in item:
+            model, tokens = item.split('=', 1)
+            budgets[model.strip()] = int(tokens)
+    return PromptBuilder(
+        system_prompts,
+        greeting_prompts,
+        summary_label,
+        budgets=budgets,
+        default_budget=int(os.environ.get('PROMPT_TOKEN_BUDGET', DEFAULT_BUDGET)),
+    )
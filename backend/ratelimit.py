@@ -0,0 +1,267 @@
+"""Per-client token-bucket rate limiting for /api/chat and /api/status.
+
+Each budget (``burst`` requests, refilled at ``rate`` per second) keeps one
+bucket per client: a two-slot list [tokens, last_update] in an OrderedDict
+ordered by last use. A request refills the bucket lazily from the elapsed
+time, so there are no timers and no per-request allocations once a client
+is known. Buckets idle for longer than a full refill are exactly as good as
+new ones, so they are evicted from the cold end as requests come in; the
+table never holds more than ``max_clients`` entries per budget.
+
+Clients are identified by their address. Behind a reverse proxy the peer is
+the proxy itself, so when it is one of ``trusted_proxies`` the client is the
+rightmost X-Forwarded-For entry that is not a trusted proxy (entries further
+left were written by the client and can be forged). Request headers are never
+taken as an identity on their own.
+
+Off unless RATE_LIMIT=1: the deploy has to say which proxies to trust
+(RATE_LIMIT_TRUSTED_PROXIES), otherwise every user would share the proxy's
+bucket. Run uvicorn with --no-proxy-headers: its own handling rewrites the
+peer to the leftmost X-Forwarded-For entry, which the client controls.
+
+Buckets live in each worker process. With WEB_CONCURRENCY workers every
+budget is divided between them, so N workers together never allow more than
+one process would; a client whose requests all land on one worker (one
+keep-alive connection) is limited a little early rather than N times late.
+
+The middleware charges one token per request. Routes whose cost depends on
+the body (/api/chat/batch makes one upstream call per item) take the rest
+from the same bucket with ``RateLimiter.charge_more`` once the body is parsed.
+"""
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple, Union
+
+from metrics import Counter
+
+_FORWARDED_FOR_KEY = b'x-forwarded-for'
+_MAX_SEEN = 4096
+_TOO_MANY = b'{"detail":"Too Many Requests"}'
+_TOO_MANY_LENGTH = str(len(_TOO_MANY)).encode('latin-1')
+# scope['state'] entry (budget, client) for the bucket the middleware charged
+_CHARGED = 'rate_limit'
+
+
+class Budget(NamedTuple):
+    burst: float
+    rate: float  # tokens per second
+
+
+DEFAULT_BUDGETS = {
+    'chat': Budget(20, 20 / 60),
+    'status': Budget(120, 2.0),
+}
+# First matching prefix wins
+DEFAULT_ROUTES: Sequence[Tuple[str, str]] = (('/api/chat', 'chat'), ('/api/status', 'status'))
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, Budget]] = None,
+        routes: Sequence[Tuple[str, str]] = DEFAULT_ROUTES,
+        max_clients: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.routes = tuple((prefix, name) for prefix, name in routes if name in self.budgets)
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: Dict[str, "OrderedDict[str, list]"] = {name: OrderedDict() for name in self.budgets}
+        # A bucket idle this long has refilled completely
+        self._idle = {name: b.burst / b.rate for name, b in self.budgets.items()}
+        self.allowed = 0
+        self.rejected = {name: 0 for name in self.budgets}
+        self.evictions = 0
+
+    def budget_for(self, path: str) -> Optional[str]:
+        for prefix, name in self.routes:
+            if path.startswith(prefix):
+                return name
+        return None
+
+    def acquire(self, name: str, client: str, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens; returns 0 when allowed, else the seconds until they are available."""
+        budget = self.budgets[name]
+        cost = min(cost, budget.burst)
+        buckets = self._buckets[name]
+        now = self._clock()
+        entry = buckets.get(client)
+        if entry is None:
+            entry = buckets[client] = [budget.burst, now]
+            self._evict(name, buckets, now)
+        else:
+            buckets.move_to_end(client)
+            entry[0] = min(budget.burst, entry[0] + (now - entry[1]) * budget.rate)
+            entry[1] = now
+        if entry[0] >= cost:
+            entry[0] -= cost
+            self.allowed += 1
+            return 0.0
+        self.rejected[name] += 1
+        return (cost - entry[0]) / budget.rate
+
+    def charge_more(self, scope: Dict[str, Any], cost: float) -> Tuple[Optional[str], float]:
+        """Take ``cost`` more tokens for a request the middleware already let through.
+
+        Returns the budget name and the wait as ``acquire`` does; (None, 0) for
+        routes without a budget.
+        """
+        charged = scope.get('state', {}).get(_CHARGED)
+        if charged is None or cost <= 0:
+            return None, 0.0
+        name, client = charged
+        return name, self.acquire(name, client, cost)
+
+    def _evict(self, name: str, buckets: "OrderedDict[str, list]", now: float) -> None:
+        # Amortized O(1): each bucket is evicted at most once
+        idle_before = now - self._idle[name]
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if oldest[1] > idle_before and len(buckets) <= self.max_clients:
+                return
+            buckets.popitem(last=False)
+            self.evictions += 1
+
+    def reset(self) -> None:
+        for buckets in self._buckets.values():
+            buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'budgets': {name: {'burst': b.burst, 'per_second': b.rate, 'clients': len(self._buckets[name])}
+                        for name, b in self.budgets.items()},
+            'allowed': self.allowed,
+            'rejected': dict(self.rejected),
+            'evictions': self.evictions,
+        }
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class TrustedProxies:
+    """Addresses and CIDR ranges of reverse proxies; anything else must match the peer name exactly."""
+
+    def __init__(self, entries: Iterable[str] = ()):
+        networks, names = [], set()
+        for entry in filter(None, (e.strip() for e in entries)):
+            try:
+                networks.append(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                names.add(entry)
+        self.networks: Tuple[Network, ...] = tuple(networks)
+        self.names = frozenset(names)
+        self._seen: Dict[str, bool] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.networks or self.names)
+
+    def __contains__(self, host: str) -> bool:
+        # Parsing an address costs more than the bucket update, so answers are memoized
+        trusted = self._seen.get(host)
+        if trusted is None:
+            trusted = self._match(host)
+            if len(self._seen) >= _MAX_SEEN:
+                self._seen.clear()
+            self._seen[host] = trusted
+        return trusted
+
+    def _match(self, host: str) -> bool:
+        if host in self.names:
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+
+def client_key(scope: Dict[str, Any], trusted: Optional[TrustedProxies] = None) -> str:
+    client = scope.get('client')
+    host = client[0] if client else 'unknown'
+    if not trusted or host not in trusted:
+        return host
+    forwarded = b','.join(value for key, value in scope['headers'] if key == _FORWARDED_FOR_KEY)
+    hops = [hop.strip() for hop in forwarded.decode('latin-1').split(',')]
+    for hop in reversed(hops):
+        if hop and hop not in trusted:
+            return hop
+    # Every hop is a proxy: the leftmost is as close to the client as we get
+    return hops[0] or host
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering 429 with Retry-After once a client's bucket is empty."""
+
+    def __init__(
+        self,
+        app: Any,
+        limiter: RateLimiter,
+        rejected: Optional[Counter] = None,
+        trusted_proxies: Optional[TrustedProxies] = None,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.rejected = rejected
+        self.trusted_proxies = trusted_proxies
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        name = self.limiter.budget_for(scope['path'])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        client = client_key(scope, self.trusted_proxies)
+        wait = self.limiter.acquire(name, client)
+        if not wait:
+            scope.setdefault('state', {})[_CHARGED] = (name, client)
+            await self.app(scope, receive, send)
+            return
+        if self.rejected is not None:
+            self.rejected.inc(name)
+        await send({
+            'type': 'http.response.start',
+            'status': 429,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', _TOO_MANY_LENGTH),
+                (b'retry-after', retry_after(wait).encode('latin-1')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': _TOO_MANY})
+
+
+def retry_after(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
+
+
+def _budget(value: str) -> Budget:
+    # "20/60": bursts of 20, refilled at 20 per 60 seconds
+    count, _, seconds = value.partition('/')
+    burst = float(count)
+    return Budget(burst, burst / float(seconds or 1))
+
+
+def trusted_proxies_from_env() -> TrustedProxies:
+    # Comma-separated addresses or CIDR ranges of the reverse proxies in front of the app
+    return TrustedProxies(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '').split(','))
+
+
+def rate_limiter_from_env() -> Optional[RateLimiter]:
+    if os.environ.get('RATE_LIMIT', '0').lower() not in ('1', 'true', 'on'):
+        return None
+    workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    budgets = {}
+    for name, budget in DEFAULT_BUDGETS.items():
+        value = os.environ.get(f'RATE_LIMIT_{name.upper()}')
+        if value:
+            budget = _budget(value)
+        # Each worker's share; a burst below one request would reject everything
+        budgets[name] = Budget(max(1.0, budget.burst / workers), budget.rate / workers)
+    return RateLimiter(budgets, max_clients=int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 100_000)))
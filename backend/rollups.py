@@ -0,0 +1,247 @@
+"""Weekly and monthly rollups of synced days, maintained as days are written.
+
+One small document per (user, period, key), where key is the ISO week
+(``2024-W03``) or the month (``2024-01``). It holds running sums and counts
+(water, coffee, pill compliance, sport, adherence score, and least-squares
+sums for the weight trend) plus a flag per logged day: 1 for logged, 2 for a
+perfect day (both pills, >= 6 glasses of water, weight logged, as in the
+app's dayPerfect()). Streaks are derived from the flags, and they merge
+across periods through their leading and trailing runs. Analysis screens
+therefore read one document per period instead of every raw day.
+
+Every day write applies the difference between the old and the new day:
+``$inc`` on the sums and ``$set``/``$unset`` on that day's flag. rebuild()
+recomputes a user's rollups from the raw days. Use it after a bulk import,
+or to remove float drift from many small increments:
+
+    python rollups.py --user <user_id>     # or --all; uses MONGO_URL / DB_NAME
+"""
+import argparse
+import asyncio
+import os
+from datetime import date as Date
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+PERIODS = ('week', 'month')
+PERFECT_WATER = 6  # glasses, same threshold as dayPerfect() in the app
+LOGGED, PERFECT = 1, 2
+SUM_FIELDS = ('days', 'water', 'coffee', 'pills_both', 'sport', 'adherence',
+              'weight_n', 'weight_sum', 'weight_t', 'weight_tt', 'weight_tw')
+_EPOCH = Date(2000, 1, 1).toordinal()
+
+# (period, key, increments, day index within the period, flag or None to clear)
+RollupUpdate = Tuple[str, str, Dict[str, float], str, Optional[int]]
+
+
+def period_slots(date: str) -> List[Tuple[str, str, str]]:
+    """(period, key, day index) of the week and month containing ``date``."""
+    d = Date.fromisoformat(date)
+    year, week, weekday = d.isocalendar()
+    return [('week', f'{year}-W{week:02d}', str(weekday)), ('month', date[:7], str(d.day))]
+
+
+def day_values(date: str, day: Optional[Dict[str, Any]]) -> Tuple[Dict[str, float], Optional[int]]:
+    """One day's contribution to the sums, and its flag."""
+    if day is None:
+        return {k: 0.0 for k in SUM_FIELDS}, None
+    pills = day.get('pills') or {}
+    drinks = day.get('drinks') or {}
+    water = float(drinks.get('water') or 0)
+    both = bool(pills.get('morning')) and bool(pills.get('evening'))
+    sport = bool(drinks.get('sport'))
+    weight = day.get('weight')
+    has_weight = weight is not None
+    t = float(Date.fromisoformat(date).toordinal() - _EPOCH)
+    w = float(weight) if has_weight else 0.0
+    values = {
+        'days': 1.0,
+        'water': water,
+        'coffee': float(drinks.get('coffee') or 0),
+        'pills_both': float(both),
+        'sport': float(sport),
+        # Same score as computePremiumInsights() in the app
+        'adherence': 40.0 * both + min(30.0, water * 5.0) + 15.0 * has_weight + 15.0 * sport,
+        'weight_n': float(has_weight),
+        'weight_sum': w,
+        'weight_t': t * has_weight,
+        'weight_tt': t * t * has_weight,
+        'weight_tw': t * w,
+    }
+    perfect = both and water >= PERFECT_WATER and has_weight
+    return values, PERFECT if perfect else LOGGED
+
+
+def day_updates(date: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> List[RollupUpdate]:
+    """Rollup changes for replacing the ``old`` version of a day with ``new``."""
+    if old is None and new is None:
+        return []
+    before, _ = day_values(date, old)
+    after, flag = day_values(date, new)
+    inc = {k: after[k] - before[k] for k in SUM_FIELDS if after[k] != before[k]}
+    return [(period, key, inc, idx, flag) for period, key, idx in period_slots(date)]
+
+
+def apply_update(doc: Dict[str, Any], inc: Dict[str, float], idx: str, flag: Optional[int]) -> None:
+    for k, v in inc.items():
+        doc[k] = doc.get(k, 0.0) + v
+    flags = doc.setdefault('flags', {})
+    if flag is None:
+        flags.pop(idx, None)
+    else:
+        flags[idx] = flag
+
+
+def build_rollups(user: str, days: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Rollup documents computed from scratch from (date, day) pairs."""
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for date, day in days:
+        for period, key, inc, idx, flag in day_updates(date, None, day):
+            doc = docs.setdefault((period, key), {'user': user, 'period': period, 'key': key})
+            apply_update(doc, inc, idx, flag)
+    return list(docs.values())
+
+
+def _runs(flags: Dict[str, int]) -> Dict[str, Any]:
+    """Perfect-day runs over the logged days of one period, in day order."""
+    seq = [flags[i] == PERFECT for i in sorted(flags, key=int)]
+    lead = next((i for i, p in enumerate(seq) if not p), len(seq))
+    trail = next((i for i, p in enumerate(reversed(seq)) if not p), len(seq))
+    best = cur = 0
+    for p in seq:
+        cur = cur + 1 if p else 0
+        best = max(best, cur)
+    return {'lead': lead, 'trail': trail, 'best': best, 'all': lead == len(seq)}
+
+
+def _slope(s: Dict[str, float]) -> float:
+    n = s.get('weight_n', 0)
+    denom = n * s.get('weight_tt', 0) - s.get('weight_t', 0) ** 2
+    if n < 2 or abs(denom) < 1e-9:
+        return 0.0
+    return (n * s['weight_tw'] - s['weight_t'] * s['weight_sum']) / denom
+
+
+def _derived(s: Dict[str, float]) -> Dict[str, Any]:
+    days = s.get('days', 0)
+    avg = (lambda k: s.get(k, 0) / days) if days else (lambda k: 0.0)
+    n_weight = s.get('weight_n', 0)
+    return {
+        'days': int(round(days)),
+        'water_avg': avg('water'),
+        'coffee_avg': avg('coffee'),
+        'compliance_rate': avg('pills_both'),
+        'sport_days': int(round(s.get('sport', 0))),
+        'adherence_avg': avg('adherence'),
+        'weight_avg': s['weight_sum'] / n_weight if n_weight else None,
+        'weight_trend_per_day': _slope(s),
+    }
+
+
+def summarize(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-period figures plus the total over ``docs`` (sorted by key), O(len(docs))."""
+    periods = []
+    totals = {k: 0.0 for k in SUM_FIELDS}
+    best = current = 0
+    for doc in docs:
+        if not doc.get('flags'):
+            continue
+        runs = _runs(doc['flags'])
+        # Runs cross period boundaries: the app counts consecutive logged days
+        best = max(best, runs['best'], current + runs['lead'])
+        current = current + runs['lead'] if runs['all'] else runs['trail']
+        for k in SUM_FIELDS:
+            totals[k] += doc.get(k, 0.0)
+        periods.append({'key': doc['key'], **_derived(doc), 'best_perfect': runs['best']})
+    return {'periods': periods, 'total': {**_derived(totals), 'best_perfect': best, 'current_perfect': current}}
+
+
+class MongoRollupStore:
+    def __init__(self, get_db: Callable[[], Any]):
+        self._get_db = get_db
+
+    async def ensure_indexes(self) -> None:
+        await self._get_db().rollups.create_index(
+            [("user", 1), ("period", 1), ("key", 1)], unique=True, name="user_period_key",
+        )
+
+    async def apply(self, user: str, updates: List[RollupUpdate]) -> None:
+        from pymongo import UpdateOne
+        ops = []
+        for period, key, inc, idx, flag in updates:
+            flag_op = {"$set": {f"flags.{idx}": flag}} if flag is not None else {"$unset": {f"flags.{idx}": ""}}
+            update = {**flag_op, **({"$inc": inc} if inc else {})}
+            ops.append(UpdateOne({"user": user, "period": period, "key": key}, update, upsert=True))
+        if ops:
+            await self._get_db().rollups.bulk_write(ops, ordered=True)
+
+    async def periods(self, user: str, period: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"user": user, "period": period}
+        if start or end:
+            query["key"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+        return await self._get_db().rollups.find(query, {"_id": 0}).sort("key", 1).to_list(None)
+
+    async def _raw_days(self, user: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        cursor = self._get_db().days.find({"user": user, "day": {"$exists": True}}, {"_id": 0, "date": 1, "day": 1})
+        async for doc in cursor.batch_size(1000):
+            yield doc['date'], doc['day']
+
+    async def rebuild(self, user: str) -> int:
+        # Not atomic with concurrent pushes for the same user; run it when they are idle
+        docs = build_rollups(user, [d async for d in self._raw_days(user)])
+        rollups = self._get_db().rollups
+        await rollups.delete_many({"user": user})
+        if docs:
+            await rollups.insert_many(docs)
+        return len(docs)
+
+    async def users(self) -> List[str]:
+        return await self._get_db().days.distinct("user")
+
+
+class MemoryRollupStore:
+    def __init__(self, raw_days: Callable[[str], Iterable[Tuple[str, Dict[str, Any]]]]):
+        self._raw_days = raw_days
+        self._docs: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    async def apply(self, user: str, updates: List[RollupUpdate]) -> None:
+        for period, key, inc, idx, flag in updates:
+            doc = self._docs.setdefault((user, period, key), {'user': user, 'period': period, 'key': key})
+            apply_update(doc, inc, idx, flag)
+
+    async def periods(self, user: str, period: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        docs = [doc for (u, p, key), doc in self._docs.items()
+                if u == user and p == period and (not start or key >= start) and (not end or key <= end)]
+        return sorted(docs, key=lambda d: d['key'])
+
+    async def rebuild(self, user: str) -> int:
+        for k in [k for k in self._docs if k[0] == user]:
+            del self._docs[k]
+        docs = build_rollups(user, self._raw_days(user))
+        for doc in docs:
+            self._docs[(user, doc['period'], doc['key'])] = doc
+        return len(docs)
+
+
+async def _rebuild_cli(users: Optional[List[str]]) -> None:
+    from storage import MongoStorage
+    storage = MongoStorage(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    rollups = storage.sync.rollups
+    try:
+        await rollups.ensure_indexes()
+        for user in users or await rollups.users():
+            print(f"{user}: {await rollups.rebuild(user)} rollups")
+    finally:
+        await storage.shutdown()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Rebuild weekly/monthly rollups from the synced days.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--user', action='append', help="user id (repeatable)")
+    group.add_argument('--all', action='store_true', help="every user with synced days")
+    args = parser.parse_args(argv)
+    asyncio.run(_rebuild_cli(None if args.all else args.user))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,62 +1,61 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Header, Path as PathParam, Query, Request
 from dotenv import load_dotenv
-from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from starlette.responses import Response, StreamingResponse
+import asyncio
 import logging
+import os
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict, Any
-import uuid
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Dict, Any, AsyncIterator, Tuple, Union, Annotated
+import time
 from datetime import datetime
 
-# LLM Integrations (Emergent)
-try:
-    from emergentintegrations import llm_client
-except Exception:  # pragma: no cover – fallback if lib not present
-    llm_client = None
+from admission import (
+    LLMUnavailable,
+    admission_from_env,
+    breaker_from_env,
+    deadline_from_header,
+    default_deadline_ms,
+    run_with_deadline,
+)
+from app_factory import build_app
+from chat_cache import cache_from_env, make_cache_key
+from day_data import DEFAULT_WINDOWS, Cycle, CycleLog, DateKey, DayData, day_list
+from fallback import keyword_reply
+from greetings import greetings_from_env, warmer_from_env
+from history_io import NdjsonError, export_batch_from_env, gzip_chunks, import_batch_from_env, import_ndjson, ndjson_chunks
+from intents import intents_from_env
+from llm_loader import LazyLLMClient
+from llm_stream import SSE_HEADERS, guarded_stream, sse_event
+from metrics import CONTENT_TYPE, CallbackMetric, ServiceMetrics
+from profiling import span
+from prompt_builder import PROMPT_TOKENS_HEADER, Prompt, prompt_builder_from_env
+from ratelimit import RateLimiter, TrustedProxies, retry_after
+from rollups import summarize
+from sessions import SESSION_ID_MIN_LENGTH, SessionConflict, open_session
+from singleflight import SingleFlight, flight_key
+from status_api import StatusCheck, StatusCheckCreate  # noqa: F401  (re-exported)
+from storage import storage_from_env
+from sync import DEFAULT_PULL_LIMIT, MAX_PULL_LIMIT, SYNC_FIELDS, max_push_from_env, sync_auth_from_env
+from upstream_probe import prober_from_env
+
+# LLM Integrations (Emergent), imported on the first chat request
+llm = LazyLLMClient()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI()
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 
-# Define Models
-class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-
-class StatusCheckCreate(BaseModel):
-    client_name: str
-
 @api_router.get("/")
 async def root():
     return {"message": "Hello World"}
 
-@api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
-
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
-
 # ====== Gugi AI (LLM-Light via Emergent) ======
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get('CHAT_BATCH_MAX_ITEMS', 8))
+
 class ChatMessage(BaseModel):
     role: Literal['system','user','assistant']
     content: str
@@ -67,9 +66,63 @@ class ChatRequest(BaseModel):
     model: Optional[str] = None  # e.g., 'gpt-4o-mini'
     summary: Optional[Dict[str, Any]] = None
     messages: Optional[List[ChatMessage]] = None
+    # Server-side session (sessions.py): start one with new_session, then send only
+    # new messages plus the returned session_id and summary_hash
+    new_session: bool = False
+    session_id: Optional[str] = Field(None, min_length=SESSION_ID_MIN_LENGTH, max_length=64)
+    summary_hash: Optional[str] = None
 
 class ChatResponse(BaseModel):
     text: str
+    session_id: Optional[str] = None
+    summary_hash: Optional[str] = None
+
+class ChatResult(BaseModel):
+    text: str = ""
+    status: Literal['success','degraded','error'] = 'success'
+    model_used: Optional[str] = None
+    detail: Optional[str] = None
+    session_id: Optional[str] = None
+    summary_hash: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1, max_length=CHAT_BATCH_MAX_ITEMS)
+
+    @model_validator(mode='after')
+    def _one_item_per_session(self):
+        # Items run concurrently: two turns of one session would overwrite each other's history
+        ids = [r.session_id for r in self.requests if r.session_id]
+        if len(ids) != len(set(ids)):
+            raise ValueError('each session_id may appear only once per batch')
+        return self
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResult]
+
+# Cache of upstream completions, keyed on the normalized request
+chat_cache = cache_from_env()
+llm_flights = SingleFlight()
+llm_admission = admission_from_env()
+llm_breaker = breaker_from_env()
+# General routine questions (how much to drink, workout ideas) answered without the LLM
+intents = intents_from_env()
+# Greetings pre-generated per coarse summary bucket, served without waiting for the LLM
+greetings = greetings_from_env()
+GREETING_WARM_TIMEOUT_S = float(os.environ.get('GREETING_WARM_TIMEOUT_S', 30))
+
+metrics = ServiceMetrics()
+metrics.register_stats('chat_cache', lambda: chat_cache.stats(), counters=('hits', 'misses', 'evictions'), gauges=('entries',))
+metrics.register_stats('llm_flights', lambda: llm_flights.stats(), counters=('upstream_calls', 'coalesced'), gauges=('in_flight',))
+metrics.register_stats('llm_admission', lambda: llm_admission.stats(), counters=('admitted', 'rejected'), gauges=('active', 'queued'))
+metrics.register_stats('greetings', lambda: greetings.stats(), counters=('hits', 'stale_hits', 'misses', 'generated'), gauges=('entries',))
+metrics.register(CallbackMetric(
+    'chat_intent_answers_total', 'Chat questions answered by the intent fast path.', 'counter',
+    lambda: [((intent,), n) for intent, n in intents.answered.items()], ('intent',),
+))
+metrics.register(CallbackMetric(
+    'llm_breaker_open', 'Whether the LLM circuit breaker is open (1) or half-open (0.5).', 'gauge',
+    lambda: [((), {'closed': 0, 'half_open': 0.5, 'open': 1}[llm_breaker.state])],
+))
 
 SYSTEM_PROMPT_DE = (
     "Du bist Gugi – ein freundlicher, pragmatischer Gesundheitscoach. "
@@ -90,17 +143,59 @@ SYSTEM_PROMPT_PL = (
     "Mów swobodnie, pozytywnie i precyzyjnie."
 )
 
-async def _call_llm(messages: List[Dict[str,str]], model: str) -> str:
-    if llm_client is None:
+GREETING_PROMPTS = {
+    'de': "Gib einen sehr kurzen Tipp und einen kurzen Hinweis basierend auf der summary.",
+    'en': "Give one short tip and one short remark based on the summary.",
+    'pl': "Podaj jedną krótką wskazówkę i jedną krótką uwagę na podstawie podsumowania.",
+}
+
+# Static per-language prefix, compact summary, history trimmed to the model's token budget
+prompts = prompt_builder_from_env(
+    {'de': SYSTEM_PROMPT_DE, 'en': SYSTEM_PROMPT_EN, 'pl': SYSTEM_PROMPT_PL},
+    GREETING_PROMPTS,
+    summary_label="summary",
+)
+
+async def _call_llm(messages: List[Dict[str,str]], model: str, deadline: Optional[float] = None, language: str = 'de') -> str:
+    if llm.client is None:
+        metrics.fallbacks.inc("no_client")
         # Fallback: simple echo/tip if integration not available
         return messages[-1].get('content','').strip() or "Hi!"
+    if not llm_breaker.allow():
+        metrics.fallbacks.inc("circuit_open")
+        raise LLMUnavailable("circuit_open")
+    joined = []
+
+    async def shared_call() -> str:
+        # Identical concurrent prompts (e.g. greeting bursts) share one upstream call
+        flight = llm_flights.join(flight_key(messages, model), lambda: _complete(messages, model, language))
+        joined.append(flight)
+        return await llm_flights.wait(flight)
+
     try:
-        resp = await llm_client.chat_completion(
-            model=model,
-            messages=messages,
-            temperature=0.4,
-            max_tokens=280,
-        )
+        with span('llm'):
+            return await run_with_deadline(shared_call(), deadline)
+    except LLMUnavailable as e:
+        metrics.fallbacks.inc(e.reason)
+        # One slow upstream call is one failure, however many waiters gave up on it
+        if e.reason == "deadline" and (not joined or joined[0].claim()):
+            llm_breaker.record_failure()
+        raise
+
+async def _complete(messages: List[Dict[str,str]], model: str, language: str = 'de') -> str:
+    started = time.perf_counter()
+    try:
+        async with llm_admission.slot():
+            started = time.perf_counter()
+            with span('upstream'):
+                resp = await llm.client.chat_completion(
+                    model=model,
+                    messages=messages,
+                    temperature=0.4,
+                    max_tokens=280,
+                )
+        llm_breaker.record_success()
+        upstream.observe(True, time.perf_counter() - started)
         # Unify result extraction across providers
         # emergentintegrations returns OpenAI-style choices
         content = None
@@ -111,50 +206,404 @@ async def _call_llm(messages: List[Dict[str,str]], model: str) -> str:
         if not content:
             # try dict fallback
             content = (getattr(resp, 'content', None) or '').strip()
-        return (content or '').strip() or ""
+        text = (content or '').strip() or ""
+        metrics.observe_llm_call(model, language, messages, started, text)
+        return text
+    except LLMUnavailable:
+        raise
     except Exception as e:
+        llm_breaker.record_failure()
+        upstream.observe(False, time.perf_counter() - started, type(e).__name__)
+        metrics.observe_llm_call(model, language, messages, started, error=type(e).__name__)
         logging.exception("LLM call failed: %s", e)
         raise HTTPException(status_code=500, detail="LLM error")
 
-@api_router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+def _llm_idle() -> bool:
+    admission = llm_admission.stats()
+    return not admission['active'] and not admission['queued'] and llm_breaker.state == 'closed'
+
+async def _generate_greeting(language: str, model: str, summary: Dict[str, Any]) -> Optional[str]:
+    if llm.client is None:
+        return None  # keyword fallbacks are not worth storing
+    prompt = prompts.build('greeting', language, model, summary, [])
+    text = await _call_llm(prompt.messages, model, time.monotonic() + GREETING_WARM_TIMEOUT_S, language)
+    return text
+
+greeting_warmer = warmer_from_env(greetings, _generate_greeting, _llm_idle)
+
+# Upstream readiness, kept current by real calls and a background probe (upstream_probe.py)
+UPSTREAM_PROBE_MODEL = os.environ.get('UPSTREAM_PROBE_MODEL', 'gpt-4o-mini')
+
+async def _probe_upstream() -> bool:
+    # One-token completion, bypassing admission and the breaker: it measures the upstream itself
+    if not llm.loaded:
+        await llm.prewarm()
+    if llm.client is None:
+        return False
+    await llm.client.chat_completion(
+        model=UPSTREAM_PROBE_MODEL, messages=[{"role": "user", "content": "ping"}], temperature=0, max_tokens=1,
+    )
+    return True
+
+upstream = prober_from_env(_probe_upstream)
+metrics.register_stats('llm_upstream', lambda: upstream.stats(), counters=('probes', 'failures'))
+
+def _greeting_reply(req: ChatRequest) -> Optional[str]:
+    if req.mode != 'greeting' or req.messages:
+        return None
+    return greetings.lookup(req.language or 'de', req.model or 'gpt-4o-mini', req.summary)
+
+def _intent_reply(req: ChatRequest) -> Optional[str]:
+    if req.mode != 'chat' or not req.messages or req.messages[-1].role != 'user':
+        return None
+    return intents.answer(req.messages[-1].content, req.language or 'de', req.summary)
+
+def _build_messages(req: ChatRequest) -> Prompt:
+    model = req.model or 'gpt-4o-mini'
+    history = [{"role": m.role, "content": m.content} for m in (req.messages or [])]
+    prompt = prompts.build(req.mode, req.language or 'de', model, req.summary, history)
+    if prompt.trimmed:
+        metrics.observe_trimmed(model, prompt.trimmed)
+    return prompt
+
+async def _answer(req: ChatRequest, deadline: float, response: Optional[Response] = None) -> ChatResult:
     lang = req.language or 'de'
     model = req.model or 'gpt-4o-mini'
-    system = SYSTEM_PROMPT_DE if lang=='de' else (SYSTEM_PROMPT_PL if lang=='pl' else SYSTEM_PROMPT_EN)
-
-    # Build base messages
-    msgs: List[Dict[str,str]] = [
-        {"role":"system","content": system}
-    ]
-    # Inject compact summary as assistant context
-    if req.summary:
-        msgs.append({"role":"system","content": f"summary: {req.summary}"})
-
-    if req.mode == 'greeting':
-        user_prompt = {
-            'de': "Gib einen sehr kurzen Tipp und einen kurzen Hinweis basierend auf der summary.",
-            'en': "Give one short tip and one short remark based on the summary.",
-            'pl': "Podaj jedną krótką wskazówkę i jedną krótką uwagę na podstawie podsumowania.",
-        }[lang]
-        msgs.append({"role":"user","content": user_prompt})
-    else:
-        # normal chat
-        for m in (req.messages or [])[-12:]:
-            msgs.append({"role": m.role, "content": m.content})
-
-    text = await _call_llm(msgs, model)
-    return ChatResponse(text=text)
-
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    with span('intent'):
+        reply = _intent_reply(req)
+    if reply is not None:
+        return ChatResult(text=reply, model_used="intent")
+    with span('greeting_store'):
+        reply = _greeting_reply(req)
+    if reply is not None:
+        return ChatResult(text=reply, model_used=model)
+    with span('prompt'):
+        prompt = _build_messages(req)
+    msgs = prompt.messages
+    if response is not None:
+        response.headers[PROMPT_TOKENS_HEADER] = str(prompt.tokens)
+
+    with span('cache'):
+        cache_key = make_cache_key(req.mode, lang, model, req.summary, prompt.history)
+        cached = await chat_cache.lookup(cache_key)
+    if cached is not None:
+        return ChatResult(text=cached, model_used=model)
+
+    try:
+        text = await _call_llm(msgs, model, deadline, lang)
+    except LLMUnavailable:
+        return ChatResult(text=keyword_reply(msgs, lang, req.summary), status="degraded", model_used="fallback")
+    if llm.client is None:
+        return ChatResult(text=text, model_used="fallback")
+    if text:
+        chat_cache.set(cache_key, text, req.mode)
+    return ChatResult(text=text, model_used=model)
+
+async def _session_answer(req: ChatRequest, deadline: float, sessions: Any, response: Optional[Response] = None) -> ChatResult:
+    if not req.session_id and not req.new_session:
+        return await _answer(req, deadline, response)
+    try:
+        with span('session_load'):
+            session = await open_session(sessions, req.session_id, req.summary, req.summary_hash)
+    except SessionConflict as e:
+        # Client must re-send its full history and summary
+        raise HTTPException(status_code=409, detail=e.reason)
+    delta = [{"role": m.role, "content": m.content} for m in (req.messages or [])]
+    history = [ChatMessage(**m) for m in session.messages] + list(req.messages or [])
+    result = await _answer(req.model_copy(update={"messages": history, "summary": session.summary}), deadline, response)
+    if req.mode == 'chat':
+        session.record_turn(delta, result.text if result.status != "error" else None)
+    with span('session_save'):
+        await sessions.save(session)
+    return result.model_copy(update={"session_id": session.id, "summary_hash": session.summary_hash})
+
+@api_router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat(req: ChatRequest, request: Request, response: Response, x_client_deadline_ms: Optional[str] = Header(None)):
+    with span('chat'):
+        deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+        result = await _session_answer(req, deadline, request.app.state.storage.sessions, response)
+        return ChatResponse(text=result.text, session_id=result.session_id, summary_hash=result.summary_hash)
+
+def _charge_batch(request: Request, items: int) -> None:
+    # The rate limiter charged one chat token for the request; each further item is another upstream call
+    limiter = request.app.state.rate_limiter
+    if limiter is None:
+        return
+    budget, wait = limiter.charge_more(request.scope, items - 1)
+    if wait:
+        metrics.rate_limited.inc(budget)
+        raise HTTPException(status_code=429, detail="Too Many Requests", headers={"Retry-After": retry_after(wait)})
+
+@api_router.post("/chat/batch", response_model=ChatBatchResponse, response_model_exclude_none=True)
+async def chat_batch(batch: ChatBatchRequest, request: Request, x_client_deadline_ms: Optional[str] = Header(None)):
+    # e.g. greeting + insights on app start in one round trip. All items share the
+    # client's deadline; a slow or failing item only affects its own result.
+    _charge_batch(request, len(batch.requests))
+    deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+    sessions = request.app.state.storage.sessions
+    with span('chat_batch'):
+        outcomes = await asyncio.gather(
+            *(_session_answer(req, deadline, sessions) for req in batch.requests), return_exceptions=True,
+        )
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            outcome = ChatResult(status="error", detail=outcome.detail)
+        elif isinstance(outcome, BaseException):
+            logging.error("Chat batch item failed", exc_info=outcome)
+            outcome = ChatResult(status="error", detail="Internal error")
+        results.append(outcome)
+    return ChatBatchResponse(results=results)
+
+async def _chat_events(req: ChatRequest, prompt: Prompt, deadline: float) -> AsyncIterator[str]:
+    lang = req.language or 'de'
+    model = req.model or 'gpt-4o-mini'
+    msgs = prompt.messages
+
+    reply = _intent_reply(req)
+    if reply is not None:
+        yield sse_event("token", {"text": reply})
+        yield sse_event("done", {"status": "success", "model_used": "intent"})
+        return
+
+    reply = _greeting_reply(req)
+    if reply is not None:
+        yield sse_event("token", {"text": reply})
+        yield sse_event("done", {"status": "success", "model_used": model, "cached": True})
+        return
+
+    cache_key = make_cache_key(req.mode, lang, model, req.summary, prompt.history)
+    cached = await chat_cache.lookup(cache_key)
+    if cached is not None:
+        yield sse_event("token", {"text": cached})
+        yield sse_event("done", {"status": "success", "model_used": model, "cached": True})
+        return
+
+    client = llm.client
+    if client is None:
+        yield sse_event("token", {"text": await _call_llm(msgs, model, language=lang)})
+        yield sse_event("done", {"status": "success", "model_used": "fallback"})
+        return
+
+    parts: List[str] = []
+    started = time.perf_counter()
+    try:
+        async for delta in guarded_stream(client, msgs, model, llm_admission, llm_breaker, deadline):
+            parts.append(delta)
+            yield sse_event("token", {"text": delta})
+    except LLMUnavailable as e:
+        metrics.fallbacks.inc(e.reason)
+        yield sse_event("token", {"text": keyword_reply(msgs, lang, req.summary)})
+        yield sse_event("done", {"status": "degraded", "model_used": "fallback"})
+        return
+    except Exception as e:
+        logging.exception("LLM stream failed: %s", e)
+        metrics.observe_llm_call(model, lang, msgs, started, error=type(e).__name__)
+        yield sse_event("done", {"status": "error", "model_used": model, "detail": "LLM error"})
+        return
+
+    text = ''.join(parts).strip()
+    metrics.observe_llm_call(model, lang, msgs, started, text)
+    if text:
+        chat_cache.set(cache_key, text, req.mode)
+    yield sse_event("done", {"status": "success", "model_used": model})
+
+@api_router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, x_client_deadline_ms: Optional[str] = Header(None)):
+    deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+    prompt = _build_messages(req)
+    headers = {**SSE_HEADERS, PROMPT_TOKENS_HEADER: str(prompt.tokens)}
+    return StreamingResponse(_chat_events(req, prompt, deadline), media_type="text/event-stream", headers=headers)
+
+@api_router.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@api_router.get("/chat/cache")
+async def chat_cache_stats():
+    return chat_cache.stats()
+
+@api_router.get("/chat/flights")
+async def chat_flight_stats():
+    return llm_flights.stats()
+
+@api_router.get("/chat/sessions")
+async def chat_session_stats(request: Request):
+    return request.app.state.storage.sessions.stats()
+
+@api_router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str, request: Request):
+    await request.app.state.storage.sessions.delete(session_id)
+    return {"deleted": session_id}
+
+@api_router.get("/chat/greetings")
+async def chat_greeting_stats():
+    return {"store": greetings.stats(), "warmer": greeting_warmer.stats() if greeting_warmer else None}
+
+@api_router.get("/chat/intents")
+async def chat_intent_stats():
+    return intents.stats()
+
+@api_router.get("/chat/admission")
+async def chat_admission_stats():
+    return {"admission": llm_admission.stats(), "breaker": llm_breaker.stats()}
+
+# ====== Day sync ======
+SYNC_MAX_BATCH = max_push_from_env()
+UserId = Annotated[str, PathParam(min_length=1, max_length=64)]
+# Health records: every user-scoped route needs that user's X-Sync-Token (sync.SyncAuth)
+sync_auth = sync_auth_from_env()
+
+def _sync_user(user_id: UserId, x_sync_token: Optional[str] = Header(None)) -> str:
+    if not sync_auth.enabled:
+        raise HTTPException(status_code=503, detail="Day sync is disabled (set SYNC_SECRET)")
+    if not sync_auth.authorized(user_id, x_sync_token):
+        raise HTTPException(status_code=403, detail="Invalid sync token")
+    return user_id
+
+SyncUser = Annotated[str, Depends(_sync_user)]
+
+class SyncChange(BaseModel):
+    date: DateKey
+    # Omitted fields stay as they are on the server; null removes them
+    day: Optional[DayData] = None
+    cycleLog: Optional[CycleLog] = None
+    cycle: Optional[Cycle] = None
+
+    @model_validator(mode='after')
+    def _same_date(self):
+        if self.day is not None and self.day.date != self.date:
+            raise ValueError('day.date must match date')
+        if self.cycle is not None and self.cycle.start != self.date:
+            raise ValueError('cycle.start must match date')
+        return self
+
+    def fields(self) -> Dict[str, Any]:
+        out = {}
+        for k in SYNC_FIELDS:
+            if k in self.model_fields_set:
+                value = getattr(self, k)
+                out[k] = value.model_dump(exclude_none=True) if value is not None else None
+        return out
+
+class SyncPushRequest(BaseModel):
+    changes: List[SyncChange] = Field(min_length=1, max_length=SYNC_MAX_BATCH)
+
+class SyncPushResponse(BaseModel):
+    accepted: int
+    rev: int
+
+class SyncPullResponse(BaseModel):
+    changes: List[Dict[str, Any]]
+    rev: int  # pass as ?since= on the next pull
+    more: bool
+
+def _sync_store(request: Request) -> Any:
+    store = request.app.state.storage.sync
+    if store is None:
+        raise HTTPException(status_code=503, detail=f"Day sync is not available with {request.app.state.storage.kind} storage")
+    return store
+
+@api_router.post("/sync/register")
+async def sync_register(request: Request):
+    # A fresh server-chosen user id and its token; the app keeps both
+    _sync_store(request)
+    if not sync_auth.enabled:
+        raise HTTPException(status_code=503, detail="Day sync is disabled (set SYNC_SECRET)")
+    user_id, token = sync_auth.register()
+    return {"user_id": user_id, "token": token}
+
+@api_router.post("/sync/{user_id}", response_model=SyncPushResponse)
+async def sync_push(user_id: SyncUser, body: SyncPushRequest, request: Request):
+    # Only the dates that changed since the last push, in one bulk write
+    changes = [(c.date, c.fields()) for c in body.changes]
+    rev = await _sync_store(request).push(user_id, changes)
+    return SyncPushResponse(accepted=len(changes), rev=rev)
+
+@api_router.get("/sync/{user_id}", response_model=SyncPullResponse)
+async def sync_pull(
+    user_id: SyncUser,
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PULL_LIMIT, ge=1, le=MAX_PULL_LIMIT),
+):
+    docs = await _sync_store(request).pull(user_id, since, limit)
+    more = len(docs) > limit
+    docs = docs[:limit]
+    return SyncPullResponse(changes=docs, rev=docs[-1]['rev'] if docs else since, more=more)
+
+@api_router.get("/sync")
+async def sync_stats(request: Request):
+    return _sync_store(request).stats()
+
+# Full-history backup and restore as NDJSON, streamed both ways (history_io.py)
+SYNC_EXPORT_BATCH = export_batch_from_env()
+SYNC_IMPORT_BATCH = import_batch_from_env()
+
+@api_router.get("/sync/{user_id}/export")
+async def sync_export(user_id: SyncUser, request: Request):
+    store = _sync_store(request)
+    chunks = ndjson_chunks(store.iter_records(user_id, SYNC_EXPORT_BATCH), SYNC_EXPORT_BATCH)
+    headers = {"Vary": "Accept-Encoding"}
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers=headers)
+
+def _import_change(value: Any) -> Tuple[str, Dict[str, Any]]:
+    change = SyncChange.model_validate(value)
+    return change.date, change.fields()
+
+@api_router.post("/sync/{user_id}/import")
+async def sync_import(user_id: SyncUser, request: Request):
+    # The body is read as it arrives; nothing buffers the whole upload
+    encoding = request.headers.get('content-encoding', 'identity')
+    if encoding not in ('identity', 'gzip'):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding {encoding!r}")
+    store = _sync_store(request)
+    try:
+        return await import_ndjson(store, user_id, request.stream(), _import_change,
+                                   gzip=encoding == 'gzip', batch_size=SYNC_IMPORT_BATCH)
+    except NdjsonError as e:
+        raise HTTPException(status_code=422, detail={"line": e.line, "error": e.message, "imported": e.imported})
+
+# Weekly/monthly rollups, kept current by every sync push (rollups.py)
+@api_router.get("/rollups/{user_id}")
+async def rollups(
+    user_id: SyncUser,
+    request: Request,
+    period: Literal['week','month'] = 'week',
+    start: Optional[str] = Query(None, description="first key, e.g. 2024-W01 or 2024-01"),
+    end: Optional[str] = Query(None, description="last key"),
+):
+    docs = await _sync_store(request).rollups.periods(user_id, period, start, end)
+    return {"period": period, **summarize(docs)}
+
+@api_router.post("/rollups/{user_id}/rebuild")
+async def rebuild_rollups(user_id: SyncUser, request: Request):
+    return {"rollups": await _sync_store(request).rollups.rebuild(user_id)}
+
+# ====== Analytics ======
+class AnalyticsRequest(BaseModel):
+    days: Union[Dict[str, DayData], List[DayData]]
+    windows: List[Annotated[int, Field(gt=0, le=3660)]] = Field(default_factory=lambda: list(DEFAULT_WINDOWS))
+    series: bool = False
+
+@api_router.post("/analytics")
+async def analytics(req: AnalyticsRequest):
+    # numpy is only imported once analytics are first requested
+    from analytics import compute_analytics, to_columns
+    return compute_analytics(to_columns(day_list(req.days)), req.windows, req.series)
+
+# Health check endpoint; upstream readiness is cached by the background prober
+@api_router.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "llm_available": llm.available(),
+        "llm_upstream": upstream.snapshot(),
+        "timestamp": datetime.utcnow(),
+    }
 
 # Configure logging
 logging.basicConfig(
@@ -163,6 +612,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def create_app(
+    storage: Any = None,
+    prewarm_llm: Optional[bool] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    trusted_proxies: Optional[TrustedProxies] = None,
+) -> FastAPI:
+    return build_app(
+        api_router,
+        storage=storage if storage is not None else storage_from_env('mongo'),
+        metrics=metrics,
+        llm=llm,
+        prewarm_llm=prewarm_llm,
+        tasks=[greeting_warmer.run] if greeting_warmer else [],
+        upstream=upstream,
+        rate_limiter=rate_limiter,
+        trusted_proxies=trusted_proxies,
+    )
+
+# Create the main app; MongoDB is only connected once it is first used
+app = create_app()
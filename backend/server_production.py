@@ -1,56 +1,57 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Request
 from dotenv import load_dotenv
-from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional, Dict, Any
-import uuid
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Dict, Any, AsyncIterator, Union, Annotated
+import asyncio
+import time
 from datetime import datetime
 
-# LLM Integrations (Emergent)
-try:
-    from emergentintegrations import llm_client
-except Exception:  # pragma: no cover – fallback if lib not present
-    llm_client = None
+from admission import (
+    LLMUnavailable,
+    admission_from_env,
+    breaker_from_env,
+    deadline_from_header,
+    default_deadline_ms,
+    run_with_deadline,
+)
+from app_factory import build_app
+from chat_cache import cache_from_env, make_cache_key
+from day_data import DEFAULT_WINDOWS, DayData, day_list
+from fallback import keyword_reply
+from greetings import greetings_from_env, warmer_from_env
+from intents import intents_from_env
+from llm_loader import LazyLLMClient
+from llm_stream import SSE_HEADERS, guarded_stream, sse_event
+from metrics import CONTENT_TYPE, CallbackMetric, ServiceMetrics
+from profiling import span
+from prompt_builder import PROMPT_TOKENS_HEADER, Prompt, prompt_builder_from_env
+from ratelimit import RateLimiter, TrustedProxies, retry_after
+from sessions import SESSION_ID_MIN_LENGTH, SessionConflict, open_session
+from singleflight import SingleFlight, flight_key
+from status_api import StatusCheck, StatusCheckCreate  # noqa: F401  (re-exported)
+from storage import storage_from_env
+from upstream_probe import prober_from_env
+
+# LLM Integrations (Emergent), imported on the first chat request
+llm = LazyLLMClient()
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create the main app without a prefix
-app = FastAPI(title="Scarletts Gesundheitstracking API", version="1.2.6")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# In-memory storage for production (replace with actual DB later)
-status_checks = []
-
-# Define Models
-class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-
-class StatusCheckCreate(BaseModel):
-    client_name: str
-
 @api_router.get("/")
 async def root():
     return {"message": "Scarletts Gesundheitstracking API v1.2.6 - Chat & LLM Integration"}
 
-@api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_obj = StatusCheck(**input.dict())
-    status_checks.append(status_obj.dict())
-    return status_obj
-
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    return [StatusCheck(**status_check) for status_check in status_checks[-10:]]  # Last 10 only
-
 # ====== Gugi AI (LLM-Light via Emergent) ======
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get('CHAT_BATCH_MAX_ITEMS', 8))
+
 class ChatMessage(BaseModel):
     role: Literal['system','user','assistant']
     content: str
@@ -61,11 +62,60 @@ class ChatRequest(BaseModel):
     model: Optional[str] = None  # e.g., 'gpt-4o-mini'
     summary: Optional[Dict[str, Any]] = None
     messages: Optional[List[ChatMessage]] = None
+    # Server-side session (sessions.py): start one with new_session, then send only
+    # new messages plus the returned session_id and summary_hash
+    new_session: bool = False
+    session_id: Optional[str] = Field(None, min_length=SESSION_ID_MIN_LENGTH, max_length=64)
+    summary_hash: Optional[str] = None
 
 class ChatResponse(BaseModel):
     text: str
     status: str = "success"
     model_used: str = "gpt-4o-mini"
+    detail: Optional[str] = None
+    session_id: Optional[str] = None
+    summary_hash: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1, max_length=CHAT_BATCH_MAX_ITEMS)
+
+    @model_validator(mode='after')
+    def _one_item_per_session(self):
+        # Items run concurrently: two turns of one session would overwrite each other's history
+        ids = [r.session_id for r in self.requests if r.session_id]
+        if len(ids) != len(set(ids)):
+            raise ValueError('each session_id may appear only once per batch')
+        return self
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResponse]
+
+# Cache of upstream completions, keyed on the normalized request
+chat_cache = cache_from_env()
+llm_flights = SingleFlight()
+llm_admission = admission_from_env()
+llm_breaker = breaker_from_env()
+# General routine questions (how much to drink, workout ideas) answered without the LLM
+intents = intents_from_env()
+# Greetings pre-generated per coarse summary bucket, served without waiting for the LLM
+greetings = greetings_from_env()
+GREETING_WARM_TIMEOUT_S = float(os.environ.get('GREETING_WARM_TIMEOUT_S', 30))
+
+metrics = ServiceMetrics()
+metrics.register_stats('chat_cache', lambda: chat_cache.stats(), counters=('hits', 'misses', 'evictions'), gauges=('entries',))
+metrics.register_stats('llm_flights', lambda: llm_flights.stats(), counters=('upstream_calls', 'coalesced'), gauges=('in_flight',))
+metrics.register_stats('llm_admission', lambda: llm_admission.stats(), counters=('admitted', 'rejected'), gauges=('active', 'queued'))
+metrics.register_stats('greetings', lambda: greetings.stats(), counters=('hits', 'stale_hits', 'misses', 'generated'), gauges=('entries',))
+metrics.register(CallbackMetric(
+    'chat_intent_answers_total', 'Chat questions answered by the intent fast path.', 'counter',
+    lambda: [((intent,), n) for intent, n in intents.answered.items()], ('intent',),
+))
+metrics.register(CallbackMetric(
+    'llm_breaker_open', 'Whether the LLM circuit breaker is open (1) or half-open (0.5).', 'gauge',
+    lambda: [((), {'closed': 0, 'half_open': 0.5, 'open': 1}[llm_breaker.state])],
+))
+
+LLM_ERROR_REPLY = "Entschuldigung, ich kann gerade nicht antworten. Versuche es später nochmal! 🤖"
 
 SYSTEM_PROMPT_DE = (
     "Du bist Gugi – ein freundlicher, pragmatischer Gesundheitscoach für die App 'Scarletts Gesundheitstracking'. "
@@ -86,32 +136,59 @@ SYSTEM_PROMPT_PL = (
     "Mów swobodnie, pozytywnie i precyzyjnie. Odnoś się do danych zdrowotnych użytkowniczki."
 )
 
-async def _call_llm(messages: List[Dict[str,str]], model: str) -> str:
-    if llm_client is None:
+GREETING_PROMPTS = {
+    'de': "Gib einen kurzen, persönlichen Gesundheitstipp basierend auf den aktuellen Daten.",
+    'en': "Give a short, personal health tip based on current data.",
+    'pl': "Podaj krótką, osobistą wskazówkę zdrowotną na podstawie aktualnych danych.",
+}
+
+# Static per-language prefix, compact summary, history trimmed to the model's token budget
+prompts = prompt_builder_from_env(
+    {'de': SYSTEM_PROMPT_DE, 'en': SYSTEM_PROMPT_EN, 'pl': SYSTEM_PROMPT_PL},
+    GREETING_PROMPTS,
+    summary_label="Aktuelle Gesundheitsdaten",
+)
+
+async def _call_llm(messages: List[Dict[str,str]], model: str, deadline: Optional[float] = None, language: str = 'de') -> str:
+    if llm.client is None:
+        metrics.fallbacks.inc("no_client")
         # Fallback: simple contextual response if integration not available
-        user_msg = messages[-1].get('content', '').strip().lower()
-        
-        # Simple German responses based on context
-        if any(word in user_msg for word in ['tabletten', 'pill', 'medikament']):
-            return "Vergiss nicht deine Tabletten regelmäßig zu nehmen! ⏰"
-        elif any(word in user_msg for word in ['wasser', 'water', 'trinken']):
-            return "Trink genug Wasser! Mindestens 2-3 Liter am Tag sind optimal. 💧"
-        elif any(word in user_msg for word in ['gewicht', 'weight', 'abnehmen']):
-            return "Gewicht schwankt täglich - wichtig ist der langfristige Trend! 📊"
-        elif any(word in user_msg for word in ['sport', 'training', 'bewegung']):
-            return "Regelmäßige Bewegung ist super! Auch 15-20 Minuten täglich helfen. 🏃‍♀️"
-        elif any(word in user_msg for word in ['zyklus', 'periode', 'cycle']):
-            return "Tracke deinen Zyklus für bessere Gesundheitsübersicht! 📅"
-        else:
-            return "Ich helfe dir gerne bei deinen Gesundheitszielen! Was möchtest du wissen? 😊"
-    
+        return keyword_reply(messages, language)
+    if not llm_breaker.allow():
+        metrics.fallbacks.inc("circuit_open")
+        raise LLMUnavailable("circuit_open")
+    joined = []
+
+    async def shared_call() -> str:
+        # Identical concurrent prompts (e.g. greeting bursts) share one upstream call
+        flight = llm_flights.join(flight_key(messages, model), lambda: _complete(messages, model, language))
+        joined.append(flight)
+        return await llm_flights.wait(flight)
+
     try:
-        resp = await llm_client.chat_completion(
-            model=model,
-            messages=messages,
-            temperature=0.4,
-            max_tokens=280,
-        )
+        with span('llm'):
+            return await run_with_deadline(shared_call(), deadline)
+    except LLMUnavailable as e:
+        metrics.fallbacks.inc(e.reason)
+        # One slow upstream call is one failure, however many waiters gave up on it
+        if e.reason == "deadline" and (not joined or joined[0].claim()):
+            llm_breaker.record_failure()
+        raise
+
+async def _complete(messages: List[Dict[str,str]], model: str, language: str = 'de') -> str:
+    started = time.perf_counter()
+    try:
+        async with llm_admission.slot():
+            started = time.perf_counter()
+            with span('upstream'):
+                resp = await llm.client.chat_completion(
+                    model=model,
+                    messages=messages,
+                    temperature=0.4,
+                    max_tokens=280,
+                )
+        llm_breaker.record_success()
+        upstream.observe(True, time.perf_counter() - started)
         # Unify result extraction across providers
         content = None
         if hasattr(resp, 'choices') and resp.choices:
@@ -121,42 +198,102 @@ async def _call_llm(messages: List[Dict[str,str]], model: str) -> str:
         if not content:
             # try dict fallback
             content = (getattr(resp, 'content', None) or '').strip()
-        return (content or '').strip() or ""
+        text = (content or '').strip() or ""
+        metrics.observe_llm_call(model, language, messages, started, text)
+        return text
+    except LLMUnavailable:
+        raise
     except Exception as e:
+        llm_breaker.record_failure()
+        upstream.observe(False, time.perf_counter() - started, type(e).__name__)
+        metrics.observe_llm_call(model, language, messages, started, error=type(e).__name__)
         logging.exception("LLM call failed: %s", e)
         # Return helpful fallback instead of error
-        return "Entschuldigung, ich kann gerade nicht antworten. Versuche es später nochmal! 🤖"
+        metrics.fallbacks.inc("upstream_error")
+        return LLM_ERROR_REPLY
+
+def _llm_idle() -> bool:
+    admission = llm_admission.stats()
+    return not admission['active'] and not admission['queued'] and llm_breaker.state == 'closed'
+
+async def _generate_greeting(language: str, model: str, summary: Dict[str, Any]) -> Optional[str]:
+    if llm.client is None:
+        return None  # keyword fallbacks are not worth storing
+    prompt = prompts.build('greeting', language, model, summary, [])
+    text = await _call_llm(prompt.messages, model, time.monotonic() + GREETING_WARM_TIMEOUT_S, language)
+    return text if text != LLM_ERROR_REPLY else None
+
+greeting_warmer = warmer_from_env(greetings, _generate_greeting, _llm_idle)
+
+# Upstream readiness, kept current by real calls and a background probe (upstream_probe.py)
+UPSTREAM_PROBE_MODEL = os.environ.get('UPSTREAM_PROBE_MODEL', 'gpt-4o-mini')
+
+async def _probe_upstream() -> bool:
+    # One-token completion, bypassing admission and the breaker: it measures the upstream itself
+    if not llm.loaded:
+        await llm.prewarm()
+    if llm.client is None:
+        return False
+    await llm.client.chat_completion(
+        model=UPSTREAM_PROBE_MODEL, messages=[{"role": "user", "content": "ping"}], temperature=0, max_tokens=1,
+    )
+    return True
+
+upstream = prober_from_env(_probe_upstream)
+metrics.register_stats('llm_upstream', lambda: upstream.stats(), counters=('probes', 'failures'))
+
+def _greeting_reply(req: ChatRequest) -> Optional[str]:
+    if req.mode != 'greeting' or req.messages:
+        return None
+    return greetings.lookup(req.language or 'de', req.model or 'gpt-4o-mini', req.summary)
+
+def _intent_reply(req: ChatRequest) -> Optional[str]:
+    if req.mode != 'chat' or not req.messages or req.messages[-1].role != 'user':
+        return None
+    return intents.answer(req.messages[-1].content, req.language or 'de', req.summary)
+
+def _build_messages(req: ChatRequest) -> Prompt:
+    model = req.model or 'gpt-4o-mini'
+    history = [{"role": m.role, "content": m.content} for m in (req.messages or [])]
+    prompt = prompts.build(req.mode, req.language or 'de', model, req.summary, history)
+    if prompt.trimmed:
+        metrics.observe_trimmed(model, prompt.trimmed)
+    return prompt
 
-@api_router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def _answer(req: ChatRequest, deadline: float, response: Optional[Response] = None) -> ChatResponse:
     try:
         lang = req.language or 'de'
         model = req.model or 'gpt-4o-mini'
-        system = SYSTEM_PROMPT_DE if lang=='de' else (SYSTEM_PROMPT_PL if lang=='pl' else SYSTEM_PROMPT_EN)
+        with span('intent'):
+            reply = _intent_reply(req)
+        if reply is not None:
+            return ChatResponse(text=reply, status="success", model_used="intent")
+        with span('greeting_store'):
+            reply = _greeting_reply(req)
+        if reply is not None:
+            return ChatResponse(text=reply, status="success", model_used=model)
+        with span('prompt'):
+            prompt = _build_messages(req)
+        msgs = prompt.messages
+        if response is not None:
+            response.headers[PROMPT_TOKENS_HEADER] = str(prompt.tokens)
 
-        # Build base messages
-        msgs: List[Dict[str,str]] = [
-            {"role":"system","content": system}
-        ]
-        
-        # Inject compact summary as assistant context
-        if req.summary:
-            summary_text = f"Aktuelle Gesundheitsdaten: {req.summary}"
-            msgs.append({"role":"system","content": summary_text})
-
-        if req.mode == 'greeting':
-            user_prompt = {
-                'de': "Gib einen kurzen, persönlichen Gesundheitstipp basierend auf den aktuellen Daten.",
-                'en': "Give a short, personal health tip based on current data.",
-                'pl': "Podaj krótką, osobistą wskazówkę zdrowotną na podstawie aktualnych danych.",
-            }[lang]
-            msgs.append({"role":"user","content": user_prompt})
-        else:
-            # normal chat
-            for m in (req.messages or [])[-12:]:
-                msgs.append({"role": m.role, "content": m.content})
-
-        text = await _call_llm(msgs, model)
+        with span('cache'):
+            cache_key = make_cache_key(req.mode, lang, model, req.summary, prompt.history)
+            cached = await chat_cache.lookup(cache_key)
+        if cached is not None:
+            return ChatResponse(text=cached, status="success", model_used=model)
+
+        try:
+            text = await _call_llm(msgs, model, deadline, lang)
+        except LLMUnavailable:
+            # Upstream overloaded, failing or too slow for the client's deadline
+            return ChatResponse(text=keyword_reply(msgs, lang, req.summary), status="degraded", model_used="fallback")
+        if text == LLM_ERROR_REPLY:
+            return ChatResponse(text=text, status="error", model_used="fallback")
+        # Only cache real upstream answers, never the keyword fallback or error reply
+        if text and llm.client is not None:
+            chat_cache.set(cache_key, text, req.mode)
         
         return ChatResponse(
             text=text,
@@ -171,28 +308,186 @@ async def chat(req: ChatRequest):
             model_used="fallback"
         )
 
+async def _session_answer(req: ChatRequest, deadline: float, sessions: Any, response: Optional[Response] = None) -> ChatResponse:
+    if not req.session_id and not req.new_session:
+        return await _answer(req, deadline, response)
+    try:
+        with span('session_load'):
+            session = await open_session(sessions, req.session_id, req.summary, req.summary_hash)
+    except SessionConflict as e:
+        # Client must re-send its full history and summary
+        raise HTTPException(status_code=409, detail=e.reason)
+    delta = [{"role": m.role, "content": m.content} for m in (req.messages or [])]
+    history = [ChatMessage(**m) for m in session.messages] + list(req.messages or [])
+    result = await _answer(req.model_copy(update={"messages": history, "summary": session.summary}), deadline, response)
+    if req.mode == 'chat':
+        session.record_turn(delta, result.text if result.status != "error" else None)
+    with span('session_save'):
+        await sessions.save(session)
+    return result.model_copy(update={"session_id": session.id, "summary_hash": session.summary_hash})
+
+@api_router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat(req: ChatRequest, request: Request, response: Response, x_client_deadline_ms: Optional[str] = Header(None)):
+    with span('chat'):
+        deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+        return await _session_answer(req, deadline, request.app.state.storage.sessions, response)
+
+def _charge_batch(request: Request, items: int) -> None:
+    # The rate limiter charged one chat token for the request; each further item is another upstream call
+    limiter = request.app.state.rate_limiter
+    if limiter is None:
+        return
+    budget, wait = limiter.charge_more(request.scope, items - 1)
+    if wait:
+        metrics.rate_limited.inc(budget)
+        raise HTTPException(status_code=429, detail="Too Many Requests", headers={"Retry-After": retry_after(wait)})
+
+@api_router.post("/chat/batch", response_model=ChatBatchResponse, response_model_exclude_none=True)
+async def chat_batch(batch: ChatBatchRequest, request: Request, x_client_deadline_ms: Optional[str] = Header(None)):
+    # e.g. greeting + insights on app start in one round trip. All items share the
+    # client's deadline; _answer never raises, so only session conflicts need mapping.
+    _charge_batch(request, len(batch.requests))
+    deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+    sessions = request.app.state.storage.sessions
+    with span('chat_batch'):
+        outcomes = await asyncio.gather(
+            *(_session_answer(req, deadline, sessions) for req in batch.requests), return_exceptions=True,
+        )
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            outcome = ChatResponse(text="", status="error", model_used="fallback", detail=outcome.detail)
+        elif isinstance(outcome, BaseException):
+            logging.error("Chat batch item failed", exc_info=outcome)
+            outcome = ChatResponse(text="", status="error", model_used="fallback", detail="Internal error")
+        results.append(outcome)
+    return ChatBatchResponse(results=results)
+
+async def _chat_events(req: ChatRequest, prompt: Prompt, deadline: float) -> AsyncIterator[str]:
+    lang = req.language or 'de'
+    model = req.model or 'gpt-4o-mini'
+    msgs = prompt.messages
+
+    reply = _intent_reply(req)
+    if reply is not None:
+        yield sse_event("token", {"text": reply})
+        yield sse_event("done", {"status": "success", "model_used": "intent"})
+        return
+
+    reply = _greeting_reply(req)
+    if reply is not None:
+        yield sse_event("token", {"text": reply})
+        yield sse_event("done", {"status": "success", "model_used": model, "cached": True})
+        return
+
+    cache_key = make_cache_key(req.mode, lang, model, req.summary, prompt.history)
+    cached = await chat_cache.lookup(cache_key)
+    if cached is not None:
+        yield sse_event("token", {"text": cached})
+        yield sse_event("done", {"status": "success", "model_used": model, "cached": True})
+        return
+
+    client = llm.client
+    if client is None:
+        # Keyword fallback answers instantly, send it as a single token
+        yield sse_event("token", {"text": await _call_llm(msgs, model, language=lang)})
+        yield sse_event("done", {"status": "success", "model_used": model})
+        return
+
+    parts: List[str] = []
+    started = time.perf_counter()
+    try:
+        async for delta in guarded_stream(client, msgs, model, llm_admission, llm_breaker, deadline):
+            parts.append(delta)
+            yield sse_event("token", {"text": delta})
+    except LLMUnavailable as e:
+        metrics.fallbacks.inc(e.reason)
+        yield sse_event("token", {"text": keyword_reply(msgs, lang, req.summary)})
+        yield sse_event("done", {"status": "degraded", "model_used": "fallback"})
+        return
+    except Exception as e:
+        logging.exception("LLM stream failed: %s", e)
+        metrics.observe_llm_call(model, lang, msgs, started, error=type(e).__name__)
+        if not parts:
+            yield sse_event("token", {"text": LLM_ERROR_REPLY})
+        yield sse_event("done", {"status": "error", "model_used": "fallback"})
+        return
+
+    text = ''.join(parts).strip()
+    metrics.observe_llm_call(model, lang, msgs, started, text)
+    if text:
+        chat_cache.set(cache_key, text, req.mode)
+    yield sse_event("done", {"status": "success", "model_used": model})
+
+@api_router.post("/chat/stream")
+async def chat_stream(req: ChatRequest, x_client_deadline_ms: Optional[str] = Header(None)):
+    deadline = deadline_from_header(x_client_deadline_ms, default_deadline_ms())
+    prompt = _build_messages(req)
+    headers = {**SSE_HEADERS, PROMPT_TOKENS_HEADER: str(prompt.tokens)}
+    return StreamingResponse(_chat_events(req, prompt, deadline), media_type="text/event-stream", headers=headers)
+
+@api_router.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@api_router.get("/chat/cache")
+async def chat_cache_stats():
+    return chat_cache.stats()
+
+@api_router.get("/chat/flights")
+async def chat_flight_stats():
+    return llm_flights.stats()
+
+@api_router.get("/chat/sessions")
+async def chat_session_stats(request: Request):
+    return request.app.state.storage.sessions.stats()
+
+@api_router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str, request: Request):
+    await request.app.state.storage.sessions.delete(session_id)
+    return {"deleted": session_id}
+
+@api_router.get("/chat/greetings")
+async def chat_greeting_stats():
+    return {"store": greetings.stats(), "warmer": greeting_warmer.stats() if greeting_warmer else None}
+
+@api_router.get("/chat/intents")
+async def chat_intent_stats():
+    return intents.stats()
+
+@api_router.get("/chat/admission")
+async def chat_admission_stats():
+    return {"admission": llm_admission.stats(), "breaker": llm_breaker.stats()}
+
+# ====== Analytics ======
+class AnalyticsRequest(BaseModel):
+    days: Union[Dict[str, DayData], List[DayData]]
+    windows: List[Annotated[int, Field(gt=0, le=3660)]] = Field(default_factory=lambda: list(DEFAULT_WINDOWS))
+    series: bool = False
+
+@api_router.post("/analytics")
+async def analytics(req: AnalyticsRequest):
+    # numpy is only imported once analytics are first requested
+    from analytics import compute_analytics, to_columns
+    return compute_analytics(to_columns(day_list(req.days)), req.windows, req.series)
+
 # Health check endpoint
 @api_router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     return {
         "status": "healthy",
         "version": "1.2.6",
         "service": "Scarletts Gesundheitstracking API",
-        "llm_available": llm_client is not None,
+        "llm_available": llm.available(),
+        # Cached by the background prober; no upstream call happens here
+        "llm_upstream": upstream.snapshot(),
+        "chat_cache": chat_cache.stats(),
+        "llm_flights": llm_flights.stats(),
+        "llm_breaker": llm_breaker.stats(),
+        "status_store": request.app.state.storage.stats(),
         "timestamp": datetime.utcnow()
     }
 
-# Include the router in the main app
-app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -201,15 +496,40 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Root endpoint for health check
-@app.get("/")
 async def root_health():
     return {
         "service": "Scarletts Gesundheitstracking API",
         "version": "1.2.6",
         "status": "online",
-        "endpoints": ["/api/", "/api/chat", "/api/status", "/api/health"]
+        "endpoints": ["/api/", "/api/chat", "/api/chat/batch", "/api/chat/stream", "/api/analytics", "/api/status", "/api/health", "/api/metrics"]
     }
 
+def create_app(
+    storage: Any = None,
+    prewarm_llm: Optional[bool] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    trusted_proxies: Optional[TrustedProxies] = None,
+) -> FastAPI:
+    app = build_app(
+        api_router,
+        storage=storage if storage is not None else storage_from_env('memory'),
+        metrics=metrics,
+        llm=llm,
+        prewarm_llm=prewarm_llm,
+        tasks=[greeting_warmer.run] if greeting_warmer else [],
+        upstream=upstream,
+        rate_limiter=rate_limiter,
+        trusted_proxies=trusted_proxies,
+        title="Scarletts Gesundheitstracking API",
+        version="1.2.6",
+    )
+    app.add_api_route("/", root_health, methods=["GET"])
+    return app
+
+# Create the main app. In-memory storage for production (replace with actual DB later):
+# the newest STATUS_RING_CAPACITY entries, optionally snapshotted to STATUS_SNAPSHOT_PATH
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,168 @@
+"""Server-side chat sessions, so clients only send what changed.
+
+The server picks the session id: the first request asks for a new session
+and carries the summary (and any history); the response returns the random
+``session_id`` and a ``summary_hash``. After that the client sends only the
+new user message plus both, and re-sends the summary only when it changed.
+Every follow-up must carry the hash of the summary the session holds, so an
+id alone never reaches someone's stored summary. If the session is gone
+(TTL, eviction, restart) or the hash is missing or stale, the server answers
+409 and the client starts over with the full state.
+
+MemorySessionStore is an LRU with TTL; MongoSessionStore keeps sessions in
+a collection with a TTL index, for server.py.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_SESSIONS = 10000
+# The prompt builder trims by tokens; this only bounds what a session stores
+MAX_SESSION_MESSAGES = 40
+# token_urlsafe(24) is 32 characters; shorter ids were not issued here
+SESSION_ID_BYTES = 24
+SESSION_ID_MIN_LENGTH = 32
+
+
+class SessionConflict(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # unknown_session | summary_hash_required | summary_changed
+
+
+def summary_hash(summary: Optional[Dict[str, Any]]) -> str:
+    raw = json.dumps(summary, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+
+@dataclass
+class ChatSession:
+    id: str
+    messages: List[Dict[str, str]] = field(default_factory=list)
+    summary: Optional[Dict[str, Any]] = None
+    summary_hash: Optional[str] = None
+
+    def record_turn(self, delta: List[Dict[str, str]], reply: Optional[str]) -> None:
+        self.messages.extend(delta)
+        if reply:
+            self.messages.append({"role": "assistant", "content": reply})
+        del self.messages[:-MAX_SESSION_MESSAGES]
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            '_id': self.id,
+            'messages': self.messages,
+            'summary': self.summary,
+            'summary_hash': self.summary_hash,
+            'updated_at': datetime.utcnow(),
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "ChatSession":
+        return cls(doc['_id'], list(doc.get('messages') or []), doc.get('summary'), doc.get('summary_hash'))
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+
+async def open_session(
+    store: Any,
+    session_id: Optional[str],
+    summary: Optional[Dict[str, Any]] = None,
+    known_hash: Optional[str] = None,
+) -> ChatSession:
+    """Start a session (``session_id`` None) or load one, checking the client's summary hash."""
+    if session_id is None:
+        session = ChatSession(new_session_id(), summary_hash=summary_hash(None))
+    else:
+        session = await store.get(session_id)
+        if session is None:
+            # The client assumes state the server no longer has
+            raise SessionConflict('unknown_session')
+        if known_hash is None:
+            raise SessionConflict('summary_hash_required')
+        if not hmac.compare_digest(known_hash, session.summary_hash or summary_hash(None)):
+            raise SessionConflict('summary_changed')
+    if summary is not None:
+        session.summary = summary
+        session.summary_hash = summary_hash(summary)
+    return session
+
+
+class MemorySessionStore:
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_TTL, clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        entry = self._data.get(session_id)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if expires_at <= self._clock():
+            del self._data[session_id]
+            return None
+        self._data.move_to_end(session_id)
+        return session
+
+    async def save(self, session: ChatSession) -> None:
+        self._data[session.id] = (self._clock() + self.ttl, session)
+        self._data.move_to_end(session.id)
+        while len(self._data) > self.max_sessions:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, session_id: str) -> None:
+        self._data.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'memory', 'sessions': len(self._data), 'max_sessions': self.max_sessions,
+                'evictions': self.evictions, 'ttl': self.ttl}
+
+
+class MongoSessionStore:
+    def __init__(self, get_collection: Callable[[], Any], ttl: float = DEFAULT_TTL):
+        self._get_collection = get_collection
+        self.ttl = ttl
+
+    async def ensure_indexes(self) -> None:
+        # MongoDB expires idle sessions itself; get() also checks, as the TTL monitor runs once a minute
+        await self._get_collection().create_index("updated_at", expireAfterSeconds=int(self.ttl), name="session_ttl")
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        doc = await self._get_collection().find_one({"_id": session_id})
+        if doc is None or doc['updated_at'] < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return None
+        return ChatSession.from_doc(doc)
+
+    async def save(self, session: ChatSession) -> None:
+        await self._get_collection().replace_one({"_id": session.id}, session.to_doc(), upsert=True)
+
+    async def delete(self, session_id: str) -> None:
+        await self._get_collection().delete_one({"_id": session_id})
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'mongo', 'ttl': self.ttl}
+
+
+def session_ttl_from_env() -> float:
+    return float(os.environ.get('CHAT_SESSION_TTL_S', DEFAULT_TTL))
+
+
+def memory_sessions_from_env() -> MemorySessionStore:
+    return MemorySessionStore(
+        max_sessions=int(os.environ.get('CHAT_SESSION_MAX', DEFAULT_MAX_SESSIONS)),
+        ttl=session_ttl_from_env(),
+    )
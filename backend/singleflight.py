@@ -0,0 +1,85 @@
+"""Coalesce identical in-flight upstream calls into one shared task."""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List
+
+
+def flight_key(messages: List[Dict[str, str]], model: str) -> str:
+    raw = json.dumps(
+        [model, [[m.get('role'), (m.get('content') or '').strip()] for m in messages]],
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Flight:
+    __slots__ = ('task', 'waiters', 'claimed')
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+        self.claimed = False
+
+    def claim(self) -> bool:
+        """True for the first waiter to claim this call, e.g. to report its failure once."""
+        if self.claimed:
+            return False
+        self.claimed = True
+        return True
+
+
+class SingleFlight:
+    """Run at most one call per key; concurrent callers await the same result.
+
+    The upstream call runs in its own task, so a caller being cancelled (client
+    disconnect) only detaches that caller. The shared task is cancelled once the
+    last waiter has gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await self.wait(self.join(key, fn))
+
+    def join(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Flight:
+        """Start the call for ``key``, or join the one in flight; every join must be awaited with wait()."""
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn())
+            flight = Flight(task)
+            self._flights[key] = flight
+            task.add_done_callback(lambda t, k=key, f=flight: self._finish(k, f, t))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        return flight
+
+    async def wait(self, flight: Flight) -> Any:
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: str, flight: Flight, task: "asyncio.Task") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Mark the exception retrieved even if every waiter already left
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._flights),
+            'upstream_calls': self.leaders,
+            'coalesced': self.coalesced,
+        }
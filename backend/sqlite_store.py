@@ -0,0 +1,423 @@
+"""Embedded SQLite storage that every worker process on one host can share.
+
+Running uvicorn with ``--workers N`` needs state that lives outside the
+process. A WAL-mode SQLite file gives that without a database server: readers
+never wait for the writer, and one transaction at a time holds the write lock.
+
+Each process talks to the file through one SqliteDatabase (shared_database()),
+whichever stores use it:
+
+- One writer thread with its own connection. Writes from the event loop are
+  queued, and the writer drains the queue one transaction per batch. While it
+  commits, new writes pile up behind it and go into the next batch (group
+  commit), so a burst of inserts costs a handful of fsyncs instead of one
+  each.
+- A small pool of reader threads, each with its own connection, for page
+  queries, session loads and cache lookups. The event loop never touches a
+  connection itself.
+- Every statement is a constant SQL string, so sqlite3's per-connection
+  statement cache prepares each one once and re-binds it afterwards.
+
+Expiry times are wall-clock (time.time) because they are compared across
+processes; monotonic clocks are not.
+
+Only these tables are shared. Rate limit budgets are divided between the
+WEB_CONCURRENCY workers (ratelimit.py); metrics, profiles, in-flight LLM
+calls and the greeting store remain per process, which is why the image
+runs a single worker unless WEB_CONCURRENCY says otherwise.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from chat_cache import DEFAULT_TTLS
+from pagination import MAX_PAGE_SIZE
+from sessions import DEFAULT_TTL, ChatSession
+from status_store import from_micros, to_micros
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = 'scarlett.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS status_checks (
+    timestamp INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    client_name TEXT,
+    PRIMARY KEY (timestamp, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_expires ON chat_sessions (expires_at);
+CREATE TABLE IF NOT EXISTS chat_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_cache_expires ON chat_cache (expires_at);
+"""
+
+# A writer callback receives (rowcount, error) on the writer thread
+Done = Callable[[int, Optional[BaseException]], None]
+
+
+class SqliteDatabase:
+    def __init__(self, path: str, readers: int = 4, max_batch: int = 500, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix='sqlite-read')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='sqlite-write')
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Sequence[Any], Optional[Done]]] = []
+        self._draining = False
+        self._schema_ready = False
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.last_commit_ms = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are only the explicit BEGIN/COMMIT of the writer
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def ensure_schema(self) -> None:
+        # CREATE ... IF NOT EXISTS, so every worker can run it at startup
+        if not self._schema_ready:
+            self.connection().executescript(SCHEMA)
+            self._schema_ready = True
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(connection, *args)`` on a reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._readers, self._read, fn, args)
+
+    def _read(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        self.ensure_schema()
+        return fn(self.connection(), *args)
+
+    def write_nowait(self, sql: str, params: Sequence[Any] = (), done: Optional[Done] = None) -> None:
+        """Queue a statement for the writer; ``done`` is called once its batch committed."""
+        with self._lock:
+            self._pending.append((sql, params, done))
+            if self._draining:
+                return
+            self._draining = True
+        self._writer.submit(self._drain)
+
+    async def write(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Queue a statement and wait until its batch has committed; returns the rowcount."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def done(rowcount: int, error: Optional[BaseException]) -> None:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, rowcount, error)
+            except RuntimeError:
+                pass  # the waiting loop is gone
+
+        self.write_nowait(sql, params, done)
+        return await fut
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                if not batch:
+                    self._draining = False
+                    return
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[str, Sequence[Any], Optional[Done]]]) -> None:
+        started = time.perf_counter()
+        conn = self.connection()
+        self.ensure_schema()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            counts = [conn.execute(sql, params).rowcount for sql, params, _ in batch]
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            logger.warning("SQLite batch of %d failed (%s); retrying one by one", len(batch), e)
+            self._commit_each(conn, batch)
+        else:
+            self.written += len(batch)
+            for (_, _, done), count in zip(batch, counts):
+                if done is not None:
+                    done(count, None)
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self.last_commit_ms = (time.perf_counter() - started) * 1000
+
+    def _commit_each(self, conn: sqlite3.Connection, batch: List[Tuple[str, Sequence[Any], Optional[Done]]]) -> None:
+        # One bad statement must not fail the writes that happened to share its batch
+        for sql, params, done in batch:
+            try:
+                count = conn.execute(sql, params).rowcount
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception("SQLite write failed: %s", e)
+                if done is not None:
+                    done(0, e)
+            else:
+                if done is not None:
+                    done(count, None)
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far has been committed."""
+        await self.write('SELECT 1')
+
+    def close(self) -> None:
+        with _shared_lock:
+            if _shared.get(self.path) is self:
+                del _shared[self.path]
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'queue_depth': len(self._pending),
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'max_batch': self.max_batch_seen,
+            'last_commit_ms': round(self.last_commit_ms, 3),
+        }
+
+
+def _resolve(fut: asyncio.Future, rowcount: int, error: Optional[BaseException]) -> None:
+    if fut.done():
+        return
+    if error is None:
+        fut.set_result(rowcount)
+    else:
+        fut.set_exception(error)
+
+
+# ====== Status checks ======
+_INSERT_STATUS = 'INSERT INTO status_checks (timestamp, id, client_name) VALUES (?, ?, ?)'
+# (-1, '') sorts before every row, so the first page uses the same statement
+_STATUS_PAGE = ('SELECT timestamp, id, client_name FROM status_checks '
+                'WHERE (timestamp, id) > (?, ?) ORDER BY timestamp, id LIMIT ?')
+# Newest first; the largest int64 sorts after every row
+_STATUS_PAGE_DESC = ('SELECT timestamp, id, client_name FROM status_checks '
+                     'WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?')
+_NEWEST_KEY = (2 ** 63 - 1, '')
+
+
+def _status_page(conn: sqlite3.Connection, after: Tuple[int, str], limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+    rows = conn.execute(_STATUS_PAGE_DESC if descending else _STATUS_PAGE, (after[0], after[1], limit)).fetchall()
+    return [{'id': id, 'client_name': name, 'timestamp': from_micros(ts)} for ts, id, name in rows]
+
+
+class SqliteStatusStore:
+    def __init__(self, db: SqliteDatabase):
+        self.db = db
+
+    async def insert(self, doc: Dict[str, Any]) -> None:
+        await self.db.write(_INSERT_STATUS, (to_micros(doc['timestamp']), doc['id'], doc['client_name']))
+
+    async def page(self, after: Optional[Tuple[Any, str]], limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+        if after:
+            key = (to_micros(after[0]), after[1])
+        else:
+            key = _NEWEST_KEY if descending else (-1, '')
+        return await self.db.read(_status_page, key, limit, descending)
+
+    async def iterate(self, after: Optional[Tuple[Any, str]], limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        # Keyset pages, so a long export never holds a read transaction open
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = MAX_PAGE_SIZE if remaining is None else min(remaining, MAX_PAGE_SIZE)
+            docs = await self.page(after, size)
+            for doc in docs:
+                yield doc
+            if len(docs) < size:
+                return
+            after = (docs[-1]['timestamp'], docs[-1]['id'])
+            if remaining is not None:
+                remaining -= len(docs)
+
+
+# ====== Chat sessions ======
+_GET_SESSION = 'SELECT doc FROM chat_sessions WHERE id = ? AND expires_at > ?'
+_SAVE_SESSION = 'INSERT OR REPLACE INTO chat_sessions (id, doc, expires_at) VALUES (?, ?, ?)'
+_DELETE_SESSION = 'DELETE FROM chat_sessions WHERE id = ?'
+_EXPIRE_SESSIONS = 'DELETE FROM chat_sessions WHERE expires_at <= ?'
+_PRUNE_EVERY = 256
+
+
+def _get_session(conn: sqlite3.Connection, session_id: str, now: float) -> Optional[str]:
+    row = conn.execute(_GET_SESSION, (session_id, now)).fetchone()
+    return row[0] if row else None
+
+
+class SqliteSessionStore:
+    def __init__(self, db: SqliteDatabase, ttl: float = DEFAULT_TTL, clock: Callable[[], float] = time.time):
+        self.db = db
+        self.ttl = ttl
+        self._clock = clock
+        self._saves = 0
+
+    async def get(self, session_id: str) -> Optional[ChatSession]:
+        raw = await self.db.read(_get_session, session_id, self._clock())
+        return ChatSession.from_doc(json.loads(raw)) if raw is not None else None
+
+    async def save(self, session: ChatSession) -> None:
+        doc = {'_id': session.id, 'messages': session.messages, 'summary': session.summary,
+               'summary_hash': session.summary_hash}
+        raw = json.dumps(doc, ensure_ascii=False, separators=(',', ':'), default=str)
+        now = self._clock()
+        await self.db.write(_SAVE_SESSION, (session.id, raw, now + self.ttl))
+        self._saves += 1
+        if self._saves % _PRUNE_EVERY == 0:
+            # Expired rows are already invisible to get(); this only reclaims the space
+            self.db.write_nowait(_EXPIRE_SESSIONS, (now,))
+
+    async def delete(self, session_id: str) -> None:
+        await self.db.write(_DELETE_SESSION, (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'sqlite', 'ttl': self.ttl}
+
+
+# ====== Chat response cache ======
+_GET_CACHED = 'SELECT value, expires_at FROM chat_cache WHERE key = ?'
+_SET_CACHED = 'INSERT OR REPLACE INTO chat_cache (key, value, expires_at) VALUES (?, ?, ?)'
+# Drops expired entries, then whatever is over capacity, soonest-to-expire first
+_PRUNE_CACHE = ('DELETE FROM chat_cache WHERE expires_at <= ? OR key IN '
+                '(SELECT key FROM chat_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)')
+_COUNT_CACHE = 'SELECT COUNT(*) FROM chat_cache'
+
+
+def _get_cached(conn: sqlite3.Connection, key: str) -> Optional[Tuple[str, float]]:
+    return conn.execute(_GET_CACHED, (key,)).fetchone()
+
+
+class SqliteResponseCache:
+    """ResponseCache with its entries in SQLite, so every worker shares the answers.
+
+    lookup() is a primary-key read on a reader thread; set() only queues the
+    row for the writer thread. ``entries`` is counted by the writer after each
+    prune, so stats() never queries the file.
+    """
+
+    def __init__(
+        self,
+        db: SqliteDatabase,
+        max_entries: int = 512,
+        ttls: Optional[Dict[str, float]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._clock = clock
+        self._prune_every = max(1, max_entries // 8)
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = 0
+
+    async def lookup(self, key: str) -> Optional[Any]:
+        row = await self.db.read(_get_cached, key)
+        if row is None or row[1] <= self._clock():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, value: Any, mode: str = 'chat') -> None:
+        ttl = self.ttls.get(mode, 0)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        now = self._clock()
+        self.db.write_nowait(_SET_CACHED, (key, value, now + ttl))
+        self._sets += 1
+        if self._sets % self._prune_every == 0:
+            self.db.write_nowait(_PRUNE_CACHE, (now, self.max_entries), self._pruned)
+
+    def _pruned(self, rowcount: int, error: Optional[BaseException]) -> None:
+        # Runs on the writer thread, right after the prune committed
+        self.evictions += rowcount
+        self.entries = self.db.connection().execute(_COUNT_CACHE).fetchone()[0]
+
+    def clear(self) -> None:
+        self.db.write_nowait('DELETE FROM chat_cache')
+        self.entries = 0
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'sqlite',
+            'entries': self.entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'ttls': self.ttls,
+        }
+
+
+def sqlite_path_from_env() -> str:
+    return os.environ.get('SQLITE_PATH', DEFAULT_PATH)
+
+
+def database_from_env(path: Optional[str] = None) -> SqliteDatabase:
+    return SqliteDatabase(
+        path or sqlite_path_from_env(),
+        readers=int(os.environ.get('SQLITE_READERS', 4)),
+        max_batch=int(os.environ.get('SQLITE_MAX_BATCH', 500)),
+    )
+
+
+_shared: Dict[str, SqliteDatabase] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_database(path: Optional[str] = None) -> SqliteDatabase:
+    """The process's SqliteDatabase for ``path``: one writer thread and reader pool per file."""
+    path = path or sqlite_path_from_env()
+    with _shared_lock:
+        db = _shared.get(path)
+        if db is None:
+            db = _shared[path] = database_from_env(path)
+        return db
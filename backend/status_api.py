@@ -0,0 +1,77 @@
+"""/api/status routes shared by both server variants.
+
+Documents live in ``request.app.state.storage`` (see storage.py), so the
+routes are the same whether the app runs on MongoDB or in memory.
+"""
+import uuid
+from datetime import datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from starlette.responses import Response, StreamingResponse
+
+from pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    dumps,
+    encode_cursor,
+    ndjson_line,
+)
+
+router = APIRouter(prefix="/api")
+
+
+# Define Models
+class StatusCheck(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_name: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class StatusCheckCreate(BaseModel):
+    client_name: str
+
+@router.post("/status", response_model=StatusCheck)
+async def create_status_check(input: StatusCheckCreate, request: Request):
+    status_obj = StatusCheck(**input.dict())
+    await request.app.state.storage.insert_status(status_obj.dict())
+    return status_obj
+
+@router.get("/status/writes")
+async def status_write_stats(request: Request):
+    return request.app.state.storage.stats()
+
+@router.get("/status", response_model=List[StatusCheck])
+async def get_status_checks(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Literal['json','ndjson'] = 'json',
+    order: Literal['asc','desc'] = 'asc',
+):
+    # order=desc pages newest first (keep passing it with the cursor); exports are always oldest first
+    storage = request.app.state.storage
+    keyset = None
+    if after:
+        try:
+            keyset = decode_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if format == 'ndjson':
+        # Export: stream every document after the cursor (or up to limit) without buffering
+        async def lines():
+            async for doc in storage.iter_status(keyset, limit):
+                yield ndjson_line(doc)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    docs = await storage.status_page(keyset, page_size, descending=order == 'desc')
+    headers = {}
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1]["timestamp"], docs[-1]["id"])
+    # Documents were written from StatusCheck, skip re-validating them
+    return Response(dumps(docs), media_type="application/json", headers=headers)
@@ -0,0 +1,160 @@
+"""Fixed-capacity, array-backed ring buffer for status checks.
+
+server_production.py has no database; this keeps the newest ``capacity``
+entries in compact columns (16-byte UUIDs, int64 microsecond timestamps)
+instead of an ever-growing list of dicts. Entries are appended in timestamp
+order, so (timestamp, id) keyset cursors are resolved by bisection, and the
+newest N are the last N slots.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+logger = logging.getLogger(__name__)
+
+
+def to_micros(ts: datetime) -> int:
+    return (ts - EPOCH) // _US
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+class StatusRing:
+    __slots__ = ('capacity', '_ids', '_names', '_ts', '_start', '_count')
+
+    def __init__(self, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._ids = bytearray(16 * capacity)
+        self._names: List[Optional[str]] = [None] * capacity
+        self._ts = array('q', bytes(8 * capacity))
+        self._start = 0  # physical slot of the oldest entry
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, id: str, client_name: str, timestamp: datetime) -> None:
+        if self._count < self.capacity:
+            slot = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            # Full: overwrite the oldest entry
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._ids[16 * slot:16 * slot + 16] = uuid.UUID(id).bytes
+        self._names[slot] = client_name
+        self._ts[slot] = to_micros(timestamp)
+
+    def _slot(self, i: int) -> int:
+        return (self._start + i) % self.capacity
+
+    def _id(self, slot: int) -> str:
+        return str(uuid.UUID(bytes=bytes(self._ids[16 * slot:16 * slot + 16])))
+
+    def _record(self, i: int) -> Dict[str, Any]:
+        slot = self._slot(i)
+        return {
+            'id': self._id(slot),
+            'client_name': self._names[slot],
+            'timestamp': from_micros(self._ts[slot]),
+        }
+
+    def _key(self, i: int) -> Tuple[int, str]:
+        slot = self._slot(i)
+        return self._ts[slot], self._id(slot)
+
+    def bisect_after(self, key: Tuple[datetime, str]) -> int:
+        """Logical index of the first entry strictly after the (timestamp, id) key."""
+        return bisect_right(range(self._count), (to_micros(key[0]), key[1]), key=self._key)
+
+    def bisect_before(self, key: Tuple[datetime, str]) -> int:
+        """Number of entries strictly before the (timestamp, id) key."""
+        return bisect_left(range(self._count), (to_micros(key[0]), key[1]), key=self._key)
+
+    def slice(self, start: int, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Entries [start, stop) in ascending (oldest first) order."""
+        stop = self._count if stop is None else min(stop, self._count)
+        return [self._record(i) for i in range(max(start, 0), stop)]
+
+    def iter_from(self, start: int, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        stop = self._count if stop is None else min(stop, self._count)
+        for i in range(max(start, 0), stop):
+            yield self._record(i)
+
+    def newest(self, n: int, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Up to ``n`` entries before logical index ``stop`` (default: all), newest first."""
+        stop = self._count if stop is None else min(stop, self._count)
+        return [self._record(i) for i in range(stop - 1, max(stop - n, 0) - 1, -1)]
+
+    def memory_bytes(self) -> int:
+        names = sum(sys.getsizeof(n) for n in set(self._names) if n is not None)
+        return (
+            sys.getsizeof(self._ids)
+            + sys.getsizeof(self._ts)
+            + sys.getsizeof(self._names)
+            + names
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {'count': self._count, 'capacity': self.capacity, 'memory_bytes': self.memory_bytes()}
+
+    # --- snapshots ---
+
+    def dump_rows(self) -> List[Tuple[str, str, int]]:
+        rows = []
+        for i in range(self._count):
+            slot = self._slot(i)
+            rows.append((self._id(slot), self._names[slot], self._ts[slot]))
+        return rows
+
+    def load_rows(self, rows: List[List[Any]]) -> None:
+        for id, client_name, ts in rows[-self.capacity:]:
+            self.append(id, client_name, from_micros(int(ts)))
+
+
+def write_snapshot(path: str, rows: List[Tuple[str, str, int]]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'rows': rows}, f, separators=(',', ':'))
+    os.replace(tmp, path)  # atomic: a crash mid-write keeps the previous snapshot
+
+
+def load_snapshot(store: StatusRing, path: str) -> int:
+    try:
+        with open(path, encoding='utf-8') as f:
+            rows = json.load(f).get('rows', [])
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        logger.exception("Ignoring unreadable status snapshot %s: %s", path, e)
+        return 0
+    store.load_rows(rows)
+    return len(rows)
+
+
+async def snapshot(store: StatusRing, path: str) -> None:
+    # Copy on the event loop, write to disk off it
+    await asyncio.to_thread(write_snapshot, path, store.dump_rows())
+
+
+async def snapshot_periodically(store: StatusRing, path: str, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await snapshot(store, path)
+        except Exception as e:
+            logger.exception("Status snapshot to %s failed: %s", path, e)
@@ -0,0 +1,186 @@
+"""Pluggable storage backends for status checks, chat sessions and day sync.
+
+MongoStorage is what server.py has always used; MemoryStorage is the ring
+buffer of server_production.py; SqliteStorage is a WAL-mode file that several
+worker processes on one host can share. Either variant can run on any backend
+(STATUS_STORAGE=mongo|memory|sqlite), and the Mongo client, together with
+motor and pymongo, is only created when the database is first touched.
+
+Page queries return up to ``limit + 1`` documents in (timestamp, id) order,
+or newest first with ``descending``; the extra one tells the caller that
+another page exists.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pagination import MAX_PAGE_SIZE, keyset_filter
+from sessions import MongoSessionStore, memory_sessions_from_env, session_ttl_from_env
+from sqlite_store import SqliteDatabase, SqliteSessionStore, SqliteStatusStore, shared_database
+from status_store import StatusRing, load_snapshot, snapshot, snapshot_periodically
+from sync import MemorySyncStore, MongoSyncStore
+from write_behind import writer_from_env
+
+logger = logging.getLogger(__name__)
+
+Keyset = Optional[Tuple[datetime, str]]
+
+
+class MongoStorage:
+    kind = 'mongo'
+
+    def __init__(self, mongo_url: Optional[str] = None, db_name: Optional[str] = None, db: Any = None):
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self._client = None
+        self._db = db
+        # Optional write-behind batching of status inserts (STATUS_WRITE_MODE)
+        self.writer = writer_from_env(lambda: self.db.status_checks)
+        self.sessions = MongoSessionStore(lambda: self.db.chat_sessions, ttl=session_ttl_from_env())
+        self.sync = MongoSyncStore(lambda: self.db)
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self._client = AsyncIOMotorClient(self.mongo_url)
+            self._db = self._client[self.db_name]
+        return self._db
+
+    async def startup(self) -> None:
+        try:
+            await self.db.status_checks.create_index([("timestamp", 1), ("id", 1)], name="timestamp_id")
+            await self.sessions.ensure_indexes()
+            await self.sync.ensure_indexes()
+        except Exception as e:
+            logger.exception("Creating MongoDB indexes failed: %s", e)
+
+    async def shutdown(self) -> None:
+        if self.writer is not None:
+            await self.writer.close()
+        if self._client is not None:
+            self._client.close()
+
+    async def insert_status(self, doc: Dict[str, Any]) -> None:
+        if self.writer is not None:
+            await self.writer.submit(doc)
+        else:
+            await self.db.status_checks.insert_one(doc)
+
+    def _find(self, after: Keyset, descending: bool = False):
+        # Keyset pagination on (timestamp, id), served by the index from startup() in either direction
+        query = keyset_filter(after, descending) if after else {}
+        direction = -1 if descending else 1
+        return self.db.status_checks.find(query, {"_id": 0}).sort([("timestamp", direction), ("id", direction)])
+
+    async def status_page(self, after: Keyset, limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+        return await self._find(after, descending).limit(limit + 1).to_list(limit + 1)
+
+    async def iter_status(self, after: Keyset, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        cursor = self._find(after)
+        if limit:
+            cursor = cursor.limit(limit)
+        async for doc in cursor.batch_size(MAX_PAGE_SIZE):
+            yield doc
+
+    def stats(self) -> Dict[str, Any]:
+        writes = self.writer.stats() if self.writer is not None else {"mode": "sync"}
+        return {"backend": self.kind, **writes}
+
+
+class MemoryStorage:
+    kind = 'memory'
+
+    def __init__(self, capacity: int = 1000, snapshot_path: Optional[str] = None, snapshot_interval: float = 60.0):
+        self.status_checks = StatusRing(capacity)
+        self.sessions = memory_sessions_from_env()
+        self.sync = MemorySyncStore()
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_task = None
+
+    async def startup(self) -> None:
+        if self.snapshot_path:
+            restored = load_snapshot(self.status_checks, self.snapshot_path)
+            logger.info("Restored %d status checks from %s", restored, self.snapshot_path)
+            self._snapshot_task = asyncio.create_task(
+                snapshot_periodically(self.status_checks, self.snapshot_path, self.snapshot_interval)
+            )
+
+    async def shutdown(self) -> None:
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        if self.snapshot_path:
+            await snapshot(self.status_checks, self.snapshot_path)
+
+    async def insert_status(self, doc: Dict[str, Any]) -> None:
+        self.status_checks.append(doc['id'], doc['client_name'], doc['timestamp'])
+
+    def _start(self, after: Keyset) -> int:
+        # Entries are appended in timestamp order, so (timestamp, id) keysets bisect
+        return self.status_checks.bisect_after(after) if after else 0
+
+    async def status_page(self, after: Keyset, limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+        if descending:
+            stop = self.status_checks.bisect_before(after) if after else None
+            return self.status_checks.newest(limit + 1, stop)
+        start = self._start(after)
+        return self.status_checks.slice(start, start + limit + 1)
+
+    async def iter_status(self, after: Keyset, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        start = self._start(after)
+        for doc in self.status_checks.iter_from(start, start + limit if limit else None):
+            yield doc
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.kind, **self.status_checks.stats()}
+
+
+class SqliteStorage:
+    kind = 'sqlite'
+
+    def __init__(self, path: Optional[str] = None, db: Optional[SqliteDatabase] = None):
+        # Shared with the SQLite chat cache of this process
+        self.db = db if db is not None else shared_database(path)
+        self.status_checks = SqliteStatusStore(self.db)
+        self.sessions = SqliteSessionStore(self.db, ttl=session_ttl_from_env())
+        # Day sync and rollups are only implemented for MongoDB and memory
+        self.sync = None
+
+    async def startup(self) -> None:
+        await self.db.read(lambda conn: None)  # creates the schema off the event loop
+
+    async def shutdown(self) -> None:
+        await self.db.flush()
+        self.db.close()
+
+    async def insert_status(self, doc: Dict[str, Any]) -> None:
+        await self.status_checks.insert(doc)
+
+    async def status_page(self, after: Keyset, limit: int, descending: bool = False) -> List[Dict[str, Any]]:
+        return await self.status_checks.page(after, limit + 1, descending)
+
+    async def iter_status(self, after: Keyset, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        async for doc in self.status_checks.iterate(after, limit):
+            yield doc
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.kind, **self.db.stats()}
+
+
+def storage_from_env(default: str = 'memory'):
+    kind = os.environ.get('STATUS_STORAGE', default)
+    if kind == 'mongo':
+        return MongoStorage(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+    if kind == 'memory':
+        return MemoryStorage(
+            capacity=int(os.environ.get('STATUS_RING_CAPACITY', 1000)),
+            snapshot_path=os.environ.get('STATUS_SNAPSHOT_PATH'),
+            snapshot_interval=float(os.environ.get('STATUS_SNAPSHOT_INTERVAL_S', 60)),
+        )
+    if kind == 'sqlite':
+        return SqliteStorage()
+    raise ValueError(f"Unknown STATUS_STORAGE {kind!r}")
@@ -0,0 +1,238 @@
+"""Day-data sync between the app and the backend.
+
+The app keeps everything on the device (``days``, ``cycles`` and ``cycleLogs``
+in useStore.ts). Sync stores one record per (user, date) holding whatever
+the app has for that date: the DayData under ``day``, the cycle log under
+``cycleLog`` and the cycle starting that day under ``cycle``.
+
+Pushes carry only changed dates. A field that is left out stays untouched,
+and an explicit null removes it. Every written record gets the next value
+of a per-user change counter (``rev``). A pull returns the records with
+``rev > since`` in rev order, so a device that remembers the last rev it saw
+catches up in ``ceil(changes / limit)`` round trips. Concurrent pushes for
+the same date resolve last-writer-wins.
+
+MongoSyncStore writes a push with one counter update and one ordered
+``bulk_write`` of upserts, backed by a unique (user, date) index and a
+(user, rev) index for pulls. Pushes for one user are serialized, so revs
+are assigned in commit order: a pull can never see rev N+1 before rev N is
+written, which would make a device that then pulls ``since=N+1`` skip N for
+good. The same lock covers reading the old days and applying the rollup
+deltas, so two pushes for one date cannot both compute their delta from
+the same old value. The lock is per process, so all pushes for a user have
+to reach the same worker (the image runs one). MemorySyncStore keeps the same contract
+in process, where a push never yields before its records are written. Both
+keep the weekly/monthly rollups (rollups.py) current as days change.
+
+Every user-scoped route needs the user's token (SyncAuth): an HMAC of the
+user id under SYNC_SECRET, handed out with a server-chosen id by
+POST /api/sync/register. Nothing is stored, so any worker with the secret
+can check it; without a secret the sync routes are off.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from rollups import MemoryRollupStore, MongoRollupStore, RollupUpdate, day_updates
+
+DEFAULT_PULL_LIMIT = 500
+MAX_PULL_LIMIT = 2000
+SYNC_FIELDS = ('day', 'cycleLog', 'cycle')
+
+# (date, {field: value or None}); None removes the field
+Change = Tuple[str, Dict[str, Any]]
+
+
+def _rollup_updates(changes: List[Change], old_days: Dict[str, Any]) -> List[RollupUpdate]:
+    updates = []
+    for date, fields in changes:
+        if 'day' in fields:
+            updates += day_updates(date, old_days.get(date), fields['day'])
+            old_days[date] = fields['day']
+    return updates
+
+
+def _record(date: str, rev: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {'date': date, 'rev': rev, **{k: v for k, v in fields.items() if v is not None}}
+
+
+class SyncAuth:
+    """Per-user tokens derived from one server secret; the user id is the only input."""
+
+    def __init__(self, secret: Optional[str] = None):
+        self._key = secret.encode('utf-8') if secret else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._key is not None
+
+    def token(self, user: str) -> str:
+        digest = hmac.new(self._key, user.encode('utf-8'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def authorized(self, user: str, token: Optional[str]) -> bool:
+        return self._key is not None and token is not None and hmac.compare_digest(token, self.token(user))
+
+    def register(self) -> Tuple[str, str]:
+        # Ids are picked here, so nobody can claim someone else's
+        user = secrets.token_urlsafe(18)
+        return user, self.token(user)
+
+
+class UserLocks:
+    """One asyncio.Lock per user, dropped again once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, user: str):
+        lock = self._locks.get(user)
+        if lock is None:
+            lock = self._locks[user] = asyncio.Lock()
+        self._users[user] = self._users.get(user, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[user] -= 1
+            if not self._users[user]:
+                del self._users[user]
+                del self._locks[user]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class MongoSyncStore:
+    def __init__(self, get_db: Callable[[], Any]):
+        self._get_db = get_db
+        self.rollups = MongoRollupStore(get_db)
+        self._locks = UserLocks()
+        self.pushed = 0
+        self.pulled = 0
+
+    async def ensure_indexes(self) -> None:
+        days = self._get_db().days
+        await days.create_index([("user", 1), ("date", 1)], unique=True, name="user_date")
+        await days.create_index([("user", 1), ("rev", 1)], name="user_rev")
+        await self.rollups.ensure_indexes()
+
+    async def _old_days(self, user: str, changes: List[Change]) -> Dict[str, Any]:
+        dates = list({date for date, fields in changes if 'day' in fields})
+        if not dates:
+            return {}
+        cursor = self._get_db().days.find({"user": user, "date": {"$in": dates}}, {"_id": 0, "date": 1, "day": 1})
+        return {doc['date']: doc.get('day') async for doc in cursor}
+
+    async def _reserve(self, user: str, n: int) -> int:
+        from pymongo import ReturnDocument
+        counter = await self._get_db().sync_counters.find_one_and_update(
+            {"_id": user}, {"$inc": {"rev": n}}, upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        return counter['rev'] - n
+
+    async def push(self, user: str, changes: List[Change]) -> int:
+        """Write ``changes`` in order and return the user's latest rev."""
+        from pymongo import UpdateOne
+        # Reserving and writing in one step keeps rev order equal to commit order, and the
+        # rollup deltas are taken against the days as the previous push left them
+        async with self._locks.hold(user):
+            old_days = await self._old_days(user, changes)
+            base = await self._reserve(user, len(changes))
+            now = datetime.utcnow()
+            ops = []
+            for i, (date, fields) in enumerate(changes, start=1):
+                update: Dict[str, Any] = {"$set": {"rev": base + i, "updated_at": now,
+                                                   **{k: v for k, v in fields.items() if v is not None}}}
+                removed = {k: "" for k, v in fields.items() if v is None}
+                if removed:
+                    update["$unset"] = removed
+                ops.append(UpdateOne({"user": user, "date": date}, update, upsert=True))
+            # Ordered, so a date sent twice in one batch ends with its last version
+            await self._get_db().days.bulk_write(ops, ordered=True)
+            await self.rollups.apply(user, _rollup_updates(changes, old_days))
+        self.pushed += len(changes)
+        return base + len(changes)
+
+    async def pull(self, user: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        """Records changed after ``since``, oldest first; ``limit + 1`` signals another page."""
+        cursor = self._get_db().days.find(
+            {"user": user, "rev": {"$gt": since}}, {"_id": 0, "user": 0, "updated_at": 0},
+        ).sort("rev", 1).limit(limit + 1)
+        docs = await cursor.to_list(limit + 1)
+        self.pulled += min(len(docs), limit)
+        return docs
+
+    async def iter_records(self, user: str, batch_size: int = DEFAULT_PULL_LIMIT) -> AsyncIterator[Dict[str, Any]]:
+        """Every record of ``user`` in rev order, fetched ``batch_size`` at a time (user_rev index)."""
+        cursor = self._get_db().days.find(
+            {"user": user}, {"_id": 0, "user": 0, "updated_at": 0},
+        ).sort("rev", 1).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'mongo', 'pushed': self.pushed, 'pulled': self.pulled}
+
+
+class MemorySyncStore:
+    def __init__(self):
+        # user -> date -> record, kept in rev order by moving updated dates to the end
+        self._users: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+        self._revs: Dict[str, int] = {}
+        self.rollups = MemoryRollupStore(self._raw_days)
+        self.pushed = 0
+        self.pulled = 0
+
+    def _raw_days(self, user: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for date, record in self._users.get(user, {}).items():
+            if 'day' in record:
+                yield date, record['day']
+
+    async def push(self, user: str, changes: List[Change]) -> int:
+        records = self._users.setdefault(user, OrderedDict())
+        old_days = {date: records[date].get('day') for date, _ in changes if date in records}
+        rev = self._revs.get(user, 0)
+        for date, fields in changes:
+            rev += 1
+            merged = {**records.pop(date, {}), **fields}
+            records[date] = _record(date, rev, {k: merged.get(k) for k in SYNC_FIELDS})
+        self._revs[user] = rev
+        await self.rollups.apply(user, _rollup_updates(changes, old_days))
+        self.pushed += len(changes)
+        return rev
+
+    async def pull(self, user: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        docs = []
+        for record in reversed(self._users.get(user, {}).values()):
+            if record['rev'] <= since:
+                break
+            docs.append(record)
+        docs = docs[::-1][:limit + 1]
+        self.pulled += min(len(docs), limit)
+        return [dict(d) for d in docs]
+
+    async def iter_records(self, user: str, batch_size: int = DEFAULT_PULL_LIMIT) -> AsyncIterator[Dict[str, Any]]:
+        # A snapshot of the references, as pushes may reorder the dict while the export runs
+        for record in list(self._users.get(user, {}).values()):
+            yield dict(record)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'memory', 'users': len(self._users), 'pushed': self.pushed, 'pulled': self.pulled}
+
+
+def sync_auth_from_env() -> SyncAuth:
+    return SyncAuth(os.environ.get('SYNC_SECRET'))
+
+
+def max_push_from_env() -> int:
+    return int(os.environ.get('SYNC_MAX_BATCH', 1000))
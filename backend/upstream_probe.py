@@ -0,0 +1,199 @@
+"""Background readiness tracking for the LLM upstream.
+
+The app used to probe the backend before every greeting and reply, which cost
+one extra round trip per message. The server now keeps track of the upstream
+itself, and readiness is one dictionary read:
+
+- Every real upstream call reports its outcome and latency (observe()).
+- A background task sends a minimal completion only when no real call
+  happened within the last ``interval``, so an idle server still notices an
+  outage without spending tokens on a busy one.
+- Each observation updates a rolling window and precomputes the snapshot
+  and the ``X-Upstream-Status`` hint (``ready; latency_ms=420``). /api/health,
+  /api/ping and the header on every chat response just return those.
+
+Statuses: ``ready``, ``degraded`` (recent failures), ``down`` (``down_after``
+failures in a row), ``unavailable`` (no LLM client configured) and
+``unknown`` (nothing observed yet).
+
+Every worker process runs its own prober. prober_from_env() stretches the
+interval by WEB_CONCURRENCY, so N workers together still probe an idle
+upstream about once per UPSTREAM_PROBE_INTERVAL_S.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Request
+from starlette.responses import Response
+
+UPSTREAM_STATUS_HEADER = "X-Upstream-Status"
+_HEADER_KEY = UPSTREAM_STATUS_HEADER.lower().encode('latin-1')
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamProber:
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[bool]],
+        interval: float = 30.0,
+        timeout: float = 10.0,
+        window: int = 20,
+        down_after: int = 3,
+        min_ok_ratio: float = 0.8,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """``probe`` returns False when there is no upstream to ask and raises when the call fails.
+
+        ``interval=0`` disables active probes; real calls are still observed.
+        """
+        self._probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.down_after = down_after
+        self.min_ok_ratio = min_ok_ratio
+        self._clock = clock
+        self._window: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.available = True
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_observed: Optional[float] = None
+        self.probes = 0
+        self.skipped = 0
+        self.observed = 0
+        self.failures = 0
+        self._snapshot: Dict[str, Any] = {'status': 'unknown'}
+        self.hint = 'unknown'
+
+    @property
+    def status(self) -> str:
+        return self._snapshot['status']
+
+    def observe(self, ok: bool, seconds: float, error: Optional[str] = None) -> None:
+        self.available = True
+        self._window.append((ok, seconds))
+        self.last_observed = self._clock()
+        self.observed += 1
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+        self._refresh()
+
+    def _refresh(self) -> None:
+        # O(window) per observation, so that readers pay nothing
+        latencies = sorted(s for ok, s in self._window if ok)
+        ok_ratio = len(latencies) / len(self._window) if self._window else 0.0
+        if not self.available:
+            status = 'unavailable'
+        elif not self._window:
+            status = 'unknown'
+        elif self.consecutive_failures >= self.down_after:
+            status = 'down'
+        elif self.consecutive_failures or ok_ratio < self.min_ok_ratio:
+            status = 'degraded'
+        else:
+            status = 'ready'
+        p50 = round(latencies[len(latencies) // 2] * 1000) if latencies else None
+        self._snapshot = {
+            'status': status,
+            'ok_ratio': round(ok_ratio, 3),
+            'latency_p50_ms': p50,
+            'latency_max_ms': round(latencies[-1] * 1000) if latencies else None,
+            'window': len(self._window),
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+        }
+        self.hint = status if p50 is None else f"{status}; latency_ms={p50}"
+
+    async def probe_once(self) -> None:
+        self.probes += 1
+        started = time.perf_counter()
+        try:
+            reachable = await asyncio.wait_for(self._probe(), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.observe(False, time.perf_counter() - started, type(e).__name__)
+            return
+        if reachable is False:
+            self.available = False
+            self.last_observed = self._clock()
+            self._refresh()
+            return
+        self.observe(True, time.perf_counter() - started)
+
+    async def run(self) -> None:
+        if not self.interval:
+            return
+        while True:
+            # Real traffic already tells us how the upstream is doing
+            if self.last_observed is not None and self._clock() - self.last_observed < self.interval:
+                self.skipped += 1
+            else:
+                try:
+                    await self.probe_once()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:  # never let the prober die
+                    logger.exception("Upstream probe failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        age = None if self.last_observed is None else round(self._clock() - self.last_observed, 1)
+        return {**self._snapshot, 'age_s': age}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.snapshot(), 'probes': self.probes, 'skipped': self.skipped,
+                'observed': self.observed, 'failures': self.failures, 'interval_s': self.interval}
+
+
+class UpstreamHintMiddleware:
+    """Pure ASGI middleware adding the cached X-Upstream-Status hint to responses under ``prefix``."""
+
+    def __init__(self, app: Any, prober: UpstreamProber, prefix: str = '/api/chat'):
+        self.app = app
+        self.prober = prober
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_hint(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((_HEADER_KEY, self.prober.hint.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_hint)
+
+
+router = APIRouter(prefix="/api")
+
+
+@router.api_route("/ping", methods=["GET", "HEAD"])
+async def ping(request: Request):
+    # Always 200 while the backend is up: chat still answers (from the fallback) when the LLM is not
+    prober: Optional[UpstreamProber] = request.app.state.upstream
+    hint = prober.hint if prober is not None else 'unknown'
+    return Response(hint.split(';', 1)[0], media_type="text/plain", headers={UPSTREAM_STATUS_HEADER: hint})
+
+
+def prober_from_env(probe: Callable[[], Awaitable[bool]]) -> UpstreamProber:
+    workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    return UpstreamProber(
+        probe,
+        interval=float(os.environ.get('UPSTREAM_PROBE_INTERVAL_S', 30)) * workers,
+        timeout=float(os.environ.get('UPSTREAM_PROBE_TIMEOUT_S', 10)),
+        window=int(os.environ.get('UPSTREAM_PROBE_WINDOW', 20)),
+        down_after=int(os.environ.get('UPSTREAM_DOWN_AFTER', 3)),
+    )
@@ -0,0 +1,162 @@
+"""Write-behind batching for MongoDB inserts.
+
+Documents are queued in memory and flushed with insert_many(ordered=False)
+once max_batch documents are waiting or max_delay has passed since the first
+one. Two durability modes are supported:
+
+- ``write_behind``: the request is acknowledged as soon as the document is
+  queued. Anything still buffered is lost if the process dies.
+- ``group_commit``: the request waits until the batch holding its document
+  has been written, so only the round trips are shared.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MODES = ('sync', 'write_behind', 'group_commit')
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        get_collection: Callable[[], Any],
+        mode: str = 'write_behind',
+        max_batch: int = 500,
+        max_delay: float = 0.05,
+        max_queue: int = 10000,
+    ):
+        if mode not in MODES[1:]:
+            raise ValueError(f"unsupported write-behind mode: {mode}")
+        self._get_collection = get_collection
+        self.mode = mode
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._batch_ready = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def submit(self, doc: Dict[str, Any]) -> None:
+        if self._closing:
+            raise RuntimeError("write-behind buffer is closed")
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future() if self.mode == 'group_commit' else None
+        # A full queue applies backpressure to writers instead of growing without bound
+        await self._queue.put((doc, fut))
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        if depth >= self.max_batch:
+            self._batch_ready.set()
+        if fut is not None:
+            await fut
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            if self._queue.qsize() + 1 < self.max_batch and not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+            batch = [first]
+            stop = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]) -> None:
+        started = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            await self._get_collection().insert_many([doc for doc, _ in batch], ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            # ordered=False: the server still writes every document it can
+            inserted = getattr(e, 'details', {}) or {}
+            ok = inserted.get('nInserted', 0)
+            self.written += ok
+            self.failed += len(batch) - ok
+            error = e
+            logger.exception("Write-behind flush of %d documents failed: %s", len(batch), e)
+        self.batches += 1
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        for _, fut in batch:
+            if fut is not None and not fut.done():
+                if error is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(error)
+
+    async def close(self) -> None:
+        """Stop accepting documents and flush everything still buffered."""
+        self._closing = True
+        if self._task is None:
+            return
+        # The runner flushes everything queued ahead of the sentinel, then exits
+        await self._queue.put(_STOP)
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+        # Writers that were blocked on a full queue when closing started
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        for i in range(0, len(leftovers), self.max_batch):
+            await self._flush(leftovers[i:i + self.max_batch])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_depth': self.max_depth,
+            'max_queue': self.max_queue,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+        }
+
+
+def writer_from_env(get_collection: Callable[[], Any]) -> Optional[WriteBehindBuffer]:
+    """Build the buffer configured by STATUS_WRITE_MODE; None keeps direct inserts."""
+    mode = os.environ.get('STATUS_WRITE_MODE', 'sync')
+    if mode == 'sync':
+        return None
+    return WriteBehindBuffer(
+        get_collection,
+        mode=mode,
+        max_batch=int(os.environ.get('STATUS_WRITE_MAX_BATCH', 500)),
+        max_delay=float(os.environ.get('STATUS_WRITE_MAX_DELAY_MS', 50)) / 1000,
+        max_queue=int(os.environ.get('STATUS_WRITE_MAX_QUEUE', 10000)),
+    )
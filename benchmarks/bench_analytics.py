@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized analytics (backend/analytics.py) vs. naive per-day loops
+
+The naive version is a line-by-line port of what the app does today in
+computeExtendedStats / computePremiumInsights / buildCompactSummary: re-sort
+the days map for every metric and walk it in Python. "speedup" compares it
+with column extraction plus the NumPy metrics, which is what a request pays.
+
+    python benchmarks/bench_analytics.py --years 1 3 10 --repeat 5
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from analytics import compute_analytics, to_columns  # noqa: E402
+
+
+def make_days(n_days, seed=0):
+    rng = random.Random(seed)
+    start = date(2015, 1, 1)
+    days = {}
+    weight = 72.0
+    for i in range(n_days):
+        key = (start + timedelta(days=i)).isoformat()
+        weight += rng.uniform(-0.3, 0.25)
+        days[key] = {
+            "date": key,
+            "pills": {"morning": rng.random() < 0.9, "evening": rng.random() < 0.85},
+            "drinks": {
+                "water": rng.randint(0, 12),
+                "coffee": rng.randint(0, 5),
+                "slimCoffee": False,
+                "gingerGarlicTea": False,
+                "waterCure": False,
+                "sport": rng.random() < 0.4,
+            },
+            "weight": round(weight, 1) if rng.random() < 0.7 else None,
+        }
+    return days
+
+
+def naive_analytics(days):
+    def sorted_days():
+        return sorted(days.values(), key=lambda d: d["date"])
+
+    def avg(xs):
+        return sum(xs) / len(xs) if xs else 0
+
+    out = {"windows": {}}
+    for w in (7, 14, 30):
+        arr = sorted_days()[-w:]
+        out["windows"][str(w)] = {
+            "water_avg": avg([d["drinks"]["water"] for d in arr]),
+            "coffee_avg": avg([d["drinks"]["coffee"] for d in arr]),
+            "pill_adherence": avg([1 if d["pills"]["morning"] and d["pills"]["evening"] else 0 for d in arr]),
+        }
+
+    arr = sorted_days()
+    out["compliance_rate"] = len([d for d in arr if d["pills"]["morning"] and d["pills"]["evening"]]) / (len(arr) or 1)
+
+    arr = sorted_days()
+    ws = [d for d in arr if isinstance(d.get("weight"), (int, float))]
+    ewma = None
+    if ws:
+        ewma = ws[0]["weight"]
+        for d in ws[1:]:
+            ewma = 0.3 * d["weight"] + 0.7 * ewma
+    out["ewma"] = ewma
+
+    arr = sorted_days()
+    best = cur = 0
+    for d in arr:
+        perfect = d["pills"]["morning"] and d["pills"]["evening"] and d["drinks"]["water"] >= 6 and d.get("weight") is not None
+        cur = cur + 1 if perfect else 0
+        best = max(best, cur)
+    out["best_perfect"] = best
+    return out
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'days':>8} {'naive ms':>10} {'columns ms':>11} {'numpy ms':>10} {'speedup':>8}")
+    for years in args.years:
+        days = make_days(years * 365)
+        t_naive, naive = timed(lambda: naive_analytics(days), args.repeat)
+        t_cols, cols = timed(lambda: to_columns(days.values()), args.repeat)
+        t_np, vec = timed(lambda: compute_analytics(cols), args.repeat)
+
+        assert vec["streaks"]["best_perfect"] == naive["best_perfect"]
+        assert abs(vec["weight"]["ewma"] - naive["ewma"]) < 1e-6
+        assert abs(vec["windows"]["30"]["water_avg"] - naive["windows"]["30"]["water_avg"]) < 1e-9
+
+        speedup = t_naive / (t_cols + t_np)
+        print(f"{len(days):>8} {t_naive * 1e3:>10.2f} {t_cols * 1e3:>11.2f} {t_np * 1e3:>10.2f} {speedup:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming NDJSON export/import of sync history (backend/history_io.py)
+
+Runs the same pipeline as GET /api/sync/{user}/export and
+POST /api/sync/{user}/import on N synthetic day records. The records are
+generated lazily, so any memory growth belongs to the pipeline:
+
+  - export: records -> NDJSON chunks (-> gzip), into a byte-counting sink,
+  - import: NDJSON bytes (gzipped or not) -> parse -> SyncChange validation
+    -> batched pushes into the sync store; the timing includes generating
+    the upload,
+  - peak traced memory for N/10 and N records (flat means it does not grow).
+
+The default ``null`` store only counts pushes, to isolate parsing and
+validation; ``memory`` uses MemorySyncStore and ``mongo`` a real MongoDB
+through motor (``--mongo-url``), including its cursor batches on export.
+
+    python benchmarks/bench_history.py --records 1000000
+    python benchmarks/bench_history.py --store mongo --mongo-url mongodb://localhost:27017
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+from datetime import date as Date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from history_io import gzip_chunks, import_ndjson, ndjson_chunks  # noqa: E402
+from pagination import dumps  # noqa: E402
+from sync import MemorySyncStore, MongoSyncStore  # noqa: E402
+
+logging.disable(logging.INFO)
+import server  # noqa: E402
+
+USER = "bench"
+EPOCH = Date(2000, 1, 1)
+CHUNK = 64 * 1024
+
+
+class NullStore:
+    def __init__(self):
+        self.rev = 0
+
+    async def push(self, user, changes):
+        self.rev += len(changes)
+        return self.rev
+
+
+def record(i):
+    date = (EPOCH + timedelta(days=i)).isoformat()
+    return {
+        "date": date,
+        "rev": i + 1,
+        "day": {
+            "date": date,
+            "pills": {"morning": True, "evening": i % 3 != 0},
+            "drinks": {"water": i % 9, "coffee": i % 4, "slimCoffee": False, "gingerGarlicTea": False,
+                       "waterCure": False, "sport": i % 5 == 0},
+            "weight": 60 + (i % 100) / 10,
+        },
+        "cycleLog": {"mood": i % 5 + 1, "energy": i % 4 + 1, "notes": "ok"},
+    }
+
+
+async def records(n):
+    for i in range(n):
+        yield record(i)
+
+
+async def body_chunks(n, compress):
+    # NDJSON upload generated on the fly, sliced like a network body
+    async def plain():
+        buffer = bytearray()
+        for i in range(n):
+            buffer += dumps(record(i)).encode("utf-8") + b"\n"
+            if len(buffer) >= CHUNK:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    source = gzip_chunks(plain()) if compress else plain()
+    async for chunk in source:
+        yield chunk
+
+
+def make_store(args):
+    if args.store == "null":
+        return NullStore()
+    if args.store == "memory":
+        return MemorySyncStore()
+    from motor.motor_asyncio import AsyncIOMotorClient
+    db = AsyncIOMotorClient(args.mongo_url)[args.db_name]
+    return MongoSyncStore(lambda: db)
+
+
+async def export(source, n, compress, batch):
+    chunks = ndjson_chunks(source, batch)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+async def run_import(store, n, compress, batch):
+    return await import_ndjson(store, USER, body_chunks(n, compress), server._import_change, compress, batch)
+
+
+def timed(coro):
+    started = time.perf_counter()
+    result = asyncio.run(coro)
+    return result, time.perf_counter() - started
+
+
+def peak_kib(coro_factory):
+    tracemalloc.start()
+    asyncio.run(coro_factory())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--store", choices=("null", "memory", "mongo"), default="null")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="bench_history")
+    parser.add_argument("--export-batch", type=int, default=1000)
+    parser.add_argument("--import-batch", type=int, default=500)
+    parser.add_argument("--skip-memory", action="store_true", help="skip the (slow) traced-memory passes")
+    args = parser.parse_args()
+    n = args.records
+
+    print(f"{n} records, store={args.store}")
+    for compress in (False, True):
+        label = "gzip " if compress else "plain"
+        store = make_store(args)
+        result, elapsed = timed(run_import(store, n, compress, args.import_batch))
+        assert result["imported"] == n
+        print(f"import {label}  {n / elapsed:12,.0f} records/s  {elapsed:7.2f} s  ({result['batches']} batches)")
+
+        source = store.iter_records(USER, args.export_batch) if args.store != "null" else records(n)
+        size, elapsed = timed(export(source, n, compress, args.export_batch))
+        print(f"export {label}  {n / elapsed:12,.0f} records/s  {elapsed:7.2f} s  {size / 2**20:8.1f} MiB")
+
+    if not args.skip_memory and args.store == "null":
+        for count in (n // 10, n):
+            imp = peak_kib(lambda: run_import(NullStore(), count, True, args.import_batch))
+            exp = peak_kib(lambda: export(records(count), count, True, args.export_batch))
+            print(f"peak traced memory, {count:>9} records: import {imp:8.0f} KiB, export {exp:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
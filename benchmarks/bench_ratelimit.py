@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-client token-bucket rate limiter (backend/ratelimit.py)
+
+Measures, for N distinct clients:
+  - acquire() on known clients (the steady state),
+  - acquire() when every request is a new client (insert + idle eviction),
+  - the full RateLimitMiddleware path against a no-op ASGI app,
+  - memory held per tracked client.
+
+    python benchmarks/bench_ratelimit.py --clients 10000 --requests 1000000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from ratelimit import Budget, RateLimiter, RateLimitMiddleware, TrustedProxies  # noqa: E402
+
+BUDGETS = {"chat": Budget(20, 20 / 60), "status": Budget(120, 2.0)}
+
+
+def bench_known_clients(clients, requests):
+    limiter = RateLimiter(BUDGETS, max_clients=clients)
+    ids = [f"client-{i}" for i in range(clients)]
+    for client in ids:
+        limiter.acquire("status", client)
+    acquire = limiter.acquire
+    started = time.perf_counter()
+    for i in range(requests):
+        acquire("status", ids[i % clients])
+    return (time.perf_counter() - started) / requests
+
+
+def bench_churn(clients, requests):
+    # Every request is a new client; the table stays at max_clients by evicting the coldest
+    limiter = RateLimiter(BUDGETS, max_clients=clients)
+    ids = [f"client-{i}" for i in range(requests)]
+    acquire = limiter.acquire
+    started = time.perf_counter()
+    for client in ids:
+        acquire("chat", client)
+    elapsed = time.perf_counter() - started
+    assert limiter.stats()["budgets"]["chat"]["clients"] == clients
+    return elapsed / requests
+
+
+def bench_middleware(clients, requests):
+    async def app(scope, receive, send):
+        return None
+
+    async def run(handler):
+        # Two proxy hops in front of every client, as behind a load balancer
+        scopes = [
+            {"type": "http", "path": "/api/status", "client": ("10.0.0.1", 1),
+             "headers": [(b"x-forwarded-for", f"172.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}, 10.0.0.2".encode())]}
+            for i in range(clients)
+        ]
+        started = time.perf_counter()
+        for i in range(requests):
+            await handler(scopes[i % clients], None, None)
+        return (time.perf_counter() - started) / requests
+
+    limiter = RateLimiter({"status": Budget(1e9, 1e9)}, max_clients=clients)
+    baseline = asyncio.run(run(app))
+    limited = asyncio.run(run(RateLimitMiddleware(app, limiter, trusted_proxies=TrustedProxies(["10.0.0.0/8"]))))
+    return limited - baseline
+
+
+def bytes_per_client(clients):
+    tracemalloc.start()
+    limiter = RateLimiter(BUDGETS, max_clients=clients)
+    ids = [f"client-{i}" for i in range(clients)]
+    before = tracemalloc.take_snapshot()
+    for client in ids:
+        limiter.acquire("chat", client)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return grown / clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.requests} requests")
+    print(f"acquire, known clients     {bench_known_clients(args.clients, args.requests) * 1e6:8.3f} us/op")
+    print(f"acquire, new client each   {bench_churn(args.clients, args.requests) * 1e6:8.3f} us/op")
+    print(f"middleware overhead        {bench_middleware(args.clients, args.requests) * 1e6:8.3f} us/request")
+    print(f"memory                     {bytes_per_client(args.clients):8.0f} bytes/client")
+
+
+if __name__ == "__main__":
+    main()
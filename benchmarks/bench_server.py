@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+In-process load benchmark for server.py and server_production.py
+
+Drives the FastAPI apps through httpx's ASGI transport (no network, no
+uvicorn), with a deterministic stub LLM client and mongomock-motor standing
+in for MongoDB, and reports throughput and p50/p95/p99 latency per scenario.
+
+    python benchmarks/bench_server.py --variant both --concurrency 32 --requests 2000
+    python benchmarks/bench_server.py --save-baseline bench_baseline.json
+    python benchmarks/bench_server.py --baseline bench_baseline.json --tolerance 0.25
+
+With --baseline the run exits non-zero when any scenario's p95 latency rose or
+its throughput fell by more than the tolerance.
+
+Needs the dev requirements: pip install -r backend/requirements-dev.txt
+"""
+
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from llm_stub import StubLLMClient  # noqa: E402
+from ratelimit import RateLimiter, TrustedProxies  # noqa: E402
+from storage import MemoryStorage, MongoStorage  # noqa: E402
+
+VARIANTS = {"server": "server", "production": "server_production"}
+SCENARIOS = ("health", "status_post", "status_get", "chat_greeting", "chat_intent", "chat")
+
+
+def load_app(variant, llm):
+    module = importlib.import_module(VARIANTS[variant])
+    module.llm.client = llm
+    storage = MongoStorage(db=AsyncMongoMockClient()["bench"]) if variant == "server" else MemoryStorage()
+    # Rate limiting on with the default budgets; httpx's ASGI transport connects
+    # from 127.0.0.1, which stands in for the deploy proxy
+    return module.create_app(storage=storage, rate_limiter=RateLimiter(), trusted_proxies=TrustedProxies(["127.0.0.1"]))
+
+
+def build_request(variant, scenario, i):
+    if scenario == "health":
+        # Same route for both variants, so their numbers compare
+        return "GET", "/api/health", {}
+    if scenario == "status_post":
+        return "POST", "/api/status", {"json": {"client_name": f"bench-{i}"}}
+    if scenario == "status_get":
+        return "GET", "/api/status", {"params": {"limit": 100}}
+    if scenario == "chat_greeting":
+        # Same launch greeting for every client: exercises cache and coalescing
+        summary = {"water_avg14": 5.5, "pill_adherence7": 86, "weight_trend_per_day": -0.05}
+        return "POST", "/api/chat", {"json": {"mode": "greeting", "language": "de", "summary": summary}}
+    if scenario == "chat_intent":
+        # Routine question answered by the intent fast path (ahead of the cache), never upstream
+        messages = [{"role": "user", "content": "Wie viel Wasser soll ich trinken?"}]
+        return "POST", "/api/chat", {"json": {"mode": "chat", "language": "de", "messages": messages}}
+    if scenario == "chat":
+        # Distinct messages: every request pays the (stub) upstream latency
+        messages = [{"role": "user", "content": f"Wie kann ich heute besser schlafen? #{i}"}]
+        return "POST", "/api/chat", {"json": {"mode": "chat", "language": "de", "messages": messages}}
+    raise ValueError(f"unknown scenario {scenario}")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+async def run_scenario(client, variant, scenario, total, concurrency):
+    latencies = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        for i in iter(lambda: next(counter), None):
+            if i >= total:
+                return
+            method, path, kwargs = build_request(variant, scenario, i)
+            # Every request is a distinct app install, as in production, so the
+            # per-client rate limiter is exercised without throttling the run
+            kwargs["headers"] = {"X-Forwarded-For": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"}
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors += 1
+            # Cached responses complete without suspending; yield like a socket read would,
+            # otherwise one worker can monopolize the loop and starve the others
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run_suite(variant, scenarios=SCENARIOS, total=500, concurrency=16, llm_latency=0.05, failure_rate=0.0, seed=0):
+    llm = StubLLMClient(latency=llm_latency, failure_rate=failure_rate, seed=seed)
+    app = load_app(variant, llm)
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = await run_scenario(client, variant, scenario, total, concurrency)
+            results["_upstream_calls"] = llm.calls
+            return results
+    finally:
+        await app.router.shutdown()
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for variant, scenarios in results.items():
+        for scenario, current in scenarios.items():
+            base = baseline.get(variant, {}).get(scenario)
+            if not isinstance(current, dict) or not base:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{variant}/{scenario}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+            if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{variant}/{scenario}: {current['throughput_rps']} req/s < baseline {base['throughput_rps']} req/s"
+                )
+    return regressions
+
+
+def print_table(variant, results):
+    print(f"\n== {variant} (upstream calls: {results['_upstream_calls']}) ==")
+    print(f"{'scenario':<14} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for scenario, r in results.items():
+        if scenario.startswith("_"):
+            continue
+        print(
+            f"{scenario:<14} {r['throughput_rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}"
+        )
+
+
+def main():
+    # The servers configure INFO logging at import; per-request log lines would dominate the run
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variant", choices=["server", "production", "both"], default="both")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="JSON file from --save-baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--save-baseline", help="write this run's results as a baseline")
+    args = parser.parse_args()
+
+    variants = ["server", "production"] if args.variant == "both" else [args.variant]
+    results = {}
+    for variant in variants:
+        results[variant] = asyncio.run(
+            run_suite(
+                variant,
+                args.scenarios,
+                args.requests,
+                args.concurrency,
+                args.llm_latency_ms / 1000,
+                args.llm_failure_rate,
+                args.seed,
+            )
+        )
+        print_table(variant, results[variant])
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ import { computeAISummary } from './summary';
 
 export interface CloudChatResponse {
   text: string;
+  session_id?: string;
+  summary_hash?: string;
 }
 
 export interface CloudChatRequest {
@@ -12,18 +14,58 @@ export interface CloudChatRequest {
   model?: string;
   summary?: Record<string, any>;
   messages?: Array<{ role: 'user' | 'assistant' | 'system'; content: string }>;
+  new_session?: boolean;
+  session_id?: string;
+  summary_hash?: string;
+}
+
+class CloudChatError extends Error {
+  status: number;
+
+  constructor(status: number) {
+    super(`Cloud LLM responded with status ${status}`);
+    this.status = status;
+  }
+}
+
+// Server-side chat session: after the first reply only the new message is sent,
+// plus the summary when it changed since the last request
+let chatSession: { id: string; summaryHash: string; summaryJson: string } | null = null;
+
+// Upstream readiness as last reported by the backend (X-Upstream-Status: "ready; latency_ms=420")
+const UPSTREAM_STATUS_HEADER = 'X-Upstream-Status';
+const UPSTREAM_HINT_MAX_AGE_MS = 60_000;
+let upstreamHint: { status: string; at: number } | null = null;
+
+function rememberUpstreamHint(response: Response) {
+  const hint = response.headers.get(UPSTREAM_STATUS_HEADER);
+  if (hint) {
+    upstreamHint = { status: hint.split(';')[0].trim(), at: Date.now() };
+  }
+}
+
+/**
+ * Whether a recent response said the Cloud LLM is down; the backend probes it in the background,
+ * so there is no need to check before every message
+ */
+function cloudKnownDown(): boolean {
+  if (!upstreamHint || Date.now() - upstreamHint.at > UPSTREAM_HINT_MAX_AGE_MS) {
+    return false;
+  }
+  return upstreamHint.status === 'down' || upstreamHint.status === 'unavailable';
 }
 
 /**
- * Test if Cloud LLM is reachable by doing a simple health check
+ * Test if Cloud LLM is reachable; the backend answers from its cached upstream readiness
  */
 export async function testCloudConnection(): Promise<boolean> {
   try {
-    const response = await apiFetch('/', { 
-      method: 'GET',
+    const response = await apiFetch('/ping', { 
+      method: 'HEAD',
       signal: AbortSignal.timeout(3000) // 3 second timeout
     });
-    return response.ok;
+    rememberUpstreamHint(response);
+    return response.ok && !cloudKnownDown();
   } catch (error) {
     console.warn('Cloud LLM connection test failed:', error);
     return false;
@@ -34,6 +76,11 @@ export async function testCloudConnection(): Promise<boolean> {
  * Call Cloud LLM with timeout and error handling
  */
 export async function callCloudLLM(request: CloudChatRequest): Promise<string> {
+  const data = await callCloudChat(request);
+  return data.text || '';
+}
+
+async function callCloudChat(request: CloudChatRequest): Promise<CloudChatResponse> {
   try {
     const response = await apiFetch('/chat', {
       method: 'POST',
@@ -43,13 +90,13 @@ export async function callCloudLLM(request: CloudChatRequest): Promise<string> {
       body: JSON.stringify(request),
       signal: AbortSignal.timeout(8000) // 8 second timeout
     });
+    rememberUpstreamHint(response);
 
     if (!response.ok) {
-      throw new Error(`Cloud LLM responded with status ${response.status}`);
+      throw new CloudChatError(response.status);
     }
 
-    const data: CloudChatResponse = await response.json();
-    return data.text || '';
+    return (await response.json()) as CloudChatResponse;
   } catch (error) {
     console.warn('Cloud LLM call failed:', error);
     throw error;
@@ -61,10 +108,9 @@ export async function callCloudLLM(request: CloudChatRequest): Promise<string> {
  */
 export async function hybridGreeting(state: any): Promise<string> {
   try {
-    // Test connection first
-    const isConnected = await testCloudConnection();
-    if (!isConnected) {
-      throw new Error('Cloud LLM not reachable');
+    // No pre-flight probe: the chat call itself times out and falls back to local
+    if (cloudKnownDown()) {
+      throw new Error('Cloud LLM reported down');
     }
 
     // Prepare summary for Cloud LLM
@@ -95,33 +141,63 @@ export async function hybridGreeting(state: any): Promise<string> {
  */
 export async function hybridReply(state: any, userMessage: string): Promise<string> {
   try {
-    // Test connection first
-    const isConnected = await testCloudConnection();
-    if (!isConnected) {
-      throw new Error('Cloud LLM not reachable');
+    // No pre-flight probe: the chat call itself times out and falls back to local
+    if (cloudKnownDown()) {
+      throw new Error('Cloud LLM reported down');
     }
 
     // Prepare summary for Cloud LLM
     const summary = computeAISummary(state);
-    
-    // Get recent chat history for context
-    const recentChat = (state.chat || []).slice(-6).map((msg: any) => ({
-      role: msg.sender === 'user' ? 'user' as const : 'assistant' as const,
-      content: msg.text
-    }));
+    const language = state.language || 'de';
+    const newMessage = { role: 'user' as const, content: userMessage };
 
-    // Add current user message
-    recentChat.push({ role: 'user', content: userMessage });
+    let data: CloudChatResponse | null = null;
+    if (chatSession) {
+      const summaryJson = JSON.stringify(summary);
+      try {
+        data = await callCloudChat({
+          mode: 'chat',
+          language,
+          model: 'gpt-4o-mini',
+          session_id: chatSession.id,
+          summary_hash: chatSession.summaryHash,
+          summary: summaryJson !== chatSession.summaryJson ? summary : undefined,
+          messages: [newMessage],
+        });
+      } catch (error) {
+        // 409: the server lost the session (or it expired); start over with the full state
+        if (!(error instanceof CloudChatError && error.status === 409)) {
+          throw error;
+        }
+        chatSession = null;
+      }
+    }
 
-    const request: CloudChatRequest = {
-      mode: 'chat',
-      language: state.language || 'de',
-      model: 'gpt-4o-mini',
-      summary,
-      messages: recentChat
-    };
+    if (!data) {
+      // Get recent chat history for context
+      const recentChat = (state.chat || []).slice(-6).map((msg: any) => ({
+        role: msg.sender === 'user' ? 'user' as const : 'assistant' as const,
+        content: msg.text
+      }));
 
-    const result = await callCloudLLM(request);
+      // Add current user message
+      recentChat.push(newMessage);
+
+      data = await callCloudChat({
+        mode: 'chat',
+        language,
+        model: 'gpt-4o-mini',
+        summary,
+        messages: recentChat,
+        new_session: true,
+      });
+    }
+
+    if (data.session_id && data.summary_hash) {
+      chatSession = { id: data.session_id, summaryHash: data.summary_hash, summaryJson: JSON.stringify(summary) };
+    }
+
+    const result = data.text || '';
     if (result && result.trim()) {
       console.log('✅ Cloud LLM reply successful');
       return result.trim();
@@ -130,6 +206,8 @@ export async function hybridReply(state: any, userMessage: string): Promise<stri
     throw new Error('Empty response from Cloud LLM');
   } catch (error) {
     console.log('🔄 Cloud LLM failed, falling back to local reply:', error);
+    // The session would miss this turn; the next cloud reply starts from the local history
+    chatSession = null;
     return await localReply(state, userMessage);
   }
 }
@@ -0,0 +1,85 @@
+# Run with the dev requirements installed: pip install -r backend/requirements-dev.txt
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend modules are deployed flat (uvicorn server:app from backend/)
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from admission import AdmissionController, CircuitBreaker  # noqa: E402
+from chat_cache import ResponseCache  # noqa: E402
+from greetings import GreetingStore  # noqa: E402
+from intents import IntentMatcher  # noqa: E402
+from singleflight import SingleFlight  # noqa: E402
+from sync import SyncAuth  # noqa: E402
+from upstream_probe import UpstreamProber  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_chat_state(monkeypatch):
+    # Module-level caches and breakers must not leak between tests
+    for name in ('server', 'server_production'):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        monkeypatch.setattr(module, 'chat_cache', ResponseCache())
+        monkeypatch.setattr(module, 'llm_flights', SingleFlight())
+        monkeypatch.setattr(module, 'llm_admission', AdmissionController())
+        monkeypatch.setattr(module, 'llm_breaker', CircuitBreaker())
+        monkeypatch.setattr(module, 'intents', IntentMatcher())
+        monkeypatch.setattr(module, 'greetings', GreetingStore())
+        # Passive only: a background probe would show up as an extra call on the fake LLMs
+        monkeypatch.setattr(module, 'upstream', UpstreamProber(module._probe_upstream, interval=0))
+        if module.greeting_warmer is not None:
+            monkeypatch.setattr(module.greeting_warmer, 'store', module.greetings)
+        if module.app.state.rate_limiter is not None:
+            module.app.state.rate_limiter.reset()
+
+
+@pytest.fixture(autouse=True)
+def sync_auth(monkeypatch):
+    # Day sync is off without SYNC_SECRET; tests sign their user ids with this one
+    auth = SyncAuth('test-secret')
+    module = sys.modules.get('server')
+    if module is not None:
+        monkeypatch.setattr(module, 'sync_auth', auth)
+    return auth
+
+
+class BulkCollection:
+    """Counts bulk_write calls and applies the upserts one by one.
+
+    mongomock cannot take pymongo 4.9+ UpdateOne objects in bulk_write.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.bulk_sizes = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, ops, ordered=True):
+        self.bulk_sizes.append(len(ops))
+        for op in ops:
+            await self.collection.update_one(op._filter, op._doc, upsert=op._upsert)
+
+
+class BulkDatabase:
+    def __init__(self, db):
+        self.db = db
+        self.collections = {}
+
+    def __getattr__(self, name):
+        if name not in self.collections:
+            self.collections[name] = BulkCollection(getattr(self.db, name))
+        return self.collections[name]
+
+
+@pytest.fixture
+def bulk_mongo_db():
+    return BulkDatabase(AsyncMongoMockClient()['test_database'])
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server_production
+from admission import AdmissionController, CircuitBreaker, LLMUnavailable
+from fallback import keyword_reply
+from llm_stub import StubLLMClient
+
+# Not a routine intent, so it always goes upstream
+SLEEP_CHAT = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Wie schlafe ich besser?'}]}
+
+
+def test_admission_bounds_concurrency_and_queue():
+    async def scenario():
+        admission = AdmissionController(max_concurrency=2, max_queue=1)
+        release = asyncio.Event()
+        peak = 0
+
+        async def work():
+            nonlocal peak
+            async with admission.slot():
+                peak = max(peak, admission.active)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(work()) for _ in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(LLMUnavailable) as excinfo:
+            await admission.acquire()
+        release.set()
+        await asyncio.gather(*tasks)
+        return peak, excinfo.value.reason, admission.stats()
+
+    peak, reason, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert reason == 'queue_full'
+    assert stats['active'] == 0 and stats['queued'] == 0
+    assert stats['admitted'] == 3 and stats['rejected'] == 1
+
+
+def test_breaker_opens_and_recovers_after_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()  # single half-open probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_client_deadline_returns_fallback_and_cancels_upstream(monkeypatch):
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient(latency=5))
+    client = TestClient(server_production.app)
+
+    started = time.monotonic()
+    resp = client.post('/api/chat', json=SLEEP_CHAT, headers={'X-Client-Deadline-Ms': '700'})
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 1.5
+    assert resp.json() == {
+        'text': keyword_reply(SLEEP_CHAT['messages']),
+        'status': 'degraded',
+        'model_used': 'fallback',
+    }
+    assert client.get('/api/chat/flights').json()['in_flight'] == 0
+    assert client.get('/api/chat/admission').json()['admission']['active'] == 0
+
+
+def test_open_breaker_skips_upstream(monkeypatch):
+    llm = StubLLMClient(failure_rate=1.0)
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    monkeypatch.setattr(server_production, 'llm_breaker', CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    client = TestClient(server_production.app)
+
+    for _ in range(2):
+        assert client.post('/api/chat', json=SLEEP_CHAT).json()['text'] == server_production.LLM_ERROR_REPLY
+    resp = client.post('/api/chat', json=SLEEP_CHAT).json()
+
+    assert resp['status'] == 'degraded'
+    assert llm.calls == 2
+    assert client.get('/api/chat/admission').json()['breaker']['state'] == 'open'
+
+
+def test_coalesced_waiters_past_their_deadline_count_as_one_failure(monkeypatch):
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient(latency=5))
+    monkeypatch.setattr(server_production, 'llm_breaker', CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    messages = [{'role': 'user', 'content': 'Hallo'}]
+
+    async def burst():
+        deadline = time.monotonic() + 0.2
+        calls = [server_production._call_llm(messages, 'gpt-4o-mini', deadline) for _ in range(5)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    outcomes = asyncio.run(burst())
+    assert all(isinstance(o, LLMUnavailable) and o.reason == 'deadline' for o in outcomes)
+    assert server_production.llm_flights.stats()['upstream_calls'] == 1
+    assert server_production.llm_breaker.stats()['consecutive_failures'] == 1
+    assert server_production.llm_breaker.state == 'closed'
@@ -0,0 +1,62 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server_production
+from analytics import compute_analytics, ewma_last, rolling_mean, run_lengths, to_columns
+
+
+def _day(key, water=0, morning=False, evening=False, weight=None, sport=False):
+    return {
+        'date': key,
+        'pills': {'morning': morning, 'evening': evening},
+        'drinks': {'water': water, 'coffee': 1, 'sport': sport},
+        'weight': weight,
+    }
+
+
+def test_helpers_match_the_app_loops():
+    xs = np.array([70.0, 71.0, 69.5, 70.2])
+    ewma = xs[0]
+    for x in xs[1:]:
+        ewma = 0.3 * x + 0.7 * ewma
+    assert abs(ewma_last(xs) - ewma) < 1e-12
+
+    assert rolling_mean(np.array([1.0, 2.0, 3.0, 4.0]), 2).tolist() == [1.0, 1.5, 2.5, 3.5]
+    assert run_lengths(np.array([1, 1, 0, 1, 1, 1, 0, 1], dtype=bool)) == {'best': 3, 'current': 1}
+    assert run_lengths(np.zeros(3, dtype=bool)) == {'best': 0, 'current': 0}
+
+
+def test_compute_analytics_sorts_and_windows():
+    days = [
+        _day('2024-03-03', water=8, morning=True, evening=True, weight=70.0),
+        _day('2024-03-01', water=2, weight=71.0),
+        _day('2024-03-05', water=6, morning=True, evening=True, weight=69.0, sport=True),
+        _day('2024-03-02', water=4, morning=True),
+    ]
+    out = compute_analytics(to_columns(days), windows=(2, 30))
+
+    assert (out['first_date'], out['last_date']) == ('2024-03-01', '2024-03-05')
+    assert out['windows']['2']['water_avg'] == 7.0
+    assert out['windows']['30']['pill_adherence'] == 0.5
+    # Least squares over calendar days: (0, 71), (2, 70), (4, 69)
+    assert abs(out['weight']['trend_per_day'] + 0.5) < 1e-12
+    assert out['weight']['forecast_3d'] == 67.5
+    assert out['streaks'] == {'best_perfect': 2, 'current_perfect': 2}
+
+
+def test_analytics_endpoint_accepts_days_map():
+    days = {d['date']: d for d in (_day('2024-01-01', water=3), _day('2024-01-02', water=5))}
+    resp = TestClient(server_production.app).post('/api/analytics', json={'days': days, 'windows': [7], 'series': True})
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body['windows']['7']['water_avg'] == 4.0
+    assert body['series']['water_avg_7'] == [3.0, 4.0]
+    assert body['weight']['ewma'] is None
+
+
+def test_malformed_dates_are_rejected_before_numpy_sees_them():
+    client = TestClient(server_production.app)
+    for bad in ('2024-1-5', '05.01.2024', '2024-02-30', '２０２４-01-01'):
+        resp = client.post('/api/analytics', json={'days': [_day('2024-01-01'), _day(bad)]})
+        assert resp.status_code == 422, bad
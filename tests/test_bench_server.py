@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import bench_server  # noqa: E402
+import server  # noqa: E402
+import server_production  # noqa: E402
+
+
+def test_suite_runs_in_process_for_both_variants(monkeypatch):
+    # load_app injects the stub LLM client; let monkeypatch put the originals back
+    monkeypatch.setattr(server.llm, 'client', server.llm.client)
+    monkeypatch.setattr(server_production.llm, 'client', server_production.llm.client)
+    for variant in ('server', 'production'):
+        results = asyncio.run(bench_server.run_suite(variant, total=20, concurrency=4, llm_latency=0.001))
+        assert set(bench_server.SCENARIOS) <= set(results)
+        for scenario in bench_server.SCENARIOS:
+            assert results[scenario]['errors'] == 0
+            assert results[scenario]['p50_ms'] <= results[scenario]['p99_ms']
+        # 20 distinct chat prompts plus one shared greeting
+        assert results['_upstream_calls'] == 21
+    # The bench's rate limiter is passed in, not configured through the environment
+    assert 'RATE_LIMIT' not in os.environ and 'RATE_LIMIT_TRUSTED_PROXIES' not in os.environ
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {'server': {'chat': {'p95_ms': 10.0, 'throughput_rps': 100.0}}}
+    ok = {'server': {'chat': {'p95_ms': 11.0, 'throughput_rps': 90.0}, '_upstream_calls': 5}}
+    bad = {'server': {'chat': {'p95_ms': 13.0, 'throughput_rps': 70.0}}}
+
+    assert bench_server.compare(ok, baseline, tolerance=0.2) == []
+    assert len(bench_server.compare(bad, baseline, tolerance=0.2)) == 2
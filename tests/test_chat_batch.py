@@ -0,0 +1,58 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+import server_production
+
+
+class ScriptedLLM:
+    """Answers, fails or stalls depending on the last user message."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        content = messages[-1]['content']
+        if 'boom' in content:
+            raise RuntimeError('upstream exploded')
+        if 'slow' in content:
+            await asyncio.sleep(5)
+        message = SimpleNamespace(content=f'ok: {content}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _chat(content):
+    return {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': content}]}
+
+
+@pytest.mark.parametrize('module', [server, server_production], ids=['server', 'server_production'])
+def test_batch_reports_each_item_under_a_shared_deadline(module, monkeypatch):
+    llm = ScriptedLLM()
+    monkeypatch.setattr(module.llm, 'client', llm)
+    client = TestClient(module.app)
+    batch = {'requests': [_chat('Erzähl mir was'), _chat('Wie viel Wasser soll ich trinken?'), _chat('boom'), _chat('slow')]}
+
+    started = time.monotonic()
+    resp = client.post('/api/chat/batch', json=batch, headers={'X-Client-Deadline-Ms': '800'})
+    elapsed = time.monotonic() - started
+
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert elapsed < 2
+    assert [r['status'] for r in results] == ['success', 'success', 'error', 'degraded']
+    assert results[0]['text'] == 'ok: Erzähl mir was'
+    assert results[1]['model_used'] == 'intent'
+    assert results[3]['model_used'] == 'fallback'
+    assert llm.calls == 3  # the water question never went upstream
+
+
+def test_batch_size_is_bounded():
+    client = TestClient(server_production.app)
+    assert client.post('/api/chat/batch', json={'requests': []}).status_code == 422
+    too_many = {'requests': [_chat('hi')] * (server_production.CHAT_BATCH_MAX_ITEMS + 1)}
+    assert client.post('/api/chat/batch', json=too_many).status_code == 422
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server_production
+from chat_cache import ResponseCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLLM:
+    def __init__(self, text="Trink mehr Wasser!"):
+        self.calls = 0
+        self.text = text
+
+    async def chat_completion(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_key_is_independent_of_summary_key_order():
+    a = make_cache_key('greeting', 'de', 'gpt-4o-mini', {'water_avg14': 1.5, 'lang': 'de'})
+    b = make_cache_key('greeting', 'de', 'gpt-4o-mini', {'lang': 'de', 'water_avg14': 1.5})
+    c = make_cache_key('greeting', 'en', 'gpt-4o-mini', {'lang': 'de', 'water_avg14': 1.5})
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(max_entries=2, ttls={'greeting': 10, 'chat': 0}, clock=clock)
+    cache.set('a', 'A', 'greeting')
+    cache.set('b', 'B', 'greeting')
+    assert cache.get('a') == 'A'
+    cache.set('c', 'C', 'greeting')  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.evictions == 1
+
+    cache.set('x', 'X', 'chat')  # TTL 0 disables caching for the mode
+    assert cache.get('x') is None
+
+    clock.now = 11
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_repeat_greeting_is_served_from_cache(monkeypatch):
+    llm = CountingLLM()
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    client = TestClient(server_production.app)
+    body = {'mode': 'greeting', 'language': 'de', 'summary': {'water_avg14': 2.1, 'pill_adherence7': 86}}
+
+    first = client.post('/api/chat', json=body).json()
+    second = client.post('/api/chat', json={**body, 'summary': {'pill_adherence7': 86, 'water_avg14': 2.1}}).json()
+
+    assert first['text'] == second['text'] == llm.text
+    assert llm.calls == 1
+    assert client.get('/api/chat/cache').json()['hits'] == 1
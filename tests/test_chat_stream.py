@@ -0,0 +1,43 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import server_production
+from llm_stub import StubLLMClient
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_sends_tokens_then_done(monkeypatch):
+    llm = StubLLMClient(text="Trink ein Glas Wasser.")
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    client = TestClient(server_production.app)
+    body = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Schlaf?'}]}
+
+    resp = client.post('/api/chat/stream', json=body)
+    assert resp.headers['content-type'].startswith('text/event-stream')
+    events = _events(resp.text)
+
+    tokens = [data['text'] for name, data in events if name == 'token']
+    assert len(tokens) == 4
+    assert ''.join(tokens) == llm.text
+    assert events[-1] == ('done', {'status': 'success', 'model_used': 'gpt-4o-mini'})
+
+    # The assembled stream is cached for the non-streaming endpoint as well
+    assert client.post('/api/chat', json=body).json()['text'] == llm.text
+    assert llm.calls == 1
+
+
+def test_stream_failure_ends_with_error_event(monkeypatch):
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient(failure_rate=1.0))
+    client = TestClient(server_production.app)
+
+    events = _events(client.post('/api/chat/stream', json={'mode': 'greeting'}).text)
+    assert events[0] == ('token', {'text': server_production.LLM_ERROR_REPLY})
+    assert events[-1] == ('done', {'status': 'error', 'model_used': 'fallback'})
@@ -0,0 +1,79 @@
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app_factory
+import server
+from llm_loader import LazyLLMClient
+from llm_stub import StubLLMClient
+from storage import MemoryStorage
+
+# Cold-start budget for importing a server module in a fresh interpreter.
+# FastAPI + pydantic alone load ~260 modules; numpy, motor/pymongo or the
+# LLM SDKs would each add 100+.
+IMPORT_BUDGET_S = 3.0
+MODULE_BUDGET = 330
+LAZY_MODULES = ('emergentintegrations', 'motor', 'pymongo', 'numpy')
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+
+PROBE = """
+import json, sys, time
+before = set(sys.modules)
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "modules": len(set(sys.modules) - before),
+    "heavy": [m for m in {lazy!r} if m in sys.modules],
+}}))
+"""
+
+
+@pytest.mark.parametrize('module', ['server', 'server_production'])
+def test_import_stays_within_budget(module):
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(out.splitlines()[-1])
+    assert result['heavy'] == []
+    assert result['modules'] <= MODULE_BUDGET
+    assert result['seconds'] <= IMPORT_BUDGET_S
+
+
+def test_llm_client_loads_on_first_use_or_prewarm(monkeypatch):
+    calls = []
+    lazy = LazyLLMClient(loader=lambda: calls.append(1) or StubLLMClient())
+    assert not lazy.loaded and calls == []
+    assert lazy.client is lazy.client
+    assert calls == [1] and lazy.stats()['loaded']
+
+    missing = LazyLLMClient(loader=lambda: __import__('no_such_llm_sdk'), module='no_such_llm_sdk')
+    assert missing.available() is False
+    assert missing.client is None
+
+    prewarmed = LazyLLMClient(loader=StubLLMClient)
+    monkeypatch.setattr(server, 'llm', prewarmed)
+    with TestClient(server.create_app(storage=MemoryStorage(10), prewarm_llm=True)) as client:
+        assert client.get('/api/').status_code == 200
+        # The import runs in a worker thread; give it a moment
+        for _ in range(200):
+            if prewarmed.loaded:
+                break
+            time.sleep(0.01)
+    assert prewarmed.loaded
+
+
+def test_factory_runs_the_mongo_variant_in_memory():
+    app = app_factory.create_app('server', storage=MemoryStorage(10))
+    with TestClient(app) as client:
+        client.post('/api/status', json={'client_name': 'no-mongo'})
+        assert [d['client_name'] for d in client.get('/api/status').json()] == ['no-mongo']
+        assert client.get('/api/status/writes').json()['backend'] == 'memory'
+    with pytest.raises(ValueError):
+        app_factory.create_app('staging')
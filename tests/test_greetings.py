@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server_production
+from greetings import GreetingStore, GreetingWarmer, bucket_summary
+from storage import MemoryStorage
+
+SUMMARY = {
+    'lang': 'de', 'water_avg14': 6.4, 'coffee_avg14': 2.0, 'pill_adherence7': 86, 'weight_last': 71.3,
+    'weight_trend_per_day': -0.08, 'weekly_event': {'id': 'hydrate', 'title': 'Trink-Woche', 'progress': 40},
+}
+# Different numbers, same buckets
+SIMILAR = {**SUMMARY, 'water_avg14': 7.9, 'pill_adherence7': 95, 'weight_last': 64.0}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def chat_completion(self, messages, **kwargs):
+        self.prompts.append(messages)
+        message = SimpleNamespace(content=f'Hallo #{len(self.prompts)}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_buckets_drop_exact_numbers():
+    assert bucket_summary(SUMMARY) == {
+        'water_avg14': '6-8', 'coffee_avg14': '1-3', 'pill_adherence7': '85-99%', 'weight_trend_per_day': 'falling',
+        'weekly_event': {'title': 'Trink-Woche', 'progress': '<50%'},
+    }
+    assert bucket_summary(SIMILAR) == bucket_summary(SUMMARY)
+    assert bucket_summary({'pill_adherence7': 100})['pill_adherence7'] == '100%'
+    assert bucket_summary(None) == {}
+
+
+def test_store_serves_stale_entries_and_ranks_what_to_warm():
+    clock = FakeClock()
+    store = GreetingStore(max_entries=2, fresh_for=10, max_age=20, clock=clock)
+    for _ in range(3):
+        assert store.lookup('de', 'm', SUMMARY) is None
+    store.lookup('en', 'm', SUMMARY)
+    due = store.due(limit=5)
+    assert [(lang, bucket) for _, lang, _, bucket in due] == [('de', bucket_summary(SUMMARY)), ('en', bucket_summary(SUMMARY))]
+
+    store.put(due[0][0], 'Hallo!')
+    assert store.lookup('de', 'm', SIMILAR) == 'Hallo!'
+    assert [lang for _, lang, _, _ in store.due(5)] == ['en']
+
+    clock.now = 15  # stale: still served, and due again
+    assert store.lookup('de', 'm', SUMMARY) == 'Hallo!'
+    assert [lang for _, lang, _, _ in store.due(5)] == ['de', 'en']
+    clock.now = 40  # past max_age
+    assert store.lookup('de', 'm', SUMMARY) is None
+    assert store.stats()['stale_hits'] == 1
+
+
+def test_warmer_yields_to_users_and_respects_off_peak_hours():
+    store = GreetingStore()
+    for lang in ('de', 'en', 'pl'):
+        store.lookup(lang, 'm', SUMMARY)
+    idle = iter([True, False])
+
+    async def generate(language, model, summary):
+        return f'{language}: {summary["water_avg14"]}'
+
+    warmer = GreetingWarmer(store, generate, is_idle=lambda: next(idle, False))
+    assert asyncio.run(warmer.warm_once()) == 1
+    assert store.lookup('de', 'm', SUMMARY) == 'de: 6-8'
+
+    night = GreetingWarmer(store, generate, off_peak_hours=(22, 6), now=lambda: datetime(2024, 1, 1, 3))
+    assert night.off_peak()
+    night._now = lambda: datetime(2024, 1, 1, 12)
+    assert not night.off_peak()
+
+
+def test_lifespan_warmer_makes_greetings_instant(monkeypatch):
+    llm = CountingLLM()
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    monkeypatch.setattr(server_production.greeting_warmer, 'interval', 0.01)
+    body = {'mode': 'greeting', 'language': 'de', 'summary': SUMMARY}
+
+    with TestClient(server_production.create_app(storage=MemoryStorage(10))) as client:
+        first = client.post('/api/chat', json=body).json()
+        assert first['text'] == 'Hallo #1'  # miss: answered from the user's own summary
+
+        deadline = time.monotonic() + 2
+        while client.get('/api/chat/greetings').json()['store']['generated'] < 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        # The warm-up prompt only saw bucket labels
+        warm_prompt = ' '.join(m['content'] for m in llm.prompts[1])
+        assert '6-8' in warm_prompt and '71.3' not in warm_prompt
+
+        second = client.post('/api/chat', json={**body, 'summary': SIMILAR}).json()
+        assert second == {'text': 'Hallo #2', 'status': 'success', 'model_used': 'gpt-4o-mini'}
+        assert len(llm.prompts) == 2
+        assert 'greetings_hits_total 1' in client.get('/api/metrics').text
@@ -0,0 +1,77 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from history_io import NdjsonError, ndjson_records
+from storage import MemoryStorage, MongoStorage
+
+
+@pytest.fixture(params=['mongo', 'memory'])
+def sync_client(request, bulk_mongo_db, monkeypatch, sync_auth):
+    monkeypatch.setattr(server, 'SYNC_EXPORT_BATCH', 2)
+    monkeypatch.setattr(server, 'SYNC_IMPORT_BATCH', 2)
+    if request.param == 'mongo':
+        db, storage = bulk_mongo_db, MongoStorage(db=bulk_mongo_db)
+    else:
+        db, storage = None, MemoryStorage(10)
+    with TestClient(server.create_app(storage=storage), headers={'X-Sync-Token': sync_auth.token('u1')}) as client:
+        yield client, db
+
+
+def _change(i):
+    date = f'2024-02-0{i}'
+    return {'date': date, 'day': {'date': date, 'drinks': {'water': i, 'coffee': 1}}, 'cycleLog': {'mood': i}}
+
+
+def test_export_streams_ndjson_and_import_restores_it(sync_client):
+    client, db = sync_client
+    client.post('/api/sync/u1', json={'changes': [_change(i) for i in range(1, 6)]})
+
+    plain = client.get('/api/sync/u1/export', headers={'Accept-Encoding': 'identity'})
+    assert plain.headers['content-type'].startswith('application/x-ndjson')
+    assert 'content-encoding' not in plain.headers
+    records = [json.loads(line) for line in plain.text.splitlines()]
+    assert [(r['date'], r['rev']) for r in records] == [(f'2024-02-0{i}', i) for i in range(1, 6)]
+
+    compressed = client.get('/api/sync/u1/export', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.text == plain.text  # httpx inflates transparently
+
+    # Restore into another user from a gzipped upload, split at arbitrary byte offsets
+    body = gzip.compress(plain.content)
+    parts = (body[i:i + 7] for i in range(0, len(body), 7))
+    u2 = {'X-Sync-Token': server.sync_auth.token('u2')}
+    resp = client.post('/api/sync/u2/import', content=parts, headers={**u2, 'Content-Encoding': 'gzip'})
+    assert resp.json() == {'imported': 5, 'batches': 3, 'rev': 5}
+    if db is not None:
+        assert db.days.bulk_sizes[-3:] == [2, 2, 1]
+    assert client.get('/api/sync/u2/export', headers={**u2, 'Accept-Encoding': 'identity'}).text == plain.text
+    assert client.get('/api/rollups/u2', params={'period': 'month'}, headers=u2).json()['total']['days'] == 5
+
+
+def test_bad_line_reports_its_number_and_what_was_written(sync_client):
+    client, _ = sync_client
+    lines = [json.dumps(_change(i)) for i in range(1, 4)] + ['{"date": "2024-02-04", "cycle": {"start": "2024-02-05"}}']
+    resp = client.post('/api/sync/u1/import', content='\n'.join(lines))
+    assert resp.status_code == 422
+    assert resp.json()['detail']['line'] == 4 and resp.json()['detail']['imported'] == 2
+
+    assert client.post('/api/sync/u1/import', content='{"date": ', headers={}).json()['detail']['line'] == 1
+    assert client.post('/api/sync/u1/import', content=b'x', headers={'Content-Encoding': 'br'}).status_code == 415
+
+
+def test_records_split_across_chunks_and_without_trailing_newline():
+    async def chunks():
+        for part in (b'{"a": 1}\n{"a"', b': 2}\n\n', b'{"a": 3}'):
+            yield part
+
+    async def collect(stream):
+        return [item async for item in stream]
+
+    assert asyncio.run(collect(ndjson_records(chunks()))) == [(1, {'a': 1}), (2, {'a': 2}), (4, {'a': 3})]
+    with pytest.raises(NdjsonError):
+        asyncio.run(collect(ndjson_records(chunks(), gzip=True)))
@@ -0,0 +1,89 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server_production
+from fallback import keyword_reply
+from intents import IntentMatcher
+from llm_stub import StubLLMClient
+
+
+@pytest.mark.parametrize('text, intent, routine', [
+    ('Wie viel Wasser soll ich trinken?', 'water', True),
+    ('Hab ich heute meine Tabletten genommen?', 'pills', False),
+    ('How is my weight trending?', 'weight', False),
+    ('Any quick workout ideas?', 'sport', True),
+    ('Kiedy zacznie się mój okres?', 'cycle', False),
+    ('Ile wody powinnam pić?', 'water', True),
+])
+def test_matches_keywords_in_all_languages(text, intent, routine):
+    matcher = IntentMatcher()
+    match = matcher.match(text)
+    assert match.intent == intent
+    assert match.confidence == 1.0
+    assert matcher.routine_intent(text) == (intent if routine else None)
+
+
+def test_mixed_or_long_messages_are_left_to_the_llm():
+    matcher = IntentMatcher(threshold=0.75)
+    assert matcher.match('Hallo, wie geht es dir?') is None
+    assert matcher.match('Soll ich vor dem Sport Wasser trinken?').confidence < 0.75
+    long = 'Ich habe eine Frage zu meinem Training, ' + 'und außerdem noch vieles mehr ' * 5
+    assert matcher.match(long).confidence < 0.75
+    # Whole-word keywords do not fire inside other words
+    assert matcher.match('Mein Lekarz sagt, rund um die Uhr') is None
+
+    assert matcher.answer('Soll ich vor dem Sport Wasser trinken?', 'de') is None
+    assert matcher.stats()['low_confidence'] == 1
+
+
+@pytest.mark.parametrize('text', [
+    'Wasser?',
+    'Mein Wasser schmeckt komisch, ist das gefährlich?',
+    'Kein Schlaf-Tipp, sondern ein Trainingsplan bitte',
+    'Hab ich heute meine Tabletten nicht genommen?',
+    "I don't want to drink water, why?",
+    'Is it bad to skip my pills once?',
+    'Nie chcę pić wody',
+    # About the user's own data: the template would not answer them
+    'Did I take my pills today?',
+    'How much did I drink today?',
+    'When does my next period start?',
+    'Wie ist mein Gewicht?',
+])
+def test_keyword_mentions_that_are_not_routine_questions_go_to_the_llm(text):
+    matcher = IntentMatcher()
+    assert matcher.match(text) is not None  # the fallback still has a topical guess
+    assert matcher.answer(text, 'de') is None
+    assert matcher.stats()['answered_total'] == 0
+
+
+def test_routine_questions_tolerate_case_spacing_and_punctuation():
+    matcher = IntentMatcher()
+    assert matcher.routine_intent('  wie VIEL Wasser   soll ich am Tag trinken ?! ') == 'water'
+    assert matcher.routine_intent('Wie viel Wasser soll ich trinken, wenn ich krank bin?') is None
+    assert matcher.answer('How much water should I drink per day?', 'en').startswith('Drink enough water!')
+
+
+def test_replies_are_localized_and_use_the_summary():
+    msgs = [{'role': 'user', 'content': 'How much water?'}]
+    assert keyword_reply(msgs, 'en').startswith('Drink enough water!')
+    assert keyword_reply(msgs, 'en', {'water_avg14': 5.54}).endswith("averaged 5.5 glasses a day.")
+    assert keyword_reply([{'role': 'user', 'content': 'Tabletten?'}]).startswith('Vergiss nicht')
+    assert keyword_reply([], 'pl').startswith('Chętnie')
+
+
+def test_chat_answers_routine_questions_without_upstream(monkeypatch):
+    llm = StubLLMClient()
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    client = TestClient(server_production.app)
+
+    body = {'mode': 'chat', 'language': 'en', 'messages': [{'role': 'user', 'content': 'How much water should I drink?'}]}
+    resp = client.post('/api/chat', json=body).json()
+    assert resp['model_used'] == 'intent'
+    assert resp['text'].startswith('Drink enough water!')
+
+    client.post('/api/chat', json={**body, 'messages': [{'role': 'user', 'content': 'Tell me a joke'}]})
+    assert llm.calls == 1
+
+    assert client.get('/api/chat/intents').json()['answered'] == {'water': 1}
+    assert 'chat_intent_answers_total{intent="water"} 1' in client.get('/api/metrics').text
@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+
+import server_production
+from llm_stub import StubLLMClient
+from metrics import Counter, Histogram
+
+
+def _sample(text, prefix):
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram('demo_seconds', 'Demo.', ('route',), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v, '/x')
+    out = []
+    h.render(out)
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 2' in out
+    assert 'demo_seconds_bucket{route="/x",le="1.0"} 3' in out
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in out
+    assert 'demo_seconds_count{route="/x"} 4' in out
+
+    c = Counter('demo_total', 'Demo.', ('reason',))
+    c.inc('a "quoted"\nvalue')
+    out = []
+    c.render(out)
+    assert out[-1] == 'demo_total{reason="a \\"quoted\\"\\nvalue"} 1'
+
+
+def test_metrics_endpoint_reports_routes_llm_and_fallbacks(monkeypatch):
+    client = TestClient(server_production.app)
+    route_count = 'http_request_duration_seconds_count{method="POST",route="/api/chat",status="200"}'
+    before = _sample(client.get('/api/metrics').text, route_count) or 0
+
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient())
+    client.post('/api/chat', json={'mode': 'greeting', 'language': 'en'})
+    monkeypatch.setattr(server_production.llm, 'client', None)
+    client.post('/api/chat', json={'mode': 'chat', 'messages': [{'role': 'user', 'content': 'hi'}]})
+
+    resp = client.get('/api/metrics')
+    assert resp.headers['content-type'].startswith('text/plain; version=0.0.4')
+    body = resp.text
+    assert _sample(body, route_count) == before + 2
+    assert _sample(body, 'llm_request_duration_seconds_count{model="gpt-4o-mini",language="en",outcome="ok"}') >= 1
+    assert _sample(body, 'llm_prompt_tokens_count{model="gpt-4o-mini"}') >= 1
+    assert _sample(body, 'chat_fallback_total{reason="no_client"}') >= 1
+    assert _sample(body, 'chat_cache_misses_total') >= 1
+    assert 'llm_breaker_open 0' in body
+
+
+def test_unknown_models_share_one_label(monkeypatch):
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient())
+    client = TestClient(server_production.app)
+    for i in range(3):
+        client.post('/api/chat', json={'model': f'made-up-{i}', 'messages': [{'role': 'user', 'content': f'hi {i}'}]})
+
+    body = client.get('/api/metrics').text
+    assert 'made-up' not in body
+    assert _sample(body, 'llm_prompt_tokens_count{model="other"}') == 3
@@ -0,0 +1,79 @@
+import time
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server_production
+from profiling import Profiler, ProfilingMiddleware, span
+from storage import MemoryStorage
+
+TOKEN = {'X-Profile-Token': 'secret'}
+CHAT = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Erzähl mir was'}]}
+
+
+class QuickLLM:
+    async def chat_completion(self, messages, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='ok'))])
+
+
+def burn_cpu(seconds):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def test_off_by_default_with_no_middleware_and_no_op_spans():
+    app = server_production.create_app(storage=MemoryStorage(10))
+    assert not any(m.cls is ProfilingMiddleware for m in app.user_middleware)
+    assert span('prompt') is span('llm')  # one shared no-op context manager
+    assert TestClient(app).get('/api/admin/profiles', headers=TOKEN).status_code == 404
+
+
+def test_profiled_request_records_stages_and_stacks(monkeypatch):
+    monkeypatch.setenv('PROFILE_TOKEN', 'secret')
+    monkeypatch.setenv('PROFILE_INTERVAL_MS', '1')
+    monkeypatch.setattr(server_production.llm, 'client', QuickLLM())
+    build = server_production.prompts.build
+
+    def slow_build(*args):
+        burn_cpu(0.1)
+        return build(*args)
+
+    monkeypatch.setattr(server_production.prompts, 'build', slow_build)
+    client = TestClient(server_production.create_app(storage=MemoryStorage(10)))
+
+    assert 'X-Profile-Id' not in client.post('/api/chat', json=CHAT).headers
+    assert 'X-Profile-Id' not in client.post('/api/chat', json=CHAT, headers={'X-Profile-Token': 'nope'}).headers
+    fresh = {**CHAT, 'messages': [{'role': 'user', 'content': 'Noch eine Idee?'}]}  # not cached yet
+    resp = client.post('/api/chat', json=fresh, headers=TOKEN)
+    profile_id = resp.headers['X-Profile-Id']
+
+    assert client.get('/api/admin/profiles', headers={'X-Profile-Token': 'nope'}).status_code == 403
+    listing = client.get('/api/admin/profiles', headers=TOKEN).json()
+    assert [p['id'] for p in listing['items']] == [int(profile_id)]
+    stages = listing['items'][0]['stages_ms']
+    assert {'chat', 'chat.prompt', 'chat.cache', 'chat.llm', 'chat.llm.upstream',
+            'request.read_body', 'request.validate', 'response.serialize'} <= set(stages)
+    assert stages['chat.prompt'] >= 100
+
+    spans = client.get(f'/api/admin/profiles/{profile_id}', params={'format': 'spans'}, headers=TOKEN).text
+    assert 'POST /api/chat;chat;prompt ' in spans
+    samples = client.get(f'/api/admin/profiles/{profile_id}', params={'format': 'collapsed'}, headers=TOKEN).text
+    assert 'test_profiling.py:burn_cpu' in samples
+    assert all(line.startswith('POST /api/chat;') for line in samples.splitlines())
+
+    merged = client.get('/api/admin/profiles/collapsed', params={'kind': 'samples'}, headers=TOKEN).text
+    assert merged.splitlines() == samples.splitlines()
+
+
+def test_sampling_rate_and_ring_buffer():
+    draws = iter([0.05, 0.5, 0.01])
+    profiler = Profiler(sample_rate=0.1, ring_size=2, rng=lambda: next(draws))
+    assert [profiler.reason([]) for _ in range(3)] == ['sampled', None, 'sampled']
+
+    for i in range(3):
+        profile = profiler.start('GET', f'/api/{i}', 'sampled')
+        profile.finish()
+        profiler.profiles.append(profile)
+    assert [p.path for p in profiler.profiles] == ['/api/1', '/api/2']
+    assert profiler.get(1) is None
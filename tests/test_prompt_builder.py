@@ -0,0 +1,67 @@
+from fastapi.testclient import TestClient
+
+import server_production
+from llm_stub import StubLLMClient
+from prompt_builder import PromptBuilder, compact_summary
+
+SUMMARY = {
+    'lang': 'de',
+    'water_avg14': 5.5371,
+    'coffee_avg14': 2.0,
+    'pill_adherence7': 86,
+    'weight_last': None,
+    'weight_trend_per_day': -0.05321,
+    'weekly_event': {'id': 'hydration', 'title': 'Hydration week', 'progress': 40},
+}
+
+
+def _builder(budget=200):
+    return PromptBuilder({'de': 'Du bist Gugi.', 'en': 'You are Gugi.'}, {'de': 'Tipp?', 'en': 'Tip?'}, default_budget=budget)
+
+
+def test_summary_uses_short_keys_and_rounded_numbers():
+    text = compact_summary(SUMMARY)
+    assert text == '{"water14d":5.537,"coffee14d":2,"pills7d%":86,"kg/day":-0.053,"event":{"title":"Hydration week","%":40}}'
+    assert len(text) < len(str(SUMMARY)) / 2
+    # Fixed decimals, not significant digits
+    assert compact_summary({'weight_last': 105.3, 'steps': 1234.5}) == '{"kg":105.3,"steps":1234.5}'
+
+
+def test_history_is_trimmed_to_the_token_budget():
+    builder = _builder(budget=120)
+    history = [{'role': 'user', 'content': f'{i} ' + 'x' * 80} for i in range(20)]
+
+    prompt = builder.build('chat', 'de', 'gpt-4o-mini', SUMMARY, history)
+    assert prompt.tokens <= 120
+    assert prompt.history == history[-len(prompt.history):]
+    assert prompt.trimmed == 20 - len(prompt.history) > 0
+    assert prompt.messages[0] == {'role': 'system', 'content': 'Du bist Gugi.'}
+
+    # A single oversized message is cut to fit rather than dropped
+    huge = [{'role': 'user', 'content': 'a' * 5000 + ' Frage?'}]
+    prompt = builder.build('chat', 'de', 'gpt-4o-mini', None, huge)
+    assert prompt.messages[-1]['content'].endswith('Frage?')
+    assert prompt.tokens <= 120
+
+
+def test_chat_reports_prompt_tokens(monkeypatch):
+    monkeypatch.setattr(server_production.llm, 'client', StubLLMClient())
+    client = TestClient(server_production.app)
+    resp = client.post('/api/chat', json={'mode': 'greeting', 'language': 'en', 'summary': SUMMARY})
+    assert int(resp.headers['X-Prompt-Tokens']) > 0
+
+
+def test_a_large_summary_does_not_crowd_out_the_question():
+    builder = _builder(budget=400)
+    summary = {**SUMMARY, 'notes': ['n' * 80] * 50, 'last': 1}
+    question = 'Was soll ich heute essen, damit ich genug Eiweiß bekomme? ' * 3
+    prompt = builder.build('chat', 'de', 'gpt-4o-mini', summary, [{'role': 'user', 'content': question}])
+
+    context = prompt.messages[1]['content']
+    assert len(context) // 4 <= 100
+    assert '"water14d":5.537' in context and 'notes' not in context
+    assert prompt.messages[-1]['content'] == question
+
+    # Even when the budget is exhausted, the question keeps a usable tail
+    tiny = _builder(budget=10).build('chat', 'de', 'gpt-4o-mini', summary, [{'role': 'user', 'content': 'x' * 1000}])
+    assert len(tiny.messages[-1]['content']) >= 200
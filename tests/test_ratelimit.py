@@ -0,0 +1,111 @@
+from fastapi.testclient import TestClient
+
+import server_production
+from ratelimit import Budget, RateLimiter, TrustedProxies, client_key, rate_limiter_from_env
+from storage import MemoryStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_and_reports_the_wait():
+    clock = FakeClock()
+    limiter = RateLimiter({'chat': Budget(3, 1.0)}, clock=clock)
+    assert [limiter.acquire('chat', 'a') for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('chat', 'a') == 1.0
+    assert limiter.acquire('chat', 'b') == 0  # other clients are unaffected
+
+    clock.now = 0.5
+    assert limiter.acquire('chat', 'a') == 0.5
+    clock.now = 1.0
+    assert limiter.acquire('chat', 'a') == 0
+    assert limiter.stats()['rejected'] == {'chat': 2}
+
+
+def test_idle_buckets_are_evicted_and_the_table_is_bounded():
+    clock = FakeClock()
+    limiter = RateLimiter({'chat': Budget(2, 1.0)}, max_clients=3, clock=clock)
+    for client in 'abcd':
+        limiter.acquire('chat', client)
+    assert limiter.stats()['budgets']['chat']['clients'] == 3  # 'a' made room for 'd'
+
+    clock.now = 5  # every bucket has refilled: evicting them loses nothing
+    limiter.acquire('chat', 'e')
+    assert limiter.stats()['budgets']['chat']['clients'] == 1
+    assert limiter.stats()['evictions'] == 4
+
+
+def test_middleware_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT', '1')
+    monkeypatch.setenv('RATE_LIMIT_CHAT', '2/60')
+    client = TestClient(server_production.create_app(storage=MemoryStorage(10)))
+    body = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Wasser?'}]}
+
+    assert [client.post('/api/chat', json=body).status_code for _ in range(2)] == [200, 200]
+    limited = client.post('/api/chat', json=body, headers={'Origin': 'http://app'})
+    assert limited.status_code == 429
+    assert limited.headers['Retry-After'] == '30'
+    assert 'Retry-After' in limited.headers['Access-Control-Expose-Headers']
+
+    # Separate budget and unlimited routes still pass; a made-up header buys no new bucket
+    assert client.post('/api/status', json={'client_name': 'x'}).status_code == 200
+    assert client.post('/api/chat', json=body, headers={'X-Client-Id': 'phone-2'}).status_code == 429
+    assert client.get('/api/health').status_code == 200
+    assert 'http_rate_limited_total{budget="chat"} 2' in client.get('/api/metrics').text
+
+
+def test_clients_behind_a_trusted_proxy_get_their_own_buckets(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT', '1')
+    monkeypatch.setenv('RATE_LIMIT_CHAT', '1/60')
+    monkeypatch.setenv('RATE_LIMIT_TRUSTED_PROXIES', 'testclient, 10.0.0.0/8')
+    client = TestClient(server_production.create_app(storage=MemoryStorage(10)))
+    body = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Wasser?'}]}
+
+    def chat(forwarded_for):
+        return client.post('/api/chat', json=body, headers={'X-Forwarded-For': forwarded_for}).status_code
+
+    assert chat('203.0.113.7') == 200
+    assert chat('198.51.100.2, 10.1.2.3') == 200  # second proxy hop is skipped
+    assert chat('203.0.113.7') == 429
+    # Entries left of the proxy's own are written by the client and change nothing
+    assert chat('192.0.2.99, 203.0.113.7') == 429
+
+
+def test_forwarded_for_is_ignored_unless_the_peer_is_a_trusted_proxy():
+    scope = {'client': ('198.51.100.5', 4242), 'headers': [(b'x-forwarded-for', b'203.0.113.7')]}
+    assert client_key(scope) == '198.51.100.5'
+    assert client_key(scope, TrustedProxies(['10.0.0.0/8'])) == '198.51.100.5'
+    assert client_key(scope, TrustedProxies(['198.51.100.0/24'])) == '203.0.113.7'
+
+
+def test_a_batch_costs_one_chat_token_per_item(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT', '1')
+    monkeypatch.setenv('RATE_LIMIT_CHAT', '10/60')
+    app = server_production.create_app(storage=MemoryStorage(10))
+    client = TestClient(app)
+    item = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Wasser?'}]}
+
+    assert client.post('/api/chat/batch', json={'requests': [item] * 8}).status_code == 200
+    limited = client.post('/api/chat/batch', json={'requests': [item] * 3})
+    assert limited.status_code == 429
+    assert limited.headers['Retry-After'] == '6'  # one token short at 10 per minute
+    assert client.post('/api/chat', json=item).status_code == 200  # the rejected batch took one token
+    assert client.post('/api/chat', json=item).status_code == 429
+    assert app.state.rate_limiter.stats()['rejected']['chat'] == 2
+
+
+def test_budgets_are_divided_between_workers(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT', '1')
+    monkeypatch.setenv('RATE_LIMIT_CHAT', '20/60')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    budgets = rate_limiter_from_env().budgets
+    assert budgets['chat'] == Budget(5, 5 / 60)
+    assert budgets['status'] == Budget(30, 0.5)
+
+    monkeypatch.setenv('WEB_CONCURRENCY', '64')
+    assert rate_limiter_from_env().budgets['chat'].burst == 1
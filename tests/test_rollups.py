@@ -0,0 +1,125 @@
+import asyncio
+import random
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from analytics import compute_analytics, to_columns
+from rollups import build_rollups, period_slots, summarize
+from storage import MemoryStorage, MongoStorage
+from sync import MongoSyncStore
+
+
+@pytest.fixture(params=['mongo', 'memory'])
+def client(request, bulk_mongo_db, sync_auth):
+    storage = MongoStorage(db=bulk_mongo_db) if request.param == 'mongo' else MemoryStorage(10)
+    with TestClient(server.create_app(storage=storage), headers={'X-Sync-Token': sync_auth.token('u1')}) as client:
+        yield client
+
+
+def _random_day(rng, key):
+    day = {
+        'date': key,
+        'pills': {'morning': rng.random() < 0.9, 'evening': rng.random() < 0.8},
+        'drinks': {'water': rng.randint(3, 9), 'coffee': rng.randint(0, 5), 'sport': rng.random() < 0.3},
+    }
+    if rng.random() < 0.7:
+        day['weight'] = round(rng.uniform(60, 75), 1)
+    return day
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rounded(v) for v in value]
+    return value
+
+
+def test_incremental_rollups_match_a_rebuild(client):
+    rng = random.Random(7)
+    # Spans an ISO year boundary (2020-W53) and a leap day
+    keys = [(date(2020, 2, 1) + timedelta(days=i)).isoformat() for i in range(420)]
+    latest = {}
+    for _ in range(6):
+        changes = []
+        for key in rng.sample(keys, 150):
+            day = _random_day(rng, key) if rng.random() < 0.9 else None
+            changes.append({'date': key, 'day': day})
+            latest[key] = day
+        # The same date twice in one push: the second version wins
+        changes.append({'date': changes[0]['date'], 'day': _random_day(rng, changes[0]['date'])})
+        latest[changes[0]['date']] = changes[-1]['day']
+        assert client.post('/api/sync/u1', json={'changes': changes}).status_code == 200
+
+    incremental = {p: client.get('/api/rollups/u1', params={'period': p}).json() for p in ('week', 'month')}
+    assert client.post('/api/rollups/u1/rebuild').json()['rollups'] > 0
+    rebuilt = {p: client.get('/api/rollups/u1', params={'period': p}).json() for p in ('week', 'month')}
+    assert _rounded(incremental) == _rounded(rebuilt)
+
+    # Totals agree with the full scan over the raw days
+    days = [d for d in latest.values() if d is not None]
+    full = compute_analytics(to_columns(days), windows=[len(days)])
+    for period in ('week', 'month'):
+        total = incremental[period]['total']
+        assert total['days'] == len(days)
+        assert total['water_avg'] == pytest.approx(full['windows'][str(len(days))]['water_avg'])
+        assert total['compliance_rate'] == pytest.approx(full['compliance_rate'])
+        assert total['weight_trend_per_day'] == pytest.approx(full['weight']['trend_per_day'])
+        assert total['best_perfect'] == full['streaks']['best_perfect']
+        assert total['current_perfect'] == full['streaks']['current_perfect']
+
+
+def test_concurrent_pushes_for_one_day_do_not_drift(bulk_mongo_db):
+    store = MongoSyncStore(lambda: bulk_mongo_db)
+    days = bulk_mongo_db.days
+    bulk_write, gate, stalled = days.bulk_write, asyncio.Event(), []
+
+    async def first_write_stalls(ops, ordered=True):
+        if not stalled:
+            stalled.append(ops)
+            await gate.wait()
+        await bulk_write(ops, ordered)
+
+    days.bulk_write = first_write_stalls
+    day = {'date': '2024-03-01', 'pills': {'morning': True, 'evening': True}, 'drinks': {'water': 4}}
+
+    async def run():
+        first = asyncio.create_task(store.push('u1', [('2024-03-01', {'day': day})]))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(store.push('u1', [('2024-03-01', {'day': {**day, 'drinks': {'water': 8}}})]))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(first, second)
+        incremental = await store.rollups.periods('u1', 'month')
+        await store.rollups.rebuild('u1')
+        return incremental, await store.rollups.periods('u1', 'month')
+
+    incremental, rebuilt = asyncio.run(run())
+    assert summarize(incremental)['total']['days'] == 1
+    assert _rounded(summarize(incremental)) == _rounded(summarize(rebuilt))
+
+
+def test_range_queries_and_streaks_across_periods(client):
+    perfect = {'pills': {'morning': True, 'evening': True}, 'drinks': {'water': 6}, 'weight': 70}
+    # Sun 2024-01-28 .. Fri 2024-02-02: crosses both a week and a month boundary
+    keys = [(date(2024, 1, 28) + timedelta(days=i)).isoformat() for i in range(6)]
+    changes = [{'date': k, 'day': {'date': k, **perfect}} for k in keys]
+    changes[-1]['day']['drinks'] = {'water': 2}
+    client.post('/api/sync/u1', json={'changes': changes})
+
+    months = client.get('/api/rollups/u1', params={'period': 'month'}).json()
+    assert [p['key'] for p in months['periods']] == ['2024-01', '2024-02']
+    assert months['total']['best_perfect'] == 5 and months['total']['current_perfect'] == 0
+
+    weeks = client.get('/api/rollups/u1', params={'period': 'week', 'start': '2024-W05', 'end': '2024-W05'}).json()
+    assert [(p['key'], p['days'], p['best_perfect']) for p in weeks['periods']] == [('2024-W05', 5, 4)]
+
+
+def test_period_slots_use_iso_weeks():
+    assert period_slots('2021-01-03') == [('week', '2020-W53', '7'), ('month', '2021-01', '3')]
+    assert summarize(build_rollups('u', []))['total']['days'] == 0
@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+import server_production
+from sessions import ChatSession, MemorySessionStore
+from storage import MemoryStorage, MongoStorage, SqliteStorage
+
+SUMMARY = {'water_avg14': 5.5, 'pill_adherence7': 86}
+
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def chat_completion(self, messages, **kwargs):
+        self.prompts.append(messages)
+        message = SimpleNamespace(content=f'reply {len(self.prompts)}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture(params=['server', 'server_production', 'sqlite'])
+def session_client(request, monkeypatch, tmp_path):
+    llm = RecordingLLM()
+    if request.param == 'server':
+        module, storage = server, MongoStorage(db=AsyncMongoMockClient()['test_database'])
+    elif request.param == 'sqlite':
+        module, storage = server_production, SqliteStorage(str(tmp_path / 'state.sqlite3'))
+    else:
+        module, storage = server_production, MemoryStorage(10)
+    monkeypatch.setattr(module.llm, 'client', llm)
+    with TestClient(module.create_app(storage=storage)) as client:
+        yield client, llm
+
+
+def _say(content, **extra):
+    return {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': content}], **extra}
+
+
+def test_follow_ups_send_only_the_delta(session_client):
+    client, llm = session_client
+    first = client.post('/api/chat', json=_say('Wie schlafe ich besser?', new_session=True, summary=SUMMARY)).json()
+    assert len(first['session_id']) >= 32 and first['summary_hash']
+    other = client.post('/api/chat', json=_say('Hallo', new_session=True, summary=SUMMARY)).json()
+    assert other['session_id'] != first['session_id']
+
+    second = client.post('/api/chat', json=_say('Und am Wochenende?', session_id=first['session_id'],
+                                                summary_hash=first['summary_hash'])).json()
+    assert second['text'] == 'reply 3'
+    assert second['summary_hash'] == first['summary_hash']
+
+    prompt = llm.prompts[-1]
+    assert any('water14d' in m['content'] for m in prompt if m['role'] == 'system')
+    assert [m['content'] for m in prompt if m['role'] != 'system'] == [
+        'Wie schlafe ich besser?', 'reply 1', 'Und am Wochenende?',
+    ]
+
+
+def test_stale_or_unknown_state_asks_for_a_full_resend(session_client):
+    client, _ = session_client
+    first = client.post('/api/chat', json=_say('Hallo Gugi', new_session=True, summary=SUMMARY)).json()
+    sid = first['session_id']
+
+    stale = client.post('/api/chat', json=_say('Noch was', session_id=sid, summary_hash='0000'))
+    assert stale.status_code == 409 and stale.json()['detail'] == 'summary_changed'
+
+    unknown = client.post('/api/chat', json=_say('Noch was', session_id='x' * 32, summary_hash=first['summary_hash']))
+    assert unknown.status_code == 409 and unknown.json()['detail'] == 'unknown_session'
+
+    client.delete(f'/api/chat/sessions/{sid}')
+    gone = client.post('/api/chat', json=_say('Noch was', session_id=sid, summary_hash=first['summary_hash']))
+    assert gone.status_code == 409
+
+
+def test_an_id_alone_does_not_reach_the_stored_summary(session_client):
+    client, llm = session_client
+    first = client.post('/api/chat', json=_say('Hallo Gugi', new_session=True, summary=SUMMARY)).json()
+
+    # Client-chosen ids are never issued, and a follow-up must prove it knows the summary
+    assert client.post('/api/chat', json=_say('Was weißt du?', session_id='s-1')).status_code == 422
+    bare = client.post('/api/chat', json=_say('Was weißt du?', session_id=first['session_id']))
+    assert bare.status_code == 409 and bare.json()['detail'] == 'summary_hash_required'
+    replaced = client.post('/api/chat', json=_say('Was weißt du?', session_id=first['session_id'], summary={}))
+    assert replaced.status_code == 409
+    assert len(llm.prompts) == 1
+
+
+def test_a_batch_carries_at_most_one_turn_per_session(session_client):
+    client, _ = session_client
+    first = client.post('/api/chat', json=_say('Hallo', new_session=True)).json()
+    turn = {'session_id': first['session_id'], 'summary_hash': first['summary_hash']}
+
+    # Items run concurrently, so two turns of one session would lose one of them
+    same = {'requests': [_say('eins', **turn), _say('zwei', **turn)]}
+    assert client.post('/api/chat/batch', json=same).status_code == 422
+
+    # New sessions get distinct ids from the server and can share a batch
+    fresh = {'requests': [_say('eins', new_session=True), _say('zwei', new_session=True), _say('drei', **turn)]}
+    results = client.post('/api/chat/batch', json=fresh).json()['results']
+    assert len({r['session_id'] for r in results}) == 3
+
+
+def test_memory_store_is_an_lru_with_ttl():
+    now = [0.0]
+    store = MemorySessionStore(max_sessions=2, ttl=10, clock=lambda: now[0])
+
+    async def scenario():
+        for sid in ('a', 'b'):
+            await store.save(ChatSession(sid))
+        await store.get('a')
+        await store.save(ChatSession('c'))  # evicts 'b', the least recently used
+        evicted = await store.get('b')
+        now[0] = 11
+        expired = await store.get('a')
+        return evicted, expired
+
+    assert asyncio.run(scenario()) == (None, None)
+    assert store.stats()['evictions'] == 1
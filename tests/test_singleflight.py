@@ -0,0 +1,62 @@
+import asyncio
+
+from llm_stub import StubLLMClient
+from singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    async def scenario():
+        llm = StubLLMClient(latency=0.05)
+        flights = SingleFlight()
+
+        async def call():
+            return await llm.chat_completion(model='gpt-4o-mini', messages=[])
+
+        results = await asyncio.gather(*(flights.do('greeting', call) for _ in range(20)))
+        return llm, flights, results
+
+    llm, flights, results = asyncio.run(scenario())
+    assert llm.calls == 1
+    assert len({id(r) for r in results}) == 1
+    assert flights.stats() == {'in_flight': 0, 'upstream_calls': 1, 'coalesced': 19}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.05)
+            return 'ok'
+
+        first = asyncio.ensure_future(flights.do('k', slow))
+        second = asyncio.ensure_future(flights.do('k', slow))
+        await started.wait()
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ('ok', True)
+
+
+def test_last_waiter_leaving_cancels_upstream():
+    async def scenario():
+        flights = SingleFlight()
+        upstream_cancelled = asyncio.Event()
+
+        async def hang():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flights.do('k', hang))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(upstream_cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flights.stats()['in_flight']
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import server
+from chat_cache import ResponseCache, cache_from_env
+from sessions import ChatSession
+from sqlite_store import SqliteDatabase, SqliteResponseCache
+from storage import SqliteStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_two_workers_share_one_file_and_inserts_are_group_committed(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    t0 = datetime(2024, 5, 1)
+
+    async def run():
+        # Separate databases stand in for separate processes
+        a, b = SqliteStorage(db=SqliteDatabase(path)), SqliteStorage(db=SqliteDatabase(path))
+        await a.startup()
+        await b.startup()
+        # Concurrent inserts queue up behind the first commit and share the next ones
+        await asyncio.gather(*(
+            a.insert_status({'id': f'{i:03d}', 'client_name': f'c{i}', 'timestamp': t0 + timedelta(seconds=i)})
+            for i in range(200)
+        ))
+        stats = a.stats()
+        await b.insert_status({'id': 'zzz', 'client_name': 'b', 'timestamp': t0 + timedelta(days=1)})
+
+        session = ChatSession('s-1', [{'role': 'user', 'content': 'Hallo'}], {'water': 3}, 'abc')
+        await a.sessions.save(session)
+        loaded = await b.sessions.get('s-1')
+
+        first = await b.status_page(None, 2)
+        rest = [doc async for doc in b.iter_status((first[1]['timestamp'], first[1]['id']))]
+        await a.shutdown()
+        await b.shutdown()
+        return loaded, first, rest, stats
+
+    loaded, first, rest, stats = asyncio.run(run())
+    assert loaded == ChatSession('s-1', [{'role': 'user', 'content': 'Hallo'}], {'water': 3}, 'abc')
+    assert [d['id'] for d in first] == ['000', '001', '002']
+    assert first[0] == {'id': '000', 'client_name': 'c0', 'timestamp': t0}
+    assert len(rest) == 199 and rest[-1]['client_name'] == 'b'
+    assert stats['written'] == 200 and stats['batches'] < 200
+
+
+def test_sessions_expire_by_wall_clock(tmp_path):
+    clock = FakeClock()
+    storage = SqliteStorage(str(tmp_path / 'state.sqlite3'))
+    storage.sessions._clock = clock
+
+    async def run():
+        await storage.sessions.save(ChatSession('s-1'))
+        clock.now += storage.sessions.ttl - 1
+        alive = await storage.sessions.get('s-1')
+        clock.now += 2
+        expired = await storage.sessions.get('s-1')
+        await storage.shutdown()
+        return alive, expired
+
+    alive, expired = asyncio.run(run())
+    assert alive is not None and expired is None
+
+
+def test_response_cache_is_shared_bounded_and_expires(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    clock = FakeClock()
+    a = SqliteResponseCache(SqliteDatabase(path), max_entries=8, ttls={'chat': 60}, clock=clock)
+    b = SqliteResponseCache(SqliteDatabase(path), max_entries=8, ttls={'chat': 60}, clock=clock)
+
+    async def run():
+        for i in range(20):
+            clock.now += 1
+            a.set(f'k{i}', f'answer {i}')
+        await a.db.flush()
+        shared = await b.lookup('k19')  # written by one worker, served by another
+        evicted = await b.lookup('k0')
+        clock.now += 61
+        expired = await b.lookup('k19')
+        return shared, evicted, expired
+
+    assert asyncio.run(run()) == ('answer 19', None, None)
+    assert len(a) <= 8 and a.stats()['evictions'] >= 12
+    assert b.stats()['hits'] == 1 and b.stats()['misses'] == 2
+    a.db.close()
+    b.db.close()
+
+
+def test_sqlite_is_picked_from_the_environment(tmp_path, monkeypatch, sync_auth):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'state.sqlite3'))
+    assert isinstance(cache_from_env(), ResponseCache)
+    monkeypatch.setenv('STATUS_STORAGE', 'sqlite')
+    cache = cache_from_env()
+    assert isinstance(cache, SqliteResponseCache)
+    # One writer thread and reader pool per process, whichever store asks
+    storage = SqliteStorage()
+    assert storage.db is cache.db
+    storage.db.close()
+
+    # Day sync needs MongoDB (or memory); the status API still works
+    with TestClient(server.create_app(storage=SqliteStorage())) as client:
+        change = {'changes': [{'date': '2024-05-01', 'cycle': {'start': '2024-05-01'}}]}
+        assert client.post('/api/sync/u1', json=change, headers={'X-Sync-Token': sync_auth.token('u1')}).status_code == 503
+        assert client.post('/api/status', json={'client_name': 'x'}).status_code == 200
+        assert client.get('/api/status').json()[0]['client_name'] == 'x'
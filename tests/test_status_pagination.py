@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+import server_production
+from storage import MemoryStorage, MongoStorage, SqliteStorage
+
+
+@pytest.fixture(params=['server', 'server_production', 'sqlite'])
+def client(request, tmp_path):
+    if request.param == 'server':
+        app = server.create_app(storage=MongoStorage(db=AsyncMongoMockClient()['test_database']))
+    elif request.param == 'sqlite':
+        app = server_production.create_app(storage=SqliteStorage(str(tmp_path / 'state.sqlite3')))
+    else:
+        app = server_production.create_app(storage=MemoryStorage(100))
+    with TestClient(app) as c:
+        c.bson = request.param == 'server'
+        yield c
+
+
+def _stored_order(client, posted):
+    # BSON datetimes keep milliseconds: checks posted within the same one come back in id order
+    def key(doc):
+        ts = datetime.fromisoformat(doc['timestamp'])
+        return (ts.replace(microsecond=ts.microsecond // 1000 * 1000) if client.bson else ts, doc['id'])
+    return sorted(posted, key=key)
+
+
+def test_pages_follow_the_cursor_until_exhausted(client):
+    posted = [client.post('/api/status', json={'client_name': f'c{i}'}).json() for i in range(7)]
+    created = [doc['id'] for doc in _stored_order(client, posted)]
+
+    seen, after = [], None
+    while True:
+        params = {'limit': 3, **({'after': after} if after else {})}
+        resp = client.get('/api/status', params=params)
+        assert resp.status_code == 200
+        page = resp.json()
+        assert all('_id' not in doc for doc in page)
+        seen.extend(doc['id'] for doc in page)
+        after = resp.headers.get('X-Next-Cursor')
+        if not after:
+            break
+
+    assert seen == created
+
+
+def test_newest_first_pages(client):
+    posted = [client.post('/api/status', json={'client_name': f'c{i}'}).json() for i in range(7)]
+    newest = [doc['id'] for doc in reversed(_stored_order(client, posted))]
+
+    resp = client.get('/api/status', params={'order': 'desc', 'limit': 3})
+    assert [doc['id'] for doc in resp.json()] == newest[:3]
+    seen, after = [doc['id'] for doc in resp.json()], resp.headers['X-Next-Cursor']
+    while after:
+        resp = client.get('/api/status', params={'order': 'desc', 'limit': 3, 'after': after})
+        seen.extend(doc['id'] for doc in resp.json())
+        after = resp.headers.get('X-Next-Cursor')
+    assert seen == newest
+
+
+def test_ndjson_export_and_bad_cursor(client):
+    posted = [client.post('/api/status', json={'client_name': f'c{i}'}).json() for i in range(4)]
+
+    resp = client.get('/api/status', params={'format': 'ndjson'})
+    assert resp.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r['client_name'] for r in rows] == [doc['client_name'] for doc in _stored_order(client, posted)]
+
+    assert client.get('/api/status', params={'after': 'not-a-cursor'}).status_code == 400
@@ -0,0 +1,53 @@
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import server_production
+from status_store import StatusRing, load_snapshot, write_snapshot
+from storage import MemoryStorage
+
+T0 = datetime(2025, 1, 1, 12, 0, 0, 123456)
+
+
+def _fill(ring, n):
+    ids = [str(uuid.uuid4()) for _ in range(n)]
+    for i, id in enumerate(ids):
+        ring.append(id, f'c{i}', T0 + timedelta(seconds=i))
+    return ids
+
+
+def test_ring_keeps_newest_entries_in_order():
+    ring = StatusRing(capacity=3)
+    ids = _fill(ring, 5)
+
+    assert len(ring) == 3
+    assert [r['id'] for r in ring.slice(0)] == ids[2:]
+    assert [r['client_name'] for r in ring.newest(2)] == ['c4', 'c3']
+    assert [r['client_name'] for r in ring.newest(5, stop=2)] == ['c3', 'c2']
+    assert ring.slice(0)[0]['timestamp'] == T0 + timedelta(seconds=2)
+    assert ring.bisect_after((T0 + timedelta(seconds=3), ids[3])) == 2
+    assert ring.bisect_before((T0 + timedelta(seconds=3), ids[3])) == 1
+    assert ring.stats()['count'] == 3
+
+
+def test_snapshot_round_trip(tmp_path):
+    ring = StatusRing(capacity=10)
+    ids = _fill(ring, 4)
+    path = str(tmp_path / 'status.json')
+    write_snapshot(path, ring.dump_rows())
+
+    restored = StatusRing(capacity=2)
+    assert load_snapshot(restored, path) == 4
+    assert [r['id'] for r in restored.slice(0)] == ids[2:]
+    assert load_snapshot(StatusRing(1), str(tmp_path / 'missing.json')) == 0
+
+
+def test_production_server_restores_and_saves_snapshot(tmp_path):
+    path = str(tmp_path / 'status.json')
+    with TestClient(server_production.create_app(storage=MemoryStorage(50, snapshot_path=path))) as client:
+        client.post('/api/status', json={'client_name': 'before-restart'})
+
+    with TestClient(server_production.create_app(storage=MemoryStorage(50, snapshot_path=path))) as client:
+        names = [doc['client_name'] for doc in client.get('/api/status').json()]
+    assert names == ['before-restart']
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from storage import MemoryStorage, MongoStorage
+from sync import MongoSyncStore, SyncAuth
+
+
+@pytest.fixture(params=['mongo', 'memory'])
+def sync_client(request, bulk_mongo_db, sync_auth):
+    if request.param == 'mongo':
+        db, storage = bulk_mongo_db, MongoStorage(db=bulk_mongo_db)
+    else:
+        db, storage = None, MemoryStorage(10)
+    with TestClient(server.create_app(storage=storage), headers={'X-Sync-Token': sync_auth.token('u1')}) as client:
+        yield client, db
+
+
+def _day(date, water=0, weight=None):
+    day = {'date': date, 'pills': {'morning': True, 'evening': False}, 'drinks': {'water': water, 'coffee': 1}}
+    if weight is not None:
+        day['weight'] = weight
+    return day
+
+
+def _pull_all(client, since=0, limit=2):
+    changes, pages = [], 0
+    while True:
+        page = client.get('/api/sync/u1', params={'since': since, 'limit': limit}).json()
+        changes += page['changes']
+        since, pages = page['rev'], pages + 1
+        if not page['more']:
+            return changes, since, pages
+
+
+def test_push_is_one_bulk_write_and_pull_is_incremental(sync_client):
+    client, db = sync_client
+    changes = [{'date': f'2024-01-0{i}', 'day': _day(f'2024-01-0{i}', water=i)} for i in range(1, 6)]
+    changes[0]['cycle'] = {'start': '2024-01-01'}
+    changes[1]['cycleLog'] = {'mood': 4, 'cramps': True}
+    resp = client.post('/api/sync/u1', json={'changes': changes})
+    assert resp.json() == {'accepted': 5, 'rev': 5}
+    if db is not None:
+        assert db.days.bulk_sizes == [5]
+
+    pulled, rev, pages = _pull_all(client)
+    assert [c['date'] for c in pulled] == [f'2024-01-0{i}' for i in range(1, 6)]
+    assert (rev, pages) == (5, 3)
+    assert pulled[1]['cycleLog'] == {'mood': 4, 'cramps': True}
+    assert pulled[4]['day']['drinks']['water'] == 5
+
+    # Only what changed after rev 5 comes back; fields left out are kept, null removes them
+    client.post('/api/sync/u1', json={'changes': [
+        {'date': '2024-01-02', 'day': _day('2024-01-02', water=8, weight=70.5), 'cycleLog': None},
+        {'date': '2024-01-01', 'cycle': {'start': '2024-01-01', 'end': '2024-01-05'}},
+    ]})
+    pulled, rev, _ = _pull_all(client, since=5)
+    assert [(c['date'], c['rev']) for c in pulled] == [('2024-01-02', 6), ('2024-01-01', 7)]
+    assert 'cycleLog' not in pulled[0] and pulled[0]['day']['weight'] == 70.5
+    assert pulled[1]['cycle']['end'] == '2024-01-05' and pulled[1]['day']['drinks']['water'] == 1
+    assert client.get('/api/sync/u1', params={'since': rev}).json() == {'changes': [], 'rev': 7, 'more': False}
+
+    # Users do not see each other's days
+    assert client.get('/api/sync/u2', headers={'X-Sync-Token': server.sync_auth.token('u2')}).json()['changes'] == []
+
+
+def test_every_user_route_needs_that_users_token(sync_client, monkeypatch):
+    client, _ = sync_client
+    token = server.sync_auth.token('u1')
+    routes = [('get', '/api/sync/u2'), ('post', '/api/sync/u2'), ('get', '/api/sync/u2/export'),
+              ('post', '/api/sync/u2/import'), ('get', '/api/rollups/u2'), ('post', '/api/rollups/u2/rebuild')]
+    for method, path in routes:
+        assert client.request(method, path, headers={'X-Sync-Token': token}).status_code == 403, path
+        assert client.request(method, path, headers={'X-Sync-Token': ''}).status_code == 403, path
+
+    registered = client.post('/api/sync/register').json()
+    assert registered['user_id'] != client.post('/api/sync/register').json()['user_id']
+    headers = {'X-Sync-Token': registered['token']}
+    assert client.get(f"/api/sync/{registered['user_id']}", headers=headers).status_code == 200
+
+    monkeypatch.setattr(server, 'sync_auth', SyncAuth())
+    assert client.get('/api/sync/u1', headers={'X-Sync-Token': token}).status_code == 503
+    assert client.post('/api/sync/register').status_code == 503
+
+
+def test_push_validation(sync_client):
+    client, _ = sync_client
+    mismatched = {'changes': [{'date': '2024-01-01', 'day': _day('2024-01-02')}]}
+    assert client.post('/api/sync/u1', json=mismatched).status_code == 422
+    assert client.post('/api/sync/u1', json={'changes': [{'date': '1.1.2024'}]}).status_code == 422
+    too_many = {'changes': [{'date': '2024-01-01'}] * (server.SYNC_MAX_BATCH + 1)}
+    assert client.post('/api/sync/u1', json=too_many).status_code == 422
+
+
+def test_concurrent_pushes_commit_in_rev_order(bulk_mongo_db):
+    store = MongoSyncStore(lambda: bulk_mongo_db)
+    days = bulk_mongo_db.days
+    bulk_write, gate, stalled = days.bulk_write, asyncio.Event(), []
+
+    async def first_write_stalls(ops, ordered=True):
+        if not stalled:
+            stalled.append(ops)
+            await gate.wait()
+        await bulk_write(ops, ordered)
+
+    days.bulk_write = first_write_stalls
+
+    async def run():
+        first = asyncio.create_task(store.push('u1', [('2024-03-01', {'cycleLog': {'mood': 1}}),
+                                                      ('2024-03-02', {'cycleLog': {'mood': 2}})]))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(store.push('u1', [('2024-03-03', {'cycleLog': {'mood': 3}})]))
+        await asyncio.sleep(0.01)
+        # A device syncing while the first push is still being written
+        early = await store.pull('u1', 0, 100)
+        since = max((doc['rev'] for doc in early), default=0)
+        gate.set()
+        await asyncio.gather(first, second)
+        return early, await store.pull('u1', since, 100)
+
+    early, late = asyncio.run(run())
+    assert early == []  # the second push waited instead of committing rev 3 ahead of revs 1-2
+    assert [(doc['date'], doc['rev']) for doc in late] == [('2024-03-01', 1), ('2024-03-02', 2), ('2024-03-03', 3)]
+    assert len(store._locks) == 0
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server_production
+from storage import MemoryStorage
+from upstream_probe import UpstreamProber, prober_from_env
+
+CHAT = {'mode': 'chat', 'language': 'de', 'messages': [{'role': 'user', 'content': 'Erzähl mir was'}]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyLLM:
+    def __init__(self):
+        self.fail = False
+        self.calls = 0
+
+    async def chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError('upstream down')
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f'ok {self.calls}'))])
+
+
+async def _never():
+    raise AssertionError('not probed')
+
+
+def test_status_follows_observations():
+    prober = UpstreamProber(_never, down_after=3)
+    assert (prober.status, prober.hint) == ('unknown', 'unknown')
+    for seconds in (0.2, 0.4, 0.3):
+        prober.observe(True, seconds)
+    assert prober.hint == 'ready; latency_ms=300'
+    prober.observe(False, 5.0, 'TimeoutError')
+    assert prober.status == 'degraded'
+    prober.observe(False, 5.0)
+    prober.observe(False, 5.0)
+    assert prober.status == 'down' and prober.snapshot()['ok_ratio'] == 0.5
+    prober.observe(True, 0.3)
+    assert prober.status == 'degraded'  # 3 of 7 recent calls failed
+
+
+def test_background_probe_only_runs_when_traffic_is_quiet():
+    calls = []
+
+    async def probe():
+        calls.append(1)
+        return True
+
+    async def run(prober):
+        task = asyncio.create_task(prober.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    clock = FakeClock()
+    busy = UpstreamProber(probe, interval=0.01, clock=clock)
+    busy.observe(True, 0.1)  # and the clock never moves: always fresh
+    asyncio.run(run(busy))
+    assert calls == [] and busy.skipped > 0
+
+    idle = UpstreamProber(probe, interval=0.01)
+    asyncio.run(run(idle))
+    assert len(calls) >= 2 and idle.status == 'ready'
+
+    async def no_client():
+        return False
+
+    unconfigured = UpstreamProber(no_client)
+    asyncio.run(unconfigured.probe_once())
+    assert unconfigured.hint == 'unavailable'
+
+
+def test_workers_share_the_probe_rate(monkeypatch):
+    async def probe():
+        return True
+
+    monkeypatch.setenv('UPSTREAM_PROBE_INTERVAL_S', '30')
+    assert prober_from_env(probe).interval == 30
+    monkeypatch.setenv('WEB_CONCURRENCY', '3')
+    assert prober_from_env(probe).interval == 90
+
+
+def test_chat_responses_ping_and_health_carry_the_cached_hint(monkeypatch):
+    llm = FlakyLLM()
+    monkeypatch.setattr(server_production.llm, 'client', llm)
+    client = TestClient(server_production.create_app(storage=MemoryStorage(10)))
+    assert client.head('/api/ping').headers['X-Upstream-Status'] == 'unknown'
+
+    resp = client.post('/api/chat', json=CHAT, headers={'Origin': 'http://app'})
+    assert resp.headers['X-Upstream-Status'].startswith('ready; latency_ms=')
+    assert 'X-Upstream-Status' in resp.headers['Access-Control-Expose-Headers']
+
+    llm.fail = True
+    for i in range(3):
+        client.post('/api/chat', json={**CHAT, 'messages': [{'role': 'user', 'content': f'Frage {i}'}]})
+    ping = client.head('/api/ping')
+    assert ping.status_code == 200 and ping.headers['X-Upstream-Status'].startswith('down')
+    assert client.get('/api/ping').text == 'down'
+    health = client.get('/api/health').json()['llm_upstream']
+    assert health['status'] == 'down' and health['last_error'] == 'ConnectionError'
+    assert llm.calls == 4  # readiness never cost an upstream call of its own
@@ -0,0 +1,58 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from storage import MongoStorage
+from write_behind import WriteBehindBuffer
+
+
+class CountingCollection:
+    def __init__(self, collection):
+        self.collection = collection
+        self.batch_sizes = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.batch_sizes.append(len(docs))
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+
+def test_batches_by_size_and_drains_on_close():
+    async def scenario():
+        coll = CountingCollection(AsyncMongoMockClient()['t']['status_checks'])
+        writer = WriteBehindBuffer(lambda: coll, max_batch=10, max_delay=5)
+        for i in range(25):
+            await writer.submit({'id': str(i)})
+        await writer.close()
+        return coll, writer.stats(), await coll.collection.count_documents({})
+
+    coll, stats, count = asyncio.run(scenario())
+    assert count == 25
+    assert sum(coll.batch_sizes) == 25 and max(coll.batch_sizes) <= 10
+    assert stats['written'] == 25 and stats['queue_depth'] == 0
+
+
+def test_group_commit_waits_for_the_flush():
+    async def scenario():
+        coll = CountingCollection(AsyncMongoMockClient()['t']['status_checks'])
+        writer = WriteBehindBuffer(lambda: coll, mode='group_commit', max_batch=100, max_delay=0.02)
+        await asyncio.gather(*(writer.submit({'id': str(i)}) for i in range(5)))
+        count = await coll.collection.count_documents({})
+        await writer.close()
+        return coll.batch_sizes, count
+
+    assert asyncio.run(scenario()) == ([5], 5)
+
+
+def test_status_posts_are_flushed_on_shutdown():
+    db = AsyncMongoMockClient()['test_database']
+    storage = MongoStorage(db=db)
+    storage.writer = WriteBehindBuffer(lambda: db.status_checks, max_delay=60)
+
+    with TestClient(server.create_app(storage=storage)) as client:
+        for i in range(3):
+            assert client.post('/api/status', json={'client_name': f'c{i}'}).status_code == 200
+        assert client.get('/api/status/writes').json()['enqueued'] == 3
+
+    assert asyncio.run(db.status_checks.count_documents({})) == 3